@@ -7,32 +7,45 @@ import json
 from datetime import datetime
 import os
 
+# Libellé de chaque famille de modèles (champ 'backend' des métadonnées)
+BACKEND_LABELS = {
+    'random_forest': 'Random Forest',
+    'hist_gradient_boosting': 'Gradient Boosting'
+}
+
 # Configuration du style des graphiques
 plt.style.use('seaborn-v0_8-darkgrid')
 sns.set_palette("husl")
 
 
-def load_models_and_data():
+def load_models_and_data(models_dir='ml_models'):
     """Charge les modèles et prépare les données pour l'analyse"""
     print("Chargement des modèles et métadonnées...")
 
-    # Charger les modèles
-    temp_model = joblib.load('ml_models/temperature_model.pkl')
-    humid_model = joblib.load('ml_models/humidity_model.pkl')
-    scaler = joblib.load('ml_models/scaler.pkl')
-
     # Charger les métadonnées
-    with open('ml_models/model_metadata.json', 'r') as f:
+    with open(os.path.join(models_dir, 'model_metadata.json'), 'r') as f:
         metadata = json.load(f)
 
+    # Charger les modèles (une forêt multi-sorties sert les deux cibles)
+    if metadata.get('multi_output', False):
+        temp_model = humid_model = joblib.load(os.path.join(models_dir, 'weather_model.pkl'))
+    else:
+        temp_model = joblib.load(os.path.join(models_dir, 'temperature_model.pkl'))
+        humid_model = joblib.load(os.path.join(models_dir, 'humidity_model.pkl'))
+
+    # Pas de scaler si la normalisation est intégrée aux seuils des arbres
+    scaler = None
+    if metadata.get('input_scaling', 'standard') == 'standard':
+        scaler = joblib.load(os.path.join(models_dir, 'scaler.pkl'))
+
     return temp_model, humid_model, scaler, metadata
 
 
-def create_performance_report(metadata):
+def create_performance_report(metadata, output_dir='ml_analysis'):
     """Crée un rapport de performance en format texte et graphique"""
 
     # Créer le dossier pour les graphiques
-    os.makedirs('ml_analysis', exist_ok=True)
+    os.makedirs(output_dir, exist_ok=True)
 
     # 1. Graphique des métriques de performance
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
@@ -66,24 +79,36 @@ def create_performance_report(metadata):
                  ha='center', fontweight='bold')
 
     plt.tight_layout()
-    plt.savefig('ml_analysis/performance_metrics.png', dpi=300, bbox_inches='tight')
+    plt.savefig(os.path.join(output_dir, 'performance_metrics.png'), dpi=300, bbox_inches='tight')
     plt.close()
 
-    print("✅ Graphique des métriques sauvegardé: ml_analysis/performance_metrics.png")
+    print(f"✅ Graphique des métriques sauvegardé: {os.path.join(output_dir, 'performance_metrics.png')}")
 
 
-def analyze_feature_importance(temp_model, humid_model, feature_names):
-    """Analyse et visualise l'importance des features"""
+def analyze_feature_importance(temp_model, humid_model, feature_names, output_dir='ml_analysis',
+                               importances=None):
+    """
+    Analyse et visualise l'importance des features
+
+    `importances` (champ 'feature_importance' des métadonnées) est calculé à l'entraînement,
+    y compris pour les modèles sans feature_importances_ (importance par permutation). Sans
+    lui (anciennes métadonnées), l'importance des forêts est lue sur les modèles.
+    """
+    if importances is None:
+        importances = {
+            'temperature': temp_model.feature_importances_,
+            'humidity': humid_model.feature_importances_
+        }
 
     # Obtenir l'importance des features
     temp_importance = pd.DataFrame({
         'feature': feature_names,
-        'importance': temp_model.feature_importances_
+        'importance': importances['temperature']
     }).sort_values('importance', ascending=False).head(10)
 
     humid_importance = pd.DataFrame({
         'feature': feature_names,
-        'importance': humid_model.feature_importances_
+        'importance': importances['humidity']
     }).sort_values('importance', ascending=False).head(10)
 
     # Créer le graphique
@@ -102,15 +127,15 @@ def analyze_feature_importance(temp_model, humid_model, feature_names):
     ax2.invert_yaxis()
 
     plt.tight_layout()
-    plt.savefig('ml_analysis/feature_importance.png', dpi=300, bbox_inches='tight')
+    plt.savefig(os.path.join(output_dir, 'feature_importance.png'), dpi=300, bbox_inches='tight')
     plt.close()
 
-    print("✅ Graphique d'importance des features sauvegardé: ml_analysis/feature_importance.png")
+    print(f"✅ Graphique d'importance des features sauvegardé: {os.path.join(output_dir, 'feature_importance.png')}")
 
     return temp_importance, humid_importance
 
 
-def create_prediction_example():
+def create_prediction_example(output_dir='ml_analysis'):
     """Crée un exemple visuel de prédiction"""
 
     # Données d'exemple
@@ -145,13 +170,13 @@ def create_prediction_example():
                  bbox=dict(boxstyle="round,pad=0.3", facecolor='yellow', alpha=0.5))
 
     plt.tight_layout()
-    plt.savefig('ml_analysis/prediction_example.png', dpi=300, bbox_inches='tight')
+    plt.savefig(os.path.join(output_dir, 'prediction_example.png'), dpi=300, bbox_inches='tight')
     plt.close()
 
-    print("✅ Exemple de prédiction sauvegardé: ml_analysis/prediction_example.png")
+    print(f"✅ Exemple de prédiction sauvegardé: {os.path.join(output_dir, 'prediction_example.png')}")
 
 
-def create_model_architecture_diagram():
+def create_model_architecture_diagram(output_dir='ml_analysis', model_label='Random Forest'):
     """Crée un diagramme simple de l'architecture du modèle"""
 
     fig, ax = plt.subplots(figsize=(10, 8))
@@ -168,8 +193,8 @@ def create_model_architecture_diagram():
         {'xy': (0.8, 0.8), 'text': 'Features\nTemporelles', 'color': '#3498db'},
         {'xy': (0.5, 0.6), 'text': 'Préparation des Features\n(Lag, Moyennes mobiles)', 'color': '#e74c3c'},
         {'xy': (0.5, 0.4), 'text': 'Normalisation\n(StandardScaler)', 'color': '#f39c12'},
-        {'xy': (0.3, 0.2), 'text': 'Random Forest\nTempérature', 'color': '#27ae60'},
-        {'xy': (0.7, 0.2), 'text': 'Random Forest\nHumidité', 'color': '#27ae60'},
+        {'xy': (0.3, 0.2), 'text': f'{model_label}\nTempérature', 'color': '#27ae60'},
+        {'xy': (0.7, 0.2), 'text': f'{model_label}\nHumidité', 'color': '#27ae60'},
         {'xy': (0.5, 0.05), 'text': 'Prédictions\n(+3 heures)', 'color': '#9b59b6'}
     ]
 
@@ -205,13 +230,13 @@ def create_model_architecture_diagram():
     ax.set_ylim(0, 1)
 
     plt.tight_layout()
-    plt.savefig('ml_analysis/model_architecture.png', dpi=300, bbox_inches='tight')
+    plt.savefig(os.path.join(output_dir, 'model_architecture.png'), dpi=300, bbox_inches='tight')
     plt.close()
 
-    print("✅ Diagramme d'architecture sauvegardé: ml_analysis/model_architecture.png")
+    print(f"✅ Diagramme d'architecture sauvegardé: {os.path.join(output_dir, 'model_architecture.png')}")
 
 
-def generate_performance_report(metadata):
+def generate_performance_report(metadata, output_dir='ml_analysis'):
     """Génère un rapport texte des performances"""
 
     report = f"""
@@ -248,40 +273,47 @@ Le modèle utilise {len(metadata['feature_columns'])} features incluant:
 - Considérer l'ajout de features supplémentaires (pression, direction du vent)
 """
 
-    with open('ml_analysis/performance_report.txt', 'w', encoding='utf-8') as f:
+    with open(os.path.join(output_dir, 'performance_report.txt'), 'w', encoding='utf-8') as f:
         f.write(report)
 
-    print("✅ Rapport de performance sauvegardé: ml_analysis/performance_report.txt")
+    print(f"✅ Rapport de performance sauvegardé: {os.path.join(output_dir, 'performance_report.txt')}")
 
     return report
 
 
-def main():
-    """Fonction principale"""
-    print("🔍 Analyse des performances du modèle ML...")
+def run_analysis(models_dir='ml_models', output_dir='ml_analysis'):
+    """Génère graphiques et rapport pour les modèles de `models_dir` dans `output_dir`"""
+    # Charger les modèles et métadonnées
+    temp_model, humid_model, scaler, metadata = load_models_and_data(models_dir)
 
-    try:
-        # Charger les modèles et métadonnées
-        temp_model, humid_model, scaler, metadata = load_models_and_data()
+    # Générer les analyses
+    print("\n📊 Génération des graphiques...")
+
+    # 1. Métriques de performance
+    create_performance_report(metadata, output_dir)
 
-        # Générer les analyses
-        print("\n📊 Génération des graphiques...")
+    # 2. Importance des features
+    feature_names = metadata['feature_columns']
+    analyze_feature_importance(temp_model, humid_model, feature_names, output_dir,
+                               metadata.get('feature_importance'))
 
-        # 1. Métriques de performance
-        create_performance_report(metadata)
+    # 3. Exemple de prédiction
+    create_prediction_example(output_dir)
 
-        # 2. Importance des features
-        feature_names = metadata['feature_columns']
-        analyze_feature_importance(temp_model, humid_model, feature_names)
+    # 4. Architecture du modèle
+    backend = metadata.get('backend', 'random_forest')
+    create_model_architecture_diagram(output_dir, BACKEND_LABELS.get(backend, metadata['model_type']))
 
-        # 3. Exemple de prédiction
-        create_prediction_example()
+    # 5. Rapport texte
+    return generate_performance_report(metadata, output_dir)
 
-        # 4. Architecture du modèle
-        create_model_architecture_diagram()
 
-        # 5. Rapport texte
-        report = generate_performance_report(metadata)
+def main():
+    """Fonction principale"""
+    print("🔍 Analyse des performances du modèle ML...")
+
+    try:
+        run_analysis()
 
         print("\n" + "=" * 50)
         print("✅ Analyse terminée avec succès!")
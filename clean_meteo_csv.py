@@ -1,9 +1,378 @@
 import pandas as pd
 import numpy as np
+import argparse
+import contextlib
+import glob
+import io
+import json
 import os
-import sys
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
 
-def clean_meteo_csv(input_file, output_file=None, missing_threshold=0.0, conversion_threshold=0.1):
+# Colonnes sans lesquelles une ligne est inutilisable
+ESSENTIAL_COLUMNS = [
+    'Forecast timestamp',
+    'Position',
+    '2 metre temperature'
+]
+
+# Colonnes converties en numérique (l'ordre compte pour le seuil de conversion)
+NUMERIC_COLUMNS = [
+    '2 metre temperature',
+    'Minimum temperature at 2 metres',
+    'Maximum temperature at 2 metres',
+    '2 metre relative humidity',
+    'Total precipitation',
+    '10m wind speed'
+]
+
+# Mesures et coordonnées écrites en float64 quel que soit le bloc: un bloc dont une
+# colonne ne contient que des entiers serait sinon écrit en int64 ("0" au lieu de "0.0").
+# Le CSV par blocs revient ensuite au type du fichier lu en entier (voir restore_integer_columns)
+FLOAT_COLUMNS = NUMERIC_COLUMNS + ['Latitude', 'Longitude']
+
+# Partitionnement de la sortie Parquet: par mois d'échéance ('2025-01') ou par région,
+# une tuile de REGION_GRID_DEGREES degrés de côté ('48_2': latitude 48-49, longitude 2-3)
+PARTITION_KEYS = ['month', 'region']
+REGION_GRID_DEGREES = 1
+
+# Colonnes texte typées dès la lecture (moteur vectorisé): pas d'inférence de type
+TEXT_COLUMNS = {
+    'Forecast timestamp': str,
+    'Position': str
+}
+
+
+def extract_coordinates(pos_str):
+    """Extrait et valide (latitude, longitude) d'une chaîne 'lat, lon'"""
+    try:
+        parts = pos_str.split(',')
+        if len(parts) != 2:
+            return np.nan, np.nan
+
+        lat = float(parts[0].strip())
+        lon = float(parts[1].strip())
+
+        # Valider les coordonnées (plage valide)
+        if -90 <= lat <= 90 and -180 <= lon <= 180:
+            return lat, lon
+        else:
+            return np.nan, np.nan
+    except:
+        return np.nan, np.nan
+
+
+def parse_coordinates(position):
+    """
+    Équivalent vectorisé de extract_coordinates sur une colonne entière
+
+    Les exports répètent les mêmes points de grille à chaque échéance: chaque position
+    distincte n'est analysée qu'une fois (découpage et conversion sur colonnes entières),
+    puis le résultat est diffusé par indexation.
+
+    Returns:
+        tuple: (latitude, longitude), NaN pour les positions invalides
+    """
+    codes, uniques = pd.factorize(position)
+
+    # Exactement deux parties: un second séparateur rend la longitude non numérique
+    parts = pd.Series(uniques, dtype=object).str.split(',', n=1, expand=True).reindex(columns=[0, 1])
+    lat = pd.to_numeric(parts[0], errors='coerce').to_numpy(dtype=float)
+    lon = pd.to_numeric(parts[1], errors='coerce').to_numpy(dtype=float)
+
+    # Valider les coordonnées (plage valide)
+    valid = (lat >= -90) & (lat <= 90) & (lon >= -180) & (lon <= 180)
+
+    # Dernière ligne NaN: le code -1 (position manquante) y renvoie
+    coordinates = np.full((len(uniques) + 1, 2), np.nan)
+    coordinates[:-1][valid] = np.column_stack([lat, lon])[valid]
+    coordinates = coordinates[codes]
+
+    return (pd.Series(coordinates[:, 0], index=position.index),
+            pd.Series(coordinates[:, 1], index=position.index))
+
+
+def chunk_counters(columns, initial_rows, missing_essential, cleaned_rows,
+                   invalid_mask, non_numeric, invalid_coords):
+    """
+    Compteurs d'un bloc, ventilés par masque de colonnes invalides (voir clean_chunk)
+
+    Les tableaux ne portent que sur les lignes dont les colonnes essentielles sont présentes.
+    """
+    n_masks = 2 ** len(NUMERIC_COLUMNS)
+
+    non_numeric_by_mask = np.zeros((n_masks, len(NUMERIC_COLUMNS)), dtype=np.int64)
+    np.add.at(non_numeric_by_mask, invalid_mask, non_numeric)
+
+    return {
+        'columns': list(columns),
+        'initial_rows': initial_rows,
+        'missing_essential': missing_essential,
+        'cleaned_rows': cleaned_rows,
+        'rows_by_mask': np.bincount(invalid_mask, minlength=n_masks),
+        'non_numeric_by_mask': non_numeric_by_mask,
+        'invalid_coords_by_mask': np.bincount(invalid_mask, weights=invalid_coords,
+                                              minlength=n_masks).astype(np.int64)
+    }
+
+
+def clean_chunk(df, engine='vectorized'):
+    """
+    Nettoie un bloc de lignes indépendamment des autres blocs
+
+    Le seuil de conversion dépend de tout le fichier: il n'est pas appliqué ici. Chaque
+    ligne reçoit un masque de bits (bit i: colonne numérique i invalide) et les compteurs
+    du bloc sont ventilés par masque, ce qui suffit à rejouer les décisions de seuil à la
+    fin (voir finalize_stats). Les lignes finales, elles, n'en dépendent pas: toute ligne
+    avec une valeur manquante est supprimée.
+
+    Args:
+        df (DataFrame): Bloc de lignes brutes (modifié sur place)
+        engine (str): 'vectorized' (opérations sur colonnes entières, masque de validité
+                      unique) ou 'rowwise' (implémentation de référence ligne par ligne)
+
+    Returns:
+        tuple: (bloc nettoyé, compteurs du bloc)
+    """
+    if engine == 'rowwise':
+        return clean_chunk_rowwise(df)
+    if engine != 'vectorized':
+        raise ValueError(f"Moteur de nettoyage inconnu: {engine}")
+
+    initial_rows = len(df)
+    essential = df[ESSENTIAL_COLUMNS].notna().all(axis=1).to_numpy()
+
+    # Une seule conversion par colonne numérique
+    invalid_mask = np.zeros(len(df), dtype=np.int64)
+    non_numeric = np.zeros((len(df), len(NUMERIC_COLUMNS)), dtype=np.int64)
+    for i, col in enumerate(NUMERIC_COLUMNS):
+        if col in df.columns:
+            raw = df[col]
+            converted = pd.to_numeric(raw, errors='coerce')
+            invalid = converted.isna().to_numpy()
+            non_numeric[:, i] = invalid & raw.notna().to_numpy()
+            invalid_mask |= invalid.astype(np.int64) << i
+            df[col] = converted
+
+    lat, lon = parse_coordinates(df['Position'])
+    invalid_coords = (lat.isna() | lon.isna()).to_numpy()
+
+    # Masque de validité unique: colonnes essentielles, aucune valeur manquante, coordonnées valides
+    kept = essential & df.notna().all(axis=1).to_numpy() & ~invalid_coords
+    clean_df = df[kept].assign(Latitude=lat[kept], Longitude=lon[kept])
+
+    counters = chunk_counters(clean_df.columns, initial_rows, int((~essential).sum()), int(kept.sum()),
+                              invalid_mask[essential], non_numeric[essential], invalid_coords[essential])
+    return clean_df, counters
+
+
+def clean_chunk_rowwise(df):
+    """Implémentation de référence de clean_chunk (Position analysée ligne par ligne)"""
+    initial_rows = len(df)
+
+    # Supprimer les lignes où les colonnes essentielles sont manquantes
+    df = df.dropna(subset=ESSENTIAL_COLUMNS)
+    missing_essential = initial_rows - len(df)
+
+    # Convertir les colonnes numériques, en notant les valeurs invalides de chaque ligne
+    invalid_mask = np.zeros(len(df), dtype=np.int64)
+    non_numeric = np.zeros((len(df), len(NUMERIC_COLUMNS)), dtype=np.int64)
+    for i, col in enumerate(NUMERIC_COLUMNS):
+        if col in df.columns:
+            converted = pd.to_numeric(df[col], errors='coerce')
+            non_numeric[:, i] = (converted.isna() & ~df[col].isna()).to_numpy()
+            invalid_mask |= converted.isna().to_numpy().astype(np.int64) << i
+            df[col] = converted
+
+    # Vérifier que les coordonnées GPS sont valides
+    if 'Position' in df.columns:
+        coordinates = df['Position'].apply(extract_coordinates)
+        df['Latitude'] = coordinates.apply(lambda x: x[0])
+        df['Longitude'] = coordinates.apply(lambda x: x[1])
+        invalid_coords = (df['Latitude'].isna() | df['Longitude'].isna()).to_numpy()
+    else:
+        invalid_coords = np.zeros(len(df), dtype=bool)
+
+    # Supprimer les lignes avec n'importe quelle valeur manquante
+    kept = ~df.isna().any(axis=1)
+
+    counters = chunk_counters(df.columns, initial_rows, missing_essential, int(kept.sum()),
+                              invalid_mask, non_numeric, invalid_coords)
+    return df[kept], counters
+
+
+def merge_counters(totals, counters):
+    """Additionne les compteurs d'un bloc aux totaux du fichier"""
+    if totals is None:
+        return counters
+
+    for key, value in counters.items():
+        if key != 'columns':
+            totals[key] = totals[key] + value
+    return totals
+
+
+def finalize_stats(totals, conversion_threshold=0.1):
+    """
+    Statistiques de nettoyage du fichier entier à partir des compteurs cumulés
+
+    Rejoue, colonne par colonne, la règle du seuil de conversion: une colonne dont la
+    proportion de valeurs invalides dépasse le seuil fait supprimer ces lignes avant
+    l'étape suivante.
+    """
+    masks = np.arange(len(totals['rows_by_mask']))
+    rows_by_mask = totals['rows_by_mask']
+    dropped = 0  # Bits des colonnes dont les lignes invalides ont été supprimées
+
+    conversion_errors = 0
+    conversion_rows = []
+    for i, col in enumerate(NUMERIC_COLUMNS):
+        if col not in totals['columns']:
+            continue
+
+        remaining = (masks & dropped) == 0
+        conversion_errors += int(totals['non_numeric_by_mask'][remaining, i].sum())
+
+        # Vérifier la proportion de valeurs invalides dans la colonne
+        rows = int(rows_by_mask[remaining].sum())
+        invalid = int(rows_by_mask[remaining & ((masks >> i) & 1 == 1)].sum())
+        if rows > 0:
+            invalid_percentage = (invalid / rows) * 100
+            if invalid_percentage > conversion_threshold * 100:
+                conversion_rows.append(f"{col}: {invalid_percentage:.2f}% de valeurs invalides")
+                dropped |= 1 << i
+
+    remaining = (masks & dropped) == 0
+    invalid_coords_count = int(totals['invalid_coords_by_mask'][remaining].sum())
+    rows_before = int(rows_by_mask[remaining].sum()) - invalid_coords_count
+
+    initial_rows = totals['initial_rows']
+    cleaned_rows = totals['cleaned_rows']
+    removed_rows = initial_rows - cleaned_rows
+    removal_percent = (removed_rows / initial_rows) * 100 if initial_rows > 0 else 0
+
+    stats = {
+        'initial_rows': initial_rows,
+        'cleaned_rows': cleaned_rows,
+        'removed_rows': removed_rows,
+        'removal_percent': removal_percent,
+        'missing_essential': totals['missing_essential'],
+        'conversion_errors': conversion_errors,
+        'too_many_missing': rows_before - cleaned_rows
+    }
+    return stats, conversion_rows, invalid_coords_count
+
+
+def measurements_as_float(df):
+    """Convertit les colonnes de FLOAT_COLUMNS présentes en float64 (même sortie pour tout découpage en blocs)"""
+    return df.astype({col: np.float64 for col in FLOAT_COLUMNS if col in df.columns})
+
+
+def integer_columns(df):
+    """Colonnes de NUMERIC_COLUMNS converties en entiers dans ce bloc"""
+    return {col for col in NUMERIC_COLUMNS if col in df.columns and pd.api.types.is_integer_dtype(df[col])}
+
+
+def restore_integer_columns(csv_file, columns, chunksize):
+    """
+    Réécrit en entiers ("0" et non "0.0") des colonnes d'un CSV nettoyé par blocs
+
+    Une colonne entière dans tous les blocs l'est aussi dans le fichier lu en entier: le CSV
+    redevient identique à celui du mode sans blocs. Les autres colonnes sont recopiées telles
+    quelles (lues comme texte), bloc par bloc.
+    """
+    tmp_file = f'{csv_file}.tmp'
+    reader = pd.read_csv(csv_file, sep=';', dtype=str, keep_default_na=False, chunksize=chunksize)
+    for n_chunk, chunk in enumerate(reader):
+        chunk = chunk.assign(**{col: chunk[col].astype(np.float64).astype(np.int64) for col in columns})
+        chunk.to_csv(tmp_file, sep=';', index=False, mode='w' if n_chunk == 0 else 'a', header=n_chunk == 0)
+
+    if os.path.exists(tmp_file):
+        os.replace(tmp_file, csv_file)
+
+
+def write_parquet_chunk(df, output_dir, n_chunk, first_row, partition_by=None):
+    """
+    Ajoute un bloc nettoyé au jeu de données Parquet `output_dir` (un fichier par bloc
+    et par partition, compression zstd)
+
+    Les colonnes sont typées: échéance en horodatage UTC, mesures en float64. La colonne
+    'row_number' conserve l'ordre des lignes du fichier d'origine.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("La sortie Parquet nécessite pyarrow (pip install pyarrow)")
+
+    # Type fixe d'un bloc à l'autre: un bloc de valeurs entières rendrait sinon le jeu de
+    # données illisible (int64 dans certains fichiers, double dans les autres)
+    df = measurements_as_float(df)
+
+    timestamps = pd.to_datetime(df['Forecast timestamp'], utc=True, format='ISO8601', errors='coerce')
+    df = df.assign(**{
+        'Forecast timestamp': timestamps,
+        'row_number': np.arange(first_row, first_row + len(df), dtype=np.int64)
+    })
+
+    if partition_by == 'month':
+        df['month'] = timestamps.dt.strftime('%Y-%m')
+    elif partition_by == 'region':
+        lat_tile = (np.floor(df['Latitude'] / REGION_GRID_DEGREES) * REGION_GRID_DEGREES).astype(int)
+        lon_tile = (np.floor(df['Longitude'] / REGION_GRID_DEGREES) * REGION_GRID_DEGREES).astype(int)
+        df['region'] = lat_tile.astype(str) + '_' + lon_tile.astype(str)
+    elif partition_by is not None:
+        raise ValueError(f"Partitionnement inconnu: {partition_by}")
+
+    pq.write_to_dataset(
+        pa.Table.from_pandas(df, preserve_index=False),
+        output_dir,
+        partition_cols=[partition_by] if partition_by else None,
+        basename_template=f'part-{n_chunk:05d}-{{i}}.parquet',
+        existing_data_behavior='overwrite_or_ignore',
+        compression='zstd'
+    )
+
+
+def is_parquet_dataset(path):
+    """
+    Vrai si `path` ne contient que des fichiers part-*.parquet et des sous-répertoires de
+    partition 'clé=valeur' eux-mêmes dans ce cas (jeu de données écrit par write_parquet_chunk)
+    """
+    for entry in os.scandir(path):
+        if entry.is_dir(follow_symlinks=False):
+            if '=' not in entry.name or not is_parquet_dataset(entry.path):
+                return False
+        elif not (entry.is_file(follow_symlinks=False) and entry.name.startswith('part-')
+                  and entry.name.endswith('.parquet')):
+            return False
+    return True
+
+
+def remove_parquet_dataset(path):
+    """Supprime le jeu de données Parquet `path` avant réécriture; refuse tout autre répertoire"""
+    if not os.path.isdir(path):
+        return
+    if not is_parquet_dataset(path):
+        raise ValueError(f"{path} existe et n'est pas un jeu de données Parquet "
+                         f"(fichiers part-*.parquet, partitions clé=valeur): suppression refusée")
+    shutil.rmtree(path)
+
+
+def read_chunks(input_file, chunksize=None, engine='vectorized'):
+    """Lit le CSV (séparateur point-virgule) en entier ou par blocs de `chunksize` lignes"""
+    # Le moteur vectorisé type les colonnes texte dès la lecture
+    dtype = TEXT_COLUMNS if engine == 'vectorized' else None
+
+    if chunksize:
+        return pd.read_csv(input_file, sep=';', dtype=dtype, chunksize=chunksize)
+    return [pd.read_csv(input_file, sep=';', dtype=dtype)]
+
+
+def clean_meteo_csv(input_file, output_file=None, missing_threshold=0.0, conversion_threshold=0.1,
+                    chunksize=None, engine='vectorized', output_format='csv', partition_by=None,
+                    row_offset=0):
     """
     Nettoie un fichier CSV de données météorologiques en supprimant les lignes incomplètes
     et en vérifiant la validité des données numériques.
@@ -14,155 +383,340 @@ def clean_meteo_csv(input_file, output_file=None, missing_threshold=0.0, convers
                                       utilisera le nom du fichier d'entrée avec '_clean' ajouté.
         missing_threshold (float, optional): Seuil de valeurs manquantes pour suppression de ligne (par défaut 0%).
         conversion_threshold (float, optional): Seuil pour la proportion de données non numériques tolérées dans les colonnes numériques (par défaut 10%).
+        chunksize (int, optional): Nombre de lignes lues et nettoyées à la fois. Les blocs nettoyés
+                                   sont ajoutés au fichier de sortie au fur et à mesure: la mémoire
+                                   utilisée ne dépend pas de la taille du fichier. Par défaut,
+                                   le fichier est lu en entier.
+        engine (str, optional): Moteur de nettoyage, 'vectorized' (par défaut) ou 'rowwise'
+                                (implémentation de référence, voir clean_chunk).
+        output_format (str, optional): 'csv' (par défaut) ou 'parquet': répertoire de fichiers
+                                       Parquet typés et compressés, lu directement par
+                                       train_weather_model.py (nécessite pyarrow).
+        partition_by (str, optional): Partitionnement de la sortie Parquet, 'month' ou 'region'.
+        row_offset (int, optional): Premier numéro de ligne de la sortie Parquet (fusion de
+                                    plusieurs fichiers dans un même jeu de données).
 
     Returns:
-        tuple: (DataFrame nettoyé, statistiques de nettoyage)
+        tuple: (DataFrame nettoyé, statistiques de nettoyage). En mode par blocs, le DataFrame
+               nettoyé n'est pas conservé en mémoire et None est retourné à sa place.
     """
     # Définir le nom du fichier de sortie si non spécifié
     if output_file is None:
         base_name = os.path.splitext(input_file)[0]
-        output_file = f"{base_name}_clean.csv"
+        extension = 'parquet' if output_format == 'parquet' else 'csv'
+        output_file = f"{base_name}_clean.{extension}"
 
     print(f"Lecture du fichier: {input_file}")
 
     try:
-        # Charger le CSV avec séparateur point-virgule
-        df = pd.read_csv(input_file, sep=';')
-
-        # Statistiques initiales
-        initial_rows = len(df)
-        print(f"Nombre de lignes initiales: {initial_rows}")
-        print(f"Colonnes: {', '.join(df.columns)}")
-
-        # 1. Identification des colonnes essentielles
-        essential_columns = [
-            'Forecast timestamp',
-            'Position',
-            '2 metre temperature'
-        ]
-
-        # 2. Supprimer les lignes où les colonnes essentielles sont manquantes
-        rows_before = len(df)
-        df = df.dropna(subset=essential_columns)
-        rows_after = len(df)
-        missing_essential = rows_before - rows_after
-        print(f"Lignes supprimées pour valeurs essentielles manquantes: {missing_essential}")
-
-        # 3. Vérifier et convertir les colonnes numériques
-        numeric_columns = [
-            '2 metre temperature',
-            'Minimum temperature at 2 metres',
-            'Maximum temperature at 2 metres',
-            '2 metre relative humidity',
-            'Total precipitation',
-            '10m wind speed'
-        ]
-
-        # Stats pour les erreurs de conversion
-        conversion_errors = 0
-        conversion_rows = []
-
-        for col in numeric_columns:
-            if col in df.columns:
-                # Compter les valeurs non-numériques
-                non_numeric = pd.to_numeric(df[col], errors='coerce').isna() & ~df[col].isna()
-                conversion_errors += non_numeric.sum()
-
-                # Convertir en numérique, remplacer les erreurs par NaN
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-
-                # Vérifier la proportion de valeurs invalides dans la colonne
-                invalid_percentage = (df[col].isna().sum() / len(df)) * 100
-                if invalid_percentage > conversion_threshold * 100:
-                    conversion_rows.append(f"{col}: {invalid_percentage:.2f}% de valeurs invalides")
-                    df = df.dropna(subset=[col])  # Supprimer les lignes où cette colonne a des valeurs invalides
-
-        print(f"Erreurs de conversion numérique: {conversion_errors}")
+        # Charger le CSV avec séparateur point-virgule (en entier ou par blocs)
+        chunks = read_chunks(input_file, chunksize, engine)
+
+        # Le jeu de données Parquet est reconstruit entièrement
+        if output_format == 'parquet':
+            remove_parquet_dataset(output_file)
+
+        totals = None
+        clean_df = None
+        written_rows = row_offset
+        integer_everywhere = None
+        for n_chunk, chunk in enumerate(chunks):
+            if n_chunk == 0:
+                print(f"Colonnes: {', '.join(chunk.columns)}")
+
+            clean_chunk_df, counters = clean_chunk(chunk, engine)
+            totals = merge_counters(totals, counters)
+
+            # Ajouter le bloc nettoyé au fichier de sortie
+            if output_format == 'parquet':
+                write_parquet_chunk(clean_chunk_df, output_file, n_chunk, written_rows, partition_by)
+            elif chunksize:
+                # Type d'une colonne inconnu avant le dernier bloc: float64, puis retour aux
+                # entiers en fin de fichier si besoin
+                chunk_integers = integer_columns(clean_chunk_df)
+                integer_everywhere = chunk_integers if n_chunk == 0 else integer_everywhere & chunk_integers
+                measurements_as_float(clean_chunk_df).to_csv(output_file, sep=';', index=False,
+                                                             mode='w' if n_chunk == 0 else 'a',
+                                                             header=n_chunk == 0)
+            else:
+                clean_chunk_df.to_csv(output_file, sep=';', index=False)
+            written_rows += len(clean_chunk_df)
+
+            if chunksize:
+                print(f"Bloc {n_chunk + 1}: {counters['initial_rows']} lignes lues, "
+                      f"{counters['cleaned_rows']} conservées")
+            else:
+                clean_df = clean_chunk_df
+
+        if integer_everywhere:
+            restore_integer_columns(output_file, sorted(integer_everywhere), chunksize)
+
+        stats, conversion_rows, invalid_coords_count = finalize_stats(totals, conversion_threshold)
+
+        print(f"Nombre de lignes initiales: {stats['initial_rows']}")
+        print(f"Lignes supprimées pour valeurs essentielles manquantes: {stats['missing_essential']}")
+        print(f"Erreurs de conversion numérique: {stats['conversion_errors']}")
         if conversion_rows:
             print("Colonnes avec trop de valeurs invalides:")
             for row in conversion_rows:
                 print(row)
-
-        # 4. Vérifier que les coordonnées GPS sont valides
-        # Extraire latitude et longitude de la colonne Position
-        if 'Position' in df.columns:
-            # Créer une fonction pour extraire et valider les coordonnées
-            def extract_coordinates(pos_str):
-                try:
-                    parts = pos_str.split(',')
-                    if len(parts) != 2:
-                        return np.nan, np.nan
-
-                    lat = float(parts[0].strip())
-                    lon = float(parts[1].strip())
-
-                    # Valider les coordonnées (plage valide)
-                    if -90 <= lat <= 90 and -180 <= lon <= 180:
-                        return lat, lon
-                    else:
-                        return np.nan, np.nan
-                except:
-                    return np.nan, np.nan
-
-            # Appliquer la fonction et créer deux nouvelles colonnes
-            coordinates = df['Position'].apply(extract_coordinates)
-            df['Latitude'] = coordinates.apply(lambda x: x[0])
-            df['Longitude'] = coordinates.apply(lambda x: x[1])
-
-            # Supprimer les lignes avec des coordonnées invalides
-            invalid_coords = df['Latitude'].isna() | df['Longitude'].isna()
-            invalid_coords_count = invalid_coords.sum()
-
-            if invalid_coords_count > 0:
-                print(f"Lignes avec coordonnées GPS invalides: {invalid_coords_count}")
-                df = df[~invalid_coords]
-
-        # 5. Supprimer les lignes avec **n'importe quelle valeur manquante**
-        rows_before = len(df)
-        df = df.dropna()  # Supprime toutes les lignes où il y a une seule valeur manquante
-        rows_after = len(df)
-        too_many_missing = rows_before - rows_after
-        print(f"Lignes supprimées pour valeurs manquantes: {too_many_missing}")
-
-        # 6. Enregistrer le DataFrame nettoyé
-        df.to_csv(output_file, sep=';', index=False)
-
-        # Statistiques finales
-        cleaned_rows = len(df)
-        removed_rows = initial_rows - cleaned_rows
-        removal_percent = (removed_rows / initial_rows) * 100 if initial_rows > 0 else 0
-
-        stats = {
-            'initial_rows': initial_rows,
-            'cleaned_rows': cleaned_rows,
-            'removed_rows': removed_rows,
-            'removal_percent': removal_percent,
-            'missing_essential': missing_essential,
-            'conversion_errors': conversion_errors,
-            'too_many_missing': too_many_missing
-        }
+        if invalid_coords_count > 0:
+            print(f"Lignes avec coordonnées GPS invalides: {invalid_coords_count}")
+        print(f"Lignes supprimées pour valeurs manquantes: {stats['too_many_missing']}")
 
         print(f"\nFichier nettoyé enregistré: {output_file}")
-        print(f"Lignes finales: {cleaned_rows} (supprimé {removed_rows} lignes, {removal_percent:.2f}%)")
+        print(f"Lignes finales: {stats['cleaned_rows']} (supprimé {stats['removed_rows']} lignes, "
+              f"{stats['removal_percent']:.2f}%)")
 
-        return df, stats
+        return clean_df, stats
 
     except Exception as e:
         print(f"Erreur lors du nettoyage du fichier: {str(e)}")
         return None, {'error': str(e)}
 
+
+# Statistiques additionnées sur plusieurs fichiers (removal_percent est recalculé)
+SUMMED_STATS = ['initial_rows', 'cleaned_rows', 'removed_rows', 'missing_essential',
+                'conversion_errors', 'too_many_missing']
+
+
+def expand_inputs(pattern):
+    """Fichiers CSV d'un répertoire (hors sorties *_clean.csv) ou d'un motif glob, triés"""
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, '*.csv')
+    return sorted(f for f in glob.glob(pattern) if not f.endswith('_clean.csv'))
+
+
+def clean_file_task(task):
+    """
+    Nettoie un fichier dans un processus du pool (voir clean_many)
+
+    Les messages du nettoyage sont écartés pour ne pas entremêler les sorties des
+    processus; seules les statistiques (ou l'erreur) sont renvoyées.
+    """
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            _, stats = clean_meteo_csv(task['input_file'], task['output_file'], **task['options'])
+    except Exception as e:
+        stats = {'error': str(e)}
+    return stats
+
+
+def concatenate_csv(parts, output_file):
+    """Concatène des CSV de mêmes colonnes (un seul en-tête); retourne les fichiers écartés"""
+    header = None
+    rejected = {}
+    with open(output_file, 'w', encoding='utf-8', newline='') as out:
+        for part in parts:
+            with open(part, 'r', encoding='utf-8', newline='') as f:
+                part_header = f.readline()
+                if header is None:
+                    header = part_header
+                    out.write(header)
+                elif part_header != header:
+                    rejected[part] = 'Colonnes différentes du premier fichier'
+                    continue
+                shutil.copyfileobj(f, out)
+    return rejected
+
+
+def clean_many(input_files, output_dir=None, merge_output=None, workers=None, report_file=None,
+               output_format='csv', **options):
+    """
+    Nettoie plusieurs exports en parallèle dans un pool de processus
+
+    Chaque fichier est nettoyé indépendamment (seuil de conversion évalué par fichier,
+    comme en lançant le script sur chacun). Un fichier en erreur est signalé dans le
+    rapport sans interrompre les autres.
+
+    Args:
+        input_files (list): Fichiers CSV d'entrée
+        output_dir (str, optional): Répertoire des sorties par fichier (par défaut, à côté des entrées)
+        merge_output (str, optional): Sortie unique fusionnée (CSV, ou jeu de données Parquet dont
+                                      chaque fichier source est une partition 'source=<rang>_<nom>',
+                                      typée comme les autres par write_parquet_chunk)
+        workers (int, optional): Nombre de processus (par défaut: nombre de cœurs)
+        report_file (str, optional): Rapport JSON des statistiques par fichier et totales
+        output_format (str, optional): 'csv' ou 'parquet'
+        **options: Autres paramètres de clean_meteo_csv (chunksize, engine, partition_by, ...)
+
+    Returns:
+        dict: Statistiques par fichier ('files') et totales ('total')
+    """
+    extension = 'parquet' if output_format == 'parquet' else 'csv'
+    options = dict(options, output_format=output_format)
+
+    if merge_output and output_format == 'parquet':
+        remove_parquet_dataset(merge_output)
+
+    tasks = []
+    for i, input_file in enumerate(input_files):
+        stem = os.path.splitext(os.path.basename(input_file))[0]
+        task_options = dict(options)
+
+        if merge_output and output_format == 'parquet':
+            # Une partition par fichier source, préfixée par son rang: deux fichiers de même nom
+            # dans des répertoires différents ne se mélangent pas. Les numéros de ligne gardent
+            # l'ordre des fichiers
+            output_file = os.path.join(merge_output, f'source={i:05d}_{stem}')
+            task_options['row_offset'] = i << 40
+        elif merge_output:
+            output_file = f'{merge_output}.part{i:05d}'
+        elif output_dir:
+            output_file = os.path.join(output_dir, f'{stem}_clean.{extension}')
+        else:
+            output_file = None  # <entrée>_clean.<extension>
+
+        tasks.append({'input_file': input_file, 'output_file': output_file, 'options': task_options})
+
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    print(f"Nettoyage de {len(tasks)} fichiers avec {workers or os.cpu_count()} processus")
+    start = time.perf_counter()
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [(task, pool.submit(clean_file_task, task)) for task in tasks]
+        for task, future in futures:
+            try:
+                stats = future.result()
+            except Exception as e:
+                # Processus interrompu (mémoire, signal...)
+                stats = {'error': str(e) or type(e).__name__}
+            results[task['input_file']] = stats
+
+            if 'error' in stats:
+                print(f"❌ {task['input_file']}: {stats['error']}")
+            else:
+                print(f"✅ {task['input_file']}: {stats['cleaned_rows']}/{stats['initial_rows']} lignes conservées")
+
+    # Fusion des CSV dans l'ordre des fichiers d'entrée
+    if merge_output and output_format != 'parquet':
+        parts = [task['output_file'] for task in tasks if 'error' not in results[task['input_file']]]
+        rejected = concatenate_csv(parts, merge_output)
+        for task in tasks:
+            if task['output_file'] in rejected:
+                results[task['input_file']] = {'error': rejected[task['output_file']]}
+        for part in parts:
+            os.remove(part)
+
+    succeeded = [stats for stats in results.values() if 'error' not in stats]
+    total = {key: sum(stats[key] for stats in succeeded) for key in SUMMED_STATS}
+    total['removal_percent'] = (total['removed_rows'] / total['initial_rows']) * 100 if total['initial_rows'] > 0 else 0
+    total['files'] = len(results)
+    total['failed_files'] = len(results) - len(succeeded)
+    total['seconds'] = time.perf_counter() - start
+
+    report = {'files': results, 'total': total}
+    if report_file:
+        with open(report_file, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Rapport enregistré: {report_file}")
+
+    print(f"\nTotal: {total['cleaned_rows']}/{total['initial_rows']} lignes conservées "
+          f"({total['removal_percent']:.2f}% supprimées), {total['failed_files']} fichier(s) en erreur, "
+          f"{total['seconds']:.1f}s")
+    return report
+
+
+def benchmark_engines(input_file, chunksize=None, conversion_threshold=0.1, n_runs=3):
+    """
+    Compare les moteurs de nettoyage 'rowwise' et 'vectorized' sur un même fichier:
+    débit (lecture + nettoyage, hors écriture) et identité des lignes et statistiques produites
+    """
+    results = {}
+    outputs = {}
+
+    for engine in ['rowwise', 'vectorized']:
+        timings = []
+        for _ in range(n_runs):
+            start = time.perf_counter()
+            totals = None
+            clean_parts = []
+            for chunk in read_chunks(input_file, chunksize, engine):
+                clean_chunk_df, counters = clean_chunk(chunk, engine)
+                totals = merge_counters(totals, counters)
+                clean_parts.append(clean_chunk_df)
+            timings.append(time.perf_counter() - start)
+
+        stats = finalize_stats(totals, conversion_threshold)[0]
+        outputs[engine] = (pd.concat(clean_parts, ignore_index=True), stats)
+
+        best = min(timings)
+        results[engine] = {
+            'seconds': best,
+            'rows_per_second': stats['initial_rows'] / best if best > 0 else 0.0
+        }
+        print(f"{engine}: {best:.2f}s, {results[engine]['rows_per_second']:.0f} lignes/s")
+
+    reference_df, reference_stats = outputs['rowwise']
+    vectorized_df, vectorized_stats = outputs['vectorized']
+    results['speedup'] = results['rowwise']['seconds'] / results['vectorized']['seconds']
+    results['same_rows'] = reference_df.equals(vectorized_df)
+    results['same_stats'] = reference_stats == vectorized_stats
+
+    print(f"Accélération: x{results['speedup']:.1f}")
+    print(f"Lignes identiques: {results['same_rows']}, statistiques identiques: {results['same_stats']}")
+    return results
+
+
 def main():
     """Fonction principale pour exécuter le script depuis la ligne de commande"""
-    if len(sys.argv) < 2:
-        print("Usage: python clean_meteo_csv.py input_file.csv [output_file.csv] [missing_threshold] [conversion_threshold]")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Nettoyage des exports CSV météo")
+    parser.add_argument('input_file',
+                        help="Fichier CSV d'entrée (séparateur ';'), répertoire ou motif glob ('exports/*.csv')")
+    parser.add_argument('output_file', nargs='?', default=None,
+                        help="Fichier CSV de sortie (par défaut: <entrée>_clean.csv)")
+    parser.add_argument('missing_threshold', nargs='?', type=float, default=0.0,
+                        help="Seuil de valeurs manquantes (suppression stricte par défaut)")
+    parser.add_argument('conversion_threshold', nargs='?', type=float, default=0.1,
+                        help="Proportion tolérée de valeurs non numériques par colonne")
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help="Lire et nettoyer le fichier par blocs de N lignes (mémoire bornée)")
+    parser.add_argument('--engine', choices=['vectorized', 'rowwise'], default='vectorized',
+                        help="Moteur de nettoyage (par défaut: vectorized)")
+    parser.add_argument('--format', dest='output_format', choices=['csv', 'parquet'], default='csv',
+                        help="Format de sortie (parquet: répertoire typé et compressé, nécessite pyarrow)")
+    parser.add_argument('--partition-by', choices=PARTITION_KEYS, default=None,
+                        help="Partitionner la sortie Parquet par mois ou par région")
+    parser.add_argument('--benchmark', action='store_true',
+                        help="Comparer le débit des deux moteurs sans écrire de fichier")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Plusieurs fichiers: nombre de processus (par défaut: nombre de cœurs)")
+    parser.add_argument('--output-dir', default=None,
+                        help="Plusieurs fichiers: répertoire des sorties par fichier")
+    parser.add_argument('--merge', default=None,
+                        help="Plusieurs fichiers: une seule sortie fusionnée (CSV ou répertoire Parquet)")
+    parser.add_argument('--report', default=None,
+                        help="Plusieurs fichiers: rapport JSON des statistiques")
+    args = parser.parse_args()
+
+    # Répertoire ou motif glob: nettoyage parallèle de plusieurs fichiers
+    if os.path.isdir(args.input_file) or glob.has_magic(args.input_file):
+        if args.output_file or args.benchmark:
+            parser.error("output_file et --benchmark ne s'appliquent qu'à un seul fichier")
+
+        input_files = expand_inputs(args.input_file)
+        if not input_files:
+            parser.error(f"Aucun fichier CSV trouvé: {args.input_file}")
+
+        try:
+            clean_many(input_files, output_dir=args.output_dir, merge_output=args.merge,
+                       workers=args.workers, report_file=args.report, output_format=args.output_format,
+                       missing_threshold=args.missing_threshold, conversion_threshold=args.conversion_threshold,
+                       chunksize=args.chunksize, engine=args.engine, partition_by=args.partition_by)
+        except ValueError as e:
+            parser.error(str(e))
+        return
 
-    input_file = sys.argv[1]
-    output_file = sys.argv[2] if len(sys.argv) > 2 else None
-    missing_threshold = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0  # Suppression stricte des lignes avec une valeur manquante
-    conversion_threshold = float(sys.argv[4]) if len(sys.argv) > 4 else 0.1  # Seuil plus strict pour les erreurs de conversion
+    if args.benchmark:
+        benchmark_engines(args.input_file, args.chunksize, args.conversion_threshold)
+        return
 
-    clean_meteo_csv(input_file, output_file, missing_threshold, conversion_threshold)
+    clean_meteo_csv(args.input_file, args.output_file, args.missing_threshold,
+                    args.conversion_threshold, chunksize=args.chunksize, engine=args.engine,
+                    output_format=args.output_format, partition_by=args.partition_by)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,77 @@
+"""Mesures, features et modèles synthétiques partagés par les tests"""
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import clean_meteo_csv
+import train_weather_model
+
+
+def make_measurements(n_locations=4, n_hours=240, seed=0, start='2025-01-01'):
+    """Mesures horaires nettoyées (cycle journalier + bruit), une série par localisation"""
+    rng = np.random.default_rng(seed)
+    hours = np.tile(np.arange(n_hours), n_locations)
+    daily = np.sin(2 * np.pi * hours / 24)
+    n_rows = len(hours)
+
+    return pd.DataFrame({
+        'Forecast timestamp': pd.Timestamp(start, tz='UTC') + pd.to_timedelta(hours, unit='h'),
+        'Position': np.repeat([f'{48 + i}.0000, 2.0000' for i in range(n_locations)], n_hours),
+        '2 metre temperature': 12 + 6 * daily + rng.normal(0, 0.5, n_rows),
+        '2 metre relative humidity': 70 - 15 * daily + rng.normal(0, 2, n_rows),
+        '10m wind speed': 10 + rng.normal(0, 2, n_rows),
+        'Total precipitation': rng.exponential(0.2, n_rows)
+    })
+
+
+EXPORT_HEADER = ';'.join(['Forecast timestamp', 'Position'] + clean_meteo_csv.NUMERIC_COLUMNS)
+
+
+def write_export(path, n_rows, integer_rows):
+    """Export brut dont les `integer_rows` premières lignes n'ont que des précipitations entières"""
+    lines = [EXPORT_HEADER]
+    for i in range(n_rows):
+        precipitation = '0' if i < integer_rows else f'{0.01 * (i % 50) + 0.47:.2f}'
+        lines.append(f'2025-01-{1 + i // 24 % 28:02d}T{i % 24:02d}:00:00+0000;48.8500, 2.3500;'
+                     f'12.5;10.5;14.5;70.2;{precipitation};8.4')
+    path.write_text('\n'.join(lines) + '\n')
+
+
+@pytest.fixture(scope='session')
+def features():
+    """Matrice de features et cibles (build_features) des mesures synthétiques"""
+    return train_weather_model.build_features(make_measurements())
+
+
+@pytest.fixture(scope='session')
+def trained_models_dir(tmp_path_factory, features):
+    """Répertoire de modèles écrit par save_models (petites forêts, scaler séparé)"""
+    models = train_weather_model.train_models(features, model_params={'n_estimators': 10}, cv_splits=0)
+    model_dir = tmp_path_factory.mktemp('trained') / 'ml_models'
+    train_weather_model.save_models(models, str(model_dir))
+    return model_dir
+
+
+@pytest.fixture
+def models_dir(tmp_path, monkeypatch, trained_models_dir):
+    """Copie modifiable des modèles dans ./ml_models (répertoire courant: tmp_path)"""
+    model_dir = tmp_path / 'ml_models'
+    shutil.copytree(trained_models_dir, model_dir)
+    monkeypatch.chdir(tmp_path)
+    return model_dir
+
+
+@pytest.fixture
+def api(models_dir, monkeypatch):
+    """Module de l'API servant les modèles de models_dir; état global remis à zéro après le test"""
+    import weather_prediction_api
+
+    monkeypatch.setattr(weather_prediction_api, 'models', {})
+    monkeypatch.setattr(weather_prediction_api, 'previous_models', None)
+    monkeypatch.setattr(weather_prediction_api, 'location_histories', {})
+    weather_prediction_api.prediction_cache.clear()
+    weather_prediction_api.publish_models(weather_prediction_api.read_models())
+    yield weather_prediction_api
+    weather_prediction_api.prediction_cache.clear()
@@ -0,0 +1,75 @@
+"""
+Moteur d'inférence NumPy des forêts aplaties par train_weather_model.flatten_model()
+
+Partagé par l'API (moteur 'flat') et par les benchmarks de l'entraînement: seul NumPy
+est nécessaire pour l'importer.
+"""
+import numpy as np
+
+
+class FlatForest:
+    """
+    Forêt aplatie par train_weather_model.flatten_forest(), évaluée en NumPy sans sklearn
+
+    Tous les arbres sont parcourus en même temps pour toutes les lignes d'un bloc:
+    chaque itération descend d'un niveau, les feuilles pointant sur elles-mêmes.
+    Les modèles de gradient boosting (flatten_boosting) ont le même format: leurs
+    feuilles sont additionnées à une valeur initiale au lieu d'être moyennées.
+    """
+
+    # Lignes évaluées à la fois (garde les tableaux n_lignes × n_arbres en cache)
+    CHUNK_SIZE = 512
+
+    def __init__(self, arrays):
+        # Les tableaux sont utilisés tels quels (sans copie): chargés avec mmap_mode,
+        # ils restent partagés entre les workers via le cache de pages du système
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.value = arrays['value']
+        self.roots = arrays['roots'].astype(np.intp)
+        self.max_depth = arrays['max_depth']
+        self.n_features = arrays['n_features']
+        self.missing_left = arrays['missing_left']
+
+        # Forêt: moyenne des feuilles; gradient boosting: valeur initiale + somme des feuilles
+        self.aggregate = arrays.get('aggregate', 'mean')
+        self.baseline = arrays.get('baseline', 0.0)
+        # Les arbres sklearn comparent les features en float32, le gradient boosting en float64
+        # (seuils float32 du format compact: arrondis pour des décisions identiques)
+        self.input_dtype = np.dtype(arrays.get('input_dtype', 'float32'))
+
+        # Enfants entrelacés [gauche, droit] pour descendre avec un seul np.take
+        self.children = arrays['children'].reshape(-1)
+
+    def _predict_chunk(self, X):
+        offsets = (np.arange(len(X), dtype=np.intp) * X.shape[1])[:, np.newaxis]
+        flat_X = X.ravel()
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        has_missing = np.isnan(flat_X).any()
+
+        for _ in range(self.max_depth):
+            values = np.take(flat_X, offsets + np.take(self.feature, nodes))
+            # Même test que sklearn (X <= seuil à gauche)
+            go_right = ~(values <= np.take(self.threshold, nodes))
+            if has_missing:
+                # Valeurs manquantes: branche choisie à l'entraînement
+                missing = np.isnan(values)
+                go_right[missing] = ~np.take(self.missing_left, nodes[missing])
+            nodes = np.take(self.children, 2 * nodes + go_right)
+
+        # Moyenne (ou somme) des feuilles atteintes sur tous les arbres, accumulée en
+        # float64 même pour les feuilles float32 du format compact
+        leaves = np.take(self.value, nodes, axis=0)
+        if self.aggregate == 'sum':
+            return self.baseline + leaves.sum(axis=1, dtype=np.float64)
+        return leaves.mean(axis=1, dtype=np.float64)
+
+    def predict(self, X):
+        X = np.ascontiguousarray(X, dtype=self.input_dtype)
+
+        predictions = np.concatenate([
+            self._predict_chunk(X[start:start + self.CHUNK_SIZE])
+            for start in range(0, len(X), self.CHUNK_SIZE)
+        ]) if len(X) else np.empty((0, self.value.shape[1]))
+
+        return predictions[:, 0] if predictions.shape[1] == 1 else predictions
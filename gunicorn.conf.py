@@ -0,0 +1,26 @@
+"""
+Configuration gunicorn pour l'API de prédiction météo (voir wsgi.py)
+
+Variables d'environnement:
+- ML_BIND: adresse d'écoute (par défaut 0.0.0.0:5000)
+- ML_WORKERS: nombre de workers (par défaut un par cœur)
+- ML_THREADS: threads par worker (par défaut 1)
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('ML_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('ML_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.environ.get('ML_THREADS', 1))
+
+# Pas de préchargement dans le maître: chaque worker mappe lui-même les fichiers des
+# modèles (mémoire partagée par le cache de pages), et un redémarrage gracieux
+# (kill -HUP <pid maître>) recharge des workers avec les modèles présents sur disque
+preload_app = False
+
+# Les requêtes en cours ont ce délai pour se terminer lors d'un redémarrage
+graceful_timeout = 30
+timeout = 60
+
+accesslog = '-'
+errorlog = '-'
@@ -0,0 +1,432 @@
+"""
+Pipeline complet: nettoyage → features → entraînement → analyse
+
+Chaque étape a une empreinte (SHA-256) calculée à partir de ses entrées, de ses
+paramètres, du code qui la produit et de l'empreinte de l'étape précédente. Ses
+artefacts sont conservés dans le cache (.pipeline_cache/<étape>/<empreinte>/) et une
+étape dont l'empreinte est déjà en cache n'est pas relancée: changer les
+hyperparamètres ne relance que l'entraînement et l'analyse.
+
+Usage:
+    python run_pipeline.py meteo-0025.csv --n-estimators 200 --max-depth 12
+"""
+import argparse
+import glob
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import sys
+import time
+from datetime import datetime
+
+import joblib
+import pandas as pd
+import sklearn
+
+import clean_meteo_csv
+import train_weather_model
+
+
+STAGES = ['clean', 'features', 'train', 'analyze']
+
+# Fichier écrit en dernier dans le répertoire d'une étape: sa présence marque un artefact complet
+STAGE_RECORD = 'stage.json'
+
+# Métadonnées du jeu de modèles, copiées en dernier à la publication
+METADATA_FILE = 'model_metadata.json'
+
+
+class PipelineError(Exception):
+    """Échec d'une étape du pipeline"""
+
+
+def digest_json(value):
+    """Empreinte SHA-256 d'une valeur sérialisable en JSON (clés triées)"""
+    payload = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def digest_code(*objects):
+    """Empreinte du code source de modules ou de fonctions"""
+    sha = hashlib.sha256()
+    for obj in objects:
+        sha.update(inspect.getsource(obj).encode('utf-8'))
+    return sha.hexdigest()
+
+
+class FileDigests:
+    """
+    Empreintes du contenu des fichiers d'entrée, mémorisées par (chemin, taille, date de
+    modification) dans le cache: un export inchangé n'est pas relu à chaque lancement
+    """
+
+    def __init__(self, cache_dir):
+        self.path = os.path.join(cache_dir, 'file_digests.json')
+        try:
+            with open(self.path, 'r') as f:
+                self.known = json.load(f)
+        except (OSError, ValueError):
+            self.known = {}
+
+    def digest(self, path):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        signature = [stat.st_size, stat.st_mtime_ns]
+
+        entry = self.known.get(path)
+        if entry and entry['signature'] == signature:
+            return entry['sha256']
+
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha.update(block)
+
+        self.known[path] = {'signature': signature, 'sha256': sha.hexdigest()}
+        return self.known[path]['sha256']
+
+    def save(self):
+        with open(f'{self.path}.tmp', 'w') as f:
+            json.dump(self.known, f, indent=2)
+        os.replace(f'{self.path}.tmp', self.path)
+
+
+def resolve_inputs(input_path):
+    """Fichier CSV unique, ou fichiers d'un répertoire / motif glob (comme clean_meteo_csv.py)"""
+    if os.path.isdir(input_path) or glob.has_magic(input_path):
+        return clean_meteo_csv.expand_inputs(input_path)
+    return [input_path] if os.path.isfile(input_path) else []
+
+
+def input_keys(input_files):
+    """
+    Clé de chaque entrée dans l'empreinte du nettoyage: chemin relatif au répertoire
+    commun des entrées (deux fichiers de même nom dans des sous-répertoires différents
+    restent distincts; déplacer tout le répertoire des exports ne change rien)
+    """
+    paths = [os.path.abspath(path) for path in input_files]
+    root = os.path.commonpath([os.path.dirname(path) for path in paths])
+    return [os.path.relpath(path, root) for path in paths]
+
+
+def run_clean(stage_dir, input_files, params, workers=None, chunksize=None):
+    """Nettoie un ou plusieurs exports vers clean.csv ou clean.parquet dans le répertoire de l'étape"""
+    extension = 'parquet' if params['output_format'] == 'parquet' else 'csv'
+    output = os.path.join(stage_dir, f'clean.{extension}')
+
+    if len(input_files) == 1:
+        _, stats = clean_meteo_csv.clean_meteo_csv(
+            input_files[0], output, params['missing_threshold'], params['conversion_threshold'],
+            chunksize=chunksize, output_format=params['output_format'],
+            partition_by=params['partition_by'])
+        if 'error' in stats:
+            raise PipelineError(f"Nettoyage de {input_files[0]}: {stats['error']}")
+    else:
+        report = clean_meteo_csv.clean_many(
+            input_files, merge_output=output, workers=workers,
+            report_file=os.path.join(stage_dir, 'clean_report.json'),
+            output_format=params['output_format'],
+            missing_threshold=params['missing_threshold'],
+            conversion_threshold=params['conversion_threshold'],
+            chunksize=chunksize, partition_by=params['partition_by'])
+        stats = report['total']
+        # Un résultat partiel ne doit pas être mis en cache comme s'il était complet
+        if stats['failed_files']:
+            failed = [name for name, file_stats in report['files'].items() if 'error' in file_stats]
+            raise PipelineError(f"Nettoyage en erreur pour: {', '.join(failed)}")
+
+    return {'output': os.path.basename(output), 'stats': stats}
+
+
+def run_features(stage_dir, clean_path, params):
+    """Construit la matrice de features (lags, moyennes mobiles, cibles) et l'enregistre"""
+    df = train_weather_model.load_and_prepare_data(
+        clean_path, start=params['start'], end=params['end'], regions=params['regions'])
+    if df is None or df.empty:
+        raise PipelineError("Impossible de charger ou préparer les données")
+
+    joblib.dump(df, os.path.join(stage_dir, 'features.pkl'))
+    return {'output': 'features.pkl', 'rows': len(df), 'columns': list(df.columns)}
+
+
+def run_train(stage_dir, features_path, params):
+    """Entraîne les modèles sur la matrice de features et les enregistre dans models/"""
+    df = joblib.load(features_path)
+    selection_fraction = (train_weather_model.COMPACTION_SELECTION_FRACTION
+                          if params['compact_tolerance'] is not None else 0.0)
+    models = train_weather_model.train_models(
+        df, multi_output=params['multi_output'], model_params=params['model_params'],
+        backend=params['backend'], selection_fraction=selection_fraction)
+    train_weather_model.save_models(models, os.path.join(stage_dir, 'models'),
+                                    fold_scaler=params['fold_scaler'], compact=params['compact'],
+                                    compact_tolerance=params['compact_tolerance'],
+                                    compress=params['compress'])
+    return {'output': 'models', 'metrics': models['metrics']}
+
+
+def publish_models(models_dir, output_dir):
+    """
+    Copie les modèles de l'étape d'entraînement vers le répertoire servi par l'API
+
+    Chaque fichier est copié puis renommé, model_metadata.json en dernier (voir
+    save_models). Rien n'est copié si la version publiée est déjà celle-ci.
+    """
+    source_metadata = os.path.join(models_dir, METADATA_FILE)
+    target_metadata = os.path.join(output_dir, METADATA_FILE)
+    if os.path.exists(target_metadata):
+        with open(source_metadata, 'rb') as f, open(target_metadata, 'rb') as g:
+            if f.read() == g.read():
+                return False
+
+    os.makedirs(output_dir, exist_ok=True)
+    filenames = sorted(os.listdir(models_dir), key=lambda name: name == METADATA_FILE)
+    for filename in filenames:
+        target = os.path.join(output_dir, filename)
+        shutil.copyfile(os.path.join(models_dir, filename), f'{target}.tmp')
+        os.replace(f'{target}.tmp', target)
+    return True
+
+
+class Pipeline:
+    """Exécute les étapes dans l'ordre en réutilisant les artefacts déjà en cache"""
+
+    def __init__(self, cache_dir='.pipeline_cache', force_from=None):
+        self.cache_dir = cache_dir
+        self.force_from = STAGES.index(force_from) if force_from else len(STAGES)
+        self.runs = []
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def stage(self, name, fingerprint_inputs, action):
+        """
+        Retourne (répertoire, enregistrement) de l'étape, en l'exécutant seulement si son
+        empreinte n'est pas en cache (ou si elle est forcée)
+
+        action(stage_dir) produit les artefacts dans stage_dir et retourne un dict
+        décrivant le résultat, conservé dans stage.json.
+        """
+        fingerprint = digest_json(dict(fingerprint_inputs, stage=name))
+        stage_dir = os.path.join(self.cache_dir, name, fingerprint[:16])
+        record_path = os.path.join(stage_dir, STAGE_RECORD)
+        forced = STAGES.index(name) >= self.force_from
+
+        if not forced and os.path.exists(record_path):
+            with open(record_path, 'r') as f:
+                record = json.load(f)
+            print(f"⏩ {name}: réutilisé ({fingerprint[:16]})")
+            self.runs.append({'stage': name, 'fingerprint': fingerprint, 'reused': True, 'seconds': 0.0})
+            return stage_dir, record
+
+        print(f"\n▶️  {name}: exécution ({fingerprint[:16]})")
+
+        # Artefact incomplet d'un lancement interrompu ou étape forcée: repartir de zéro
+        if os.path.isdir(stage_dir):
+            shutil.rmtree(stage_dir)
+        os.makedirs(stage_dir)
+
+        start = time.perf_counter()
+        try:
+            result = action(stage_dir)
+        except Exception:
+            shutil.rmtree(stage_dir, ignore_errors=True)
+            raise
+        elapsed = time.perf_counter() - start
+
+        record = dict(result, stage=name, fingerprint=fingerprint, inputs=fingerprint_inputs,
+                      seconds=elapsed, created=datetime.now().isoformat())
+        with open(f'{record_path}.tmp', 'w') as f:
+            json.dump(record, f, indent=2, ensure_ascii=False, default=str)
+        os.replace(f'{record_path}.tmp', record_path)
+
+        print(f"✅ {name}: terminé en {elapsed:.1f}s")
+        self.runs.append({'stage': name, 'fingerprint': fingerprint, 'reused': False, 'seconds': elapsed})
+        return stage_dir, record
+
+    def save_run(self):
+        """Résumé du dernier lancement (étapes, empreintes, réutilisation, durées)"""
+        path = os.path.join(self.cache_dir, 'last_run.json')
+        with open(path, 'w') as f:
+            json.dump({'date': datetime.now().isoformat(), 'stages': self.runs}, f, indent=2)
+
+
+def run_pipeline(input_path, clean_params, feature_params, train_params, until='analyze',
+                 cache_dir='.pipeline_cache', output_dir='ml_models', analysis_dir='ml_analysis',
+                 force_from=None, workers=None, chunksize=None):
+    """
+    Enchaîne nettoyage, features, entraînement et analyse jusqu'à l'étape `until`
+
+    Les paramètres sans effet sur le résultat (workers, chunksize) ne font pas partie
+    des empreintes. Les modèles entraînés sont publiés dans `output_dir` et l'analyse
+    dans `analysis_dir`.
+
+    Returns:
+        list: Pour chaque étape, son empreinte, sa durée et si elle a été réutilisée
+    """
+    input_files = resolve_inputs(input_path)
+    if not input_files:
+        raise PipelineError(f"Aucun fichier CSV trouvé: {input_path}")
+
+    pipeline = Pipeline(cache_dir, force_from)
+    last = STAGES.index(until)
+
+    digests = FileDigests(cache_dir)
+    inputs = {key: digests.digest(path) for key, path in zip(input_keys(input_files), input_files)}
+    digests.save()
+
+    clean_dir, clean_record = pipeline.stage('clean', {
+        'inputs': inputs,
+        'params': clean_params,
+        'code': digest_code(clean_meteo_csv)
+    }, lambda stage_dir: run_clean(stage_dir, input_files, clean_params, workers, chunksize))
+
+    if last >= STAGES.index('features'):
+        features_dir, features_record = pipeline.stage('features', {
+            'upstream': clean_record['fingerprint'],
+            'params': feature_params,
+            # Seul le code des features compte: modifier l'entraînement ne les invalide pas
+            'code': digest_code(train_weather_model.read_parquet_dataset,
+                                train_weather_model.build_features,
+                                train_weather_model.load_and_prepare_data),
+            'constants': [train_weather_model.FEATURE_COLUMNS, train_weather_model.LAG_HOURS,
+                          train_weather_model.ROLLING_HOURS, train_weather_model.HORIZON_HOURS,
+                          train_weather_model.CALENDAR_TIMEZONE],
+            'pandas': pd.__version__
+        }, lambda stage_dir: run_features(stage_dir, os.path.join(clean_dir, clean_record['output']),
+                                          feature_params))
+
+    if last >= STAGES.index('train'):
+        train_dir, train_record = pipeline.stage('train', {
+            'upstream': features_record['fingerprint'],
+            'params': train_params,
+            'code': digest_code(train_weather_model),
+            'sklearn': sklearn.__version__
+        }, lambda stage_dir: run_train(stage_dir, os.path.join(features_dir, features_record['output']),
+                                       train_params))
+
+        models_dir = os.path.join(train_dir, train_record['output'])
+        if publish_models(models_dir, output_dir):
+            print(f"📦 Modèles publiés dans '{output_dir}'")
+
+    if last >= STAGES.index('analyze'):
+        # matplotlib/seaborn ne sont nécessaires que pour cette étape
+        import analyze_model_performance
+
+        def run_analyze(stage_dir):
+            analyze_model_performance.run_analysis(models_dir, os.path.join(stage_dir, 'ml_analysis'))
+            return {'output': 'ml_analysis'}
+
+        analyze_dir, analyze_record = pipeline.stage('analyze', {
+            'upstream': train_record['fingerprint'],
+            'code': digest_code(analyze_model_performance)
+        }, run_analyze)
+
+        shutil.copytree(os.path.join(analyze_dir, analyze_record['output']), analysis_dir,
+                        dirs_exist_ok=True)
+
+    pipeline.save_run()
+    return pipeline.runs
+
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(
+        description="Pipeline nettoyage → features → entraînement → analyse avec cache par étape")
+    parser.add_argument('input_file',
+                        help="Export CSV brut (séparateur ';'), répertoire ou motif glob ('exports/*.csv')")
+
+    group = parser.add_argument_group("nettoyage")
+    group.add_argument('--missing-threshold', type=float, default=0.0,
+                       help="Seuil de valeurs manquantes (suppression stricte par défaut)")
+    group.add_argument('--conversion-threshold', type=float, default=0.1,
+                       help="Proportion tolérée de valeurs non numériques par colonne")
+    group.add_argument('--format', dest='output_format', choices=['csv', 'parquet'], default='csv',
+                       help="Format des données nettoyées (parquet: nécessite pyarrow)")
+    group.add_argument('--partition-by', choices=clean_meteo_csv.PARTITION_KEYS, default=None,
+                       help="Partitionner les données Parquet par mois ou par région")
+    group.add_argument('--chunksize', type=int, default=None,
+                       help="Nettoyer par blocs de N lignes (mémoire bornée)")
+    group.add_argument('--workers', type=int, default=None,
+                       help="Plusieurs fichiers: nombre de processus de nettoyage")
+
+    group = parser.add_argument_group("features")
+    group.add_argument('--start', default=None, help="Première échéance utilisée (date ISO, incluse)")
+    group.add_argument('--end', default=None, help="Fin des échéances utilisées (date ISO, exclue)")
+    group.add_argument('--regions', nargs='+', default=None,
+                       help="Tuiles à utiliser (données Parquet partitionnées par région)")
+
+    group = parser.add_argument_group("entraînement")
+    group.add_argument('--backend', choices=list(train_weather_model.MODEL_BACKENDS), default='random_forest',
+                       help="Famille de modèles (par défaut: random_forest)")
+    group.add_argument('--n-estimators', type=int, default=None,
+                       help="Nombre d'arbres par modèle (par défaut: celui de la famille, "
+                            "voir train_weather_model.py --help)")
+    group.add_argument('--max-depth', type=int, default=None,
+                       help="Profondeur maximale des arbres (par défaut: celle de la famille)")
+    group.add_argument('--multi-output', action='store_true',
+                       help="Une seule forêt multi-sorties pour la température et l'humidité")
+    group.add_argument('--fold-scaler', action='store_true',
+                       help="Intégrer la normalisation dans les seuils des arbres (pas de scaler.pkl)")
+    group.add_argument('--compact', action='store_true',
+                       help="Formes aplaties en float32 (voir train_weather_model.py --help)")
+    group.add_argument('--compact-tolerance', type=float, default=None,
+                       help="Élaguer et réduire les modèles dans cette tolérance de MAE relative")
+    group.add_argument('--compress', choices=['zlib', 'gzip', 'bz2', 'lzma', 'xz'], default=None,
+                       help="Compression des modèles sklearn (niveau 3)")
+
+    parser.add_argument('--until', choices=STAGES, default='analyze',
+                        help="Dernière étape exécutée (par défaut: analyze)")
+    parser.add_argument('--force', choices=STAGES, default=None,
+                        help="Relancer cette étape et les suivantes même si elles sont en cache")
+    parser.add_argument('--cache-dir', default='.pipeline_cache',
+                        help="Répertoire des artefacts intermédiaires (par défaut: .pipeline_cache)")
+    parser.add_argument('--output-dir', default='ml_models',
+                        help="Répertoire où publier les modèles (par défaut: ml_models)")
+    parser.add_argument('--analysis-dir', default='ml_analysis',
+                        help="Répertoire où copier l'analyse (par défaut: ml_analysis)")
+    args = parser.parse_args()
+
+    clean_params = {
+        'missing_threshold': args.missing_threshold,
+        'conversion_threshold': args.conversion_threshold,
+        'output_format': args.output_format,
+        'partition_by': args.partition_by
+    }
+    feature_params = {
+        'start': args.start,
+        'end': args.end,
+        'regions': sorted(args.regions) if args.regions else None
+    }
+    if args.multi_output and args.backend != 'random_forest':
+        parser.error("--multi-output n'est disponible qu'avec --backend random_forest")
+    size_param = train_weather_model.MODEL_BACKENDS[args.backend]['size_param']
+    model_params = {key: value for key, value in [(size_param, args.n_estimators),
+                                                  ('max_depth', args.max_depth)] if value is not None}
+    train_params = {
+        'backend': args.backend,
+        # Valeurs effectives: un défaut explicite a la même empreinte que le défaut implicite
+        'model_params': train_weather_model.model_params_for(args.backend, model_params),
+        'multi_output': args.multi_output,
+        'fold_scaler': args.fold_scaler,
+        'compact': args.compact,
+        'compact_tolerance': args.compact_tolerance,
+        'compress': (args.compress, 3) if args.compress else 0
+    }
+
+    try:
+        runs = run_pipeline(args.input_file, clean_params, feature_params, train_params,
+                            until=args.until, cache_dir=args.cache_dir, output_dir=args.output_dir,
+                            analysis_dir=args.analysis_dir, force_from=args.force,
+                            workers=args.workers, chunksize=args.chunksize)
+    except Exception as e:
+        print(f"❌ Erreur: {str(e)}")
+        sys.exit(1)
+
+    print("\n=== Résumé du pipeline ===")
+    for run in runs:
+        status = 'réutilisé' if run['reused'] else f"exécuté en {run['seconds']:.1f}s"
+        print(f"- {run['stage']:<9} {run['fingerprint'][:16]}  {status}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import clean_meteo_csv
+import train_weather_model
+from conftest import write_export
+
+pytest.importorskip('pyarrow')
+
+
+def test_parquet_integer_first_chunk(tmp_path):
+    raw = tmp_path / 'raw.csv'
+    write_export(raw, 3000, integer_rows=2000)
+    output = tmp_path / 'out'
+
+    _, stats = clean_meteo_csv.clean_meteo_csv(str(raw), str(output), chunksize=1000,
+                                               output_format='parquet', partition_by='month')
+    assert 'error' not in stats
+
+    df = train_weather_model.read_parquet_dataset(str(output), clean_meteo_csv.NUMERIC_COLUMNS)
+    assert len(df) == 3000
+    assert df['Total precipitation'].dtype == 'float64'
+    assert df['Total precipitation'].max() == pytest.approx(0.96)
+
+
+def test_merged_parquet_same_stem_and_integer_file(tmp_path):
+    # Deux exports de même nom, dont un sans aucune précipitation décimale
+    (tmp_path / 'a').mkdir()
+    (tmp_path / 'b').mkdir()
+    write_export(tmp_path / 'a' / 'x.csv', 500, integer_rows=500)
+    write_export(tmp_path / 'b' / 'x.csv', 500, integer_rows=0)
+    output = tmp_path / 'merged'
+
+    report = clean_meteo_csv.clean_many([str(tmp_path / 'a' / 'x.csv'), str(tmp_path / 'b' / 'x.csv')],
+                                        merge_output=str(output), workers=1, output_format='parquet')
+    assert report['total']['failed_files'] == 0
+    assert len(list(output.iterdir())) == 2
+
+    df = train_weather_model.read_parquet_dataset(str(output), clean_meteo_csv.NUMERIC_COLUMNS)
+    assert len(df) == 1000
+    assert (df['Total precipitation'].iloc[:500] == 0).all()
+    assert df['Total precipitation'].iloc[500:].max() == pytest.approx(0.96)
+
+
+def test_existing_parquet_dataset_is_replaced(tmp_path):
+    input_file = tmp_path / 'meteo.csv'
+    output_dir = tmp_path / 'meteo.parquet'
+    write_export(input_file, 6, integer_rows=0)
+
+    for _ in range(2):
+        _, stats = clean_meteo_csv.clean_meteo_csv(str(input_file), str(output_dir), output_format='parquet',
+                                                   partition_by='month')
+        assert 'error' not in stats
+
+    assert len(train_weather_model.read_parquet_dataset(str(output_dir), clean_meteo_csv.NUMERIC_COLUMNS)) == 6
+
+
+def test_refuses_to_remove_foreign_directory(tmp_path):
+    input_file = tmp_path / 'meteo.csv'
+    output_dir = tmp_path / 'data'
+    write_export(input_file, 6, integer_rows=0)
+    output_dir.mkdir()
+    (output_dir / 'notes.txt').write_text('à garder')
+
+    _, stats = clean_meteo_csv.clean_meteo_csv(str(input_file), str(output_dir), output_format='parquet')
+
+    assert 'error' in stats
+    assert (output_dir / 'notes.txt').read_text() == 'à garder'
+
+
+def test_merge_replaces_dataset_but_not_foreign_directory(tmp_path):
+    input_files = [tmp_path / 'x.csv', tmp_path / 'y.csv']
+    for input_file in input_files:
+        write_export(input_file, 50, integer_rows=0)
+    output = tmp_path / 'merged'
+
+    for _ in range(2):
+        report = clean_meteo_csv.clean_many([str(f) for f in input_files], merge_output=str(output),
+                                            workers=1, output_format='parquet', partition_by='month')
+        assert report['total']['failed_files'] == 0
+    assert len(train_weather_model.read_parquet_dataset(str(output), clean_meteo_csv.NUMERIC_COLUMNS)) == 100
+
+    (output / 'source=00000_x' / 'README').write_text('à garder')
+    with pytest.raises(ValueError):
+        clean_meteo_csv.clean_many([str(f) for f in input_files], merge_output=str(output),
+                                   workers=1, output_format='parquet')
+    assert (output / 'source=00000_x' / 'README').exists()
+
+
+def test_expand_inputs_skips_clean_outputs(tmp_path):
+    for name in ['a.csv', 'a_clean.csv', 'b.csv', 'notes.txt']:
+        (tmp_path / name).write_text('')
+
+    expected = [str(tmp_path / 'a.csv'), str(tmp_path / 'b.csv')]
+    assert clean_meteo_csv.expand_inputs(str(tmp_path)) == expected
+    assert clean_meteo_csv.expand_inputs(str(tmp_path / '*.csv')) == expected
+
+
+def test_parse_coordinates_matches_extract_coordinates():
+    positions = ['48.85, 2.35', '48.85,2.35', ' -90 , 180 ', '91, 0', '0, -180.5', '1,2,3', 'abc', '12',
+                 '', '1, x', 'nan, nan', 'inf, 0', '1e1, 2e1', '48.85, 2.35', None]
+
+    lat, lon = clean_meteo_csv.parse_coordinates(pd.Series(positions, dtype='str'))
+
+    expected = [clean_meteo_csv.extract_coordinates(pos) if pos is not None else (np.nan, np.nan)
+                for pos in positions]
+    np.testing.assert_array_equal(np.column_stack([lat, lon]), np.array(expected, dtype=float))
+
+
+@pytest.mark.parametrize('integer_rows', [0, 2000, 3000])
+def test_chunked_csv_matches_whole_file(tmp_path, integer_rows):
+    raw = tmp_path / 'raw.csv'
+    write_export(raw, 3000, integer_rows=integer_rows)
+
+    clean_meteo_csv.clean_meteo_csv(str(raw), str(tmp_path / 'whole.csv'))
+    clean_meteo_csv.clean_meteo_csv(str(raw), str(tmp_path / 'chunked.csv'), chunksize=1000)
+
+    assert (tmp_path / 'chunked.csv').read_text() == (tmp_path / 'whole.csv').read_text()
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.preprocessing import StandardScaler
+
+import train_weather_model
+from flat_forest import FlatForest
+
+
+@pytest.fixture(scope='module')
+def data():
+    """Features brutes (échelles différentes), deux cibles et quelques valeurs manquantes"""
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(900, 6)) * [1, 10, 100, 0.1, 5, 50] + [0, 20, 1000, 0, -3, 60]
+    y = np.column_stack([X[:, 0] + np.sin(X[:, 1] / 10), X[:, 2] / 100 - X[:, 4]])
+    X[::17, 3] = np.nan
+    return X[:600], y[:600], X[600:], y[600:]
+
+
+def make_models():
+    return [RandomForestRegressor(n_estimators=8, max_depth=6, random_state=0),
+            HistGradientBoostingRegressor(max_iter=15, max_depth=4, random_state=0)]
+
+
+@pytest.mark.parametrize('model', make_models(), ids=['random_forest', 'hist_gradient_boosting'])
+def test_flat_forest_matches_sklearn(data, model):
+    X, y, X_test, _ = data
+    model.fit(X, y[:, 0])
+
+    flat = FlatForest(train_weather_model.flatten_model(model))
+
+    assert np.allclose(flat.predict(X_test), model.predict(X_test))
+
+
+@pytest.mark.parametrize('model', make_models(), ids=['random_forest', 'hist_gradient_boosting'])
+def test_folded_scaler_matches_scaled_model(data, model):
+    X, y, X_test, _ = data
+    scaler = StandardScaler().fit(X)
+    model.fit(scaler.transform(X), y[:, 0])
+
+    # Features brutes: la normalisation est dans les seuils
+    folded = train_weather_model.fold_scaler_into_model(model, scaler)
+    flat = FlatForest(train_weather_model.flatten_model(folded))
+
+    expected = model.predict(scaler.transform(X_test))
+    assert np.allclose(folded.predict(X_test), expected)
+    assert np.allclose(flat.predict(X_test), expected)
+
+
+def test_multi_output_forest(data):
+    X, y, X_test, _ = data
+    model = RandomForestRegressor(n_estimators=8, max_depth=6, random_state=0).fit(X, y)
+
+    predictions = FlatForest(train_weather_model.flatten_model(model)).predict(X_test)
+
+    assert predictions.shape == (len(X_test), 2)
+    assert np.allclose(predictions, model.predict(X_test))
+
+
+@pytest.mark.parametrize('model', make_models(), ids=['random_forest', 'hist_gradient_boosting'])
+def test_compact_format_matches_rounded_model(data, model):
+    X, y, X_test, _ = data
+    model.fit(X, y[:, 0])
+
+    rounded = train_weather_model.round_leaf_values(model)
+    flat = FlatForest(train_weather_model.flatten_model(rounded, compact=True))
+
+    assert np.allclose(flat.predict(X_test), rounded.predict(X_test))
+
+
+def test_compacted_models(data):
+    X, y, X_test, y_test = data
+    models = {
+        'temperature_model': RandomForestRegressor(n_estimators=12, random_state=0).fit(X, y[:, 0]),
+        'weather_model': RandomForestRegressor(n_estimators=12, random_state=0).fit(X, y)
+    }
+    selection = {'X': X_test[1::2], 'temperature': y_test[1::2, 0], 'humidity': y_test[1::2, 1]}
+    validation = {'X': X_test[::2], 'temperature': y_test[::2, 0], 'humidity': y_test[::2, 1]}
+
+    compacted, _, _, _ = train_weather_model.compact_models(models, selection, validation, tolerance=0.05)
+
+    for model in compacted.values():
+        flat = FlatForest(train_weather_model.flatten_model(model))
+        assert np.allclose(flat.predict(X_test), model.predict(X_test))
@@ -0,0 +1,42 @@
+import shutil
+
+import run_pipeline
+from conftest import write_export
+
+CLEAN_PARAMS = {'missing_threshold': 0.0, 'conversion_threshold': 0.1, 'output_format': 'csv',
+                'partition_by': None}
+
+
+def clean(input_path, cache_dir):
+    """Lance le pipeline jusqu'au nettoyage; retourne (réutilisé, empreinte)"""
+    runs = run_pipeline.run_pipeline(str(input_path), CLEAN_PARAMS, {}, {}, until='clean',
+                                     cache_dir=str(cache_dir), workers=1)
+    return runs[0]['reused'], runs[0]['fingerprint']
+
+
+def test_input_keys_relative_to_common_directory(tmp_path):
+    files = [tmp_path / 'exports' / 'a' / 'x.csv', tmp_path / 'exports' / 'b' / 'x.csv']
+
+    assert run_pipeline.input_keys([str(f) for f in files]) == ['a/x.csv', 'b/x.csv']
+    assert run_pipeline.input_keys([str(files[0])]) == ['x.csv']
+
+
+def test_clean_cache_follows_content_not_location(tmp_path):
+    exports = tmp_path / 'exports'
+    for name in ['a', 'b']:
+        (exports / name).mkdir(parents=True)
+        write_export(exports / name / 'x.csv', 30, integer_rows=0)
+    cache_dir = tmp_path / 'cache'
+
+    reused, fingerprint = clean(exports / '*' / 'x.csv', cache_dir)
+    assert not reused
+    assert clean(exports / '*' / 'x.csv', cache_dir) == (True, fingerprint)
+
+    # Exports déplacés: mêmes clés relatives, même contenu
+    shutil.move(str(exports), str(tmp_path / 'moved'))
+    assert clean(tmp_path / 'moved' / '*' / 'x.csv', cache_dir) == (True, fingerprint)
+
+    # Un seul des deux fichiers de même nom modifié: nouvelle empreinte
+    write_export(tmp_path / 'moved' / 'a' / 'x.csv', 31, integer_rows=0)
+    reused, changed = clean(tmp_path / 'moved' / '*' / 'x.csv', cache_dir)
+    assert not reused and changed != fingerprint
@@ -0,0 +1,188 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import train_weather_model
+from conftest import make_measurements
+
+
+def test_compaction_selects_on_training_rows(features, tmp_path):
+    models = train_weather_model.train_models(features, model_params={'n_estimators': 20}, cv_splits=0,
+                                              selection_fraction=0.2)
+    n_test = len(models['validation']['X'])
+    assert len(models['selection']['X']) + n_test < len(features)
+
+    train_weather_model.save_models(models, str(tmp_path), compact_tolerance=0.05)
+    metadata = json.loads((tmp_path / 'model_metadata.json').read_text())
+
+    assert metadata['compaction_split']['selection']['source'] == 'train'
+    assert metadata['compaction_split']['metrics'] == {'source': 'test', 'rows': n_test}
+    assert set(metadata['metrics']) == {'temperature', 'humidity'}
+
+
+def test_compaction_requires_selection_rows(features, tmp_path):
+    models = train_weather_model.train_models(features, model_params={'n_estimators': 5}, cv_splits=0)
+
+    with pytest.raises(ValueError):
+        train_weather_model.save_models(models, str(tmp_path), compact_tolerance=0.05)
+
+
+def test_incremental_compaction_selects_before_holdout(features, models_dir):
+    models = train_weather_model.train_incremental(features, str(models_dir), new_trees=5, tolerance=1.0,
+                                                   selection_fraction=0.2)
+    train_weather_model.save_models(models, str(models_dir), compact_tolerance=0.05)
+    metadata = json.loads((models_dir / 'model_metadata.json').read_text())
+
+    assert metadata['compaction_split']['selection']['method'] == 'most_recent'
+    assert metadata['compaction_split']['metrics']['source'] == 'holdout'
+
+
+def reference_features(df):
+    """build_features écrit localisation par localisation avec pandas (séries horaires)"""
+    tw = train_weather_model
+    parts = []
+    for _, group in df.groupby(tw.LOCATION_COLUMN, sort=False):
+        series = group.set_index(tw.TIMESTAMP_COLUMN).sort_index()[tw.FEATURE_COLUMNS]
+        part = series.copy()
+        local_time = part.index.tz_convert(tw.CALENDAR_TIMEZONE)
+        part['hour'] = local_time.hour
+        part['day_of_week'] = local_time.dayofweek
+        for col in tw.FEATURE_COLUMNS:
+            for hours_back in tw.LAG_HOURS:
+                part[f'{col}_lag_{hours_back}h'] = series[col].reindex(
+                    series.index - pd.Timedelta(hours=hours_back)).to_numpy()
+            for window in tw.ROLLING_HOURS:
+                part[f'{col}_ma_{window}h'] = series[col].rolling(f'{window}h').mean()
+        future = series.reindex(series.index + pd.Timedelta(hours=tw.HORIZON_HOURS))
+        part['temperature_future'] = future['2 metre temperature'].to_numpy()
+        part['humidity_future'] = future['2 metre relative humidity'].to_numpy()
+        parts.append(part)
+    return pd.concat(parts).dropna()
+
+
+def test_build_features_per_location_with_gaps():
+    df = make_measurements(n_locations=3, n_hours=72)
+    # Trous dans les séries et lignes mélangées: les décalages restent à l'heure exacte
+    df = df.drop(index=[5, 6, 40, 100, 101, 102, 180]).sample(frac=1, random_state=0)
+
+    features = train_weather_model.build_features(df)
+    expected = reference_features(df)
+    expected.index = expected.index.as_unit('ns')
+
+    assert list(features.columns) == list(expected.columns)
+    pd.testing.assert_frame_equal(features, expected, check_freq=False, check_names=False)
+
+
+def test_calendar_features_in_training_timezone():
+    # Dimanche 23h30 UTC: lundi 0h30 à Paris (heure d'hiver)
+    df = make_measurements(n_locations=1, n_hours=60, start='2025-01-04T00:30:00')
+    features = train_weather_model.build_features(df)
+
+    row = features.loc[pd.Timestamp('2025-01-05T23:30:00', tz='UTC')]
+    assert (row['hour'], row['day_of_week']) == (0, 0)
+
+
+@pytest.mark.parametrize('n_hours, n_splits', [(100, 5), (10, 5), (7, 3)])
+def test_time_series_folds(n_hours, n_splits):
+    # Trois mesures par heure (trois localisations), une heure manquante
+    hours = np.repeat(np.delete(np.arange(n_hours), 4), 3)
+    gap = train_weather_model.HORIZON_HOURS
+
+    folds = train_weather_model.time_series_folds(hours, n_splits)
+
+    assert 0 < len(folds) <= n_splits
+    for k, (train_end, test_start, test_end) in enumerate(folds):
+        assert 0 < train_end <= test_start < test_end
+        # Heures entières, cibles d'entraînement (à +gap heures) avant le test
+        assert hours[test_start - 1] < hours[test_start]
+        assert test_end == len(hours) or hours[test_end - 1] < hours[test_end]
+        assert hours[train_end - 1] + gap < hours[test_start]
+        # Fenêtre croissante, blocs de test consécutifs
+        if k:
+            assert train_end >= folds[k - 1][0] and test_start == folds[k - 1][2]
+    assert folds[-1][2] == len(hours)
+
+
+def test_time_series_cv(features):
+    feature_cols = [col for col in features.columns if col not in ['temperature_future', 'humidity_future']]
+
+    summary = train_weather_model.time_series_cv(features, feature_cols, n_splits=3,
+                                                 model_params={'n_estimators': 5}, workers=1)
+
+    assert summary['n_splits'] == 3 and len(summary['folds']) == 3
+    train_rows = [fold['train_rows'] for fold in summary['folds']]
+    assert train_rows == sorted(train_rows)
+    for fold in summary['folds']:
+        assert set(fold) >= {'temperature', 'humidity'}
+    assert summary['temperature']['mae_mean'] > 0
+
+
+def test_split_holdout_keeps_latest_timestamps(features):
+    shuffled = features.sample(frac=1, random_state=0)
+
+    fit_df, holdout_df = train_weather_model.split_holdout(shuffled)
+
+    assert len(fit_df) + len(holdout_df) == len(features)
+    assert fit_df.index.max() < holdout_df.index.min()
+    assert len(holdout_df) == pytest.approx(0.2 * len(features), abs=features.index.value_counts().max())
+
+
+def test_train_incremental_adds_and_retires_trees(features, models_dir):
+    models = train_weather_model.train_incremental(features, str(models_dir), new_trees=5, max_trees=12,
+                                                   tolerance=1.0)
+
+    assert len(models['temp_model'].estimators_) == len(models['humid_model'].estimators_) == 12
+    assert [generation['n_trees'] for generation in models['tree_lineage']] == [7, 5]
+    assert models['incremental']['retired_trees'] == 3
+
+    train_weather_model.save_models(models, str(models_dir))
+    metadata = json.loads((models_dir / 'model_metadata.json').read_text())
+    assert sum(generation['n_trees'] for generation in metadata['tree_lineage']) == 12
+    assert metadata['hyperparameters']['n_estimators'] == 12
+
+
+def test_train_incremental_rejects_worse_models(features, models_dir):
+    before = (models_dir / 'temperature_model.pkl').read_bytes()
+
+    # Tolérance négative: toute version doit faire strictement mieux que l'actuelle
+    assert train_weather_model.train_incremental(features, str(models_dir), new_trees=2, tolerance=-0.99) is None
+    assert (models_dir / 'temperature_model.pkl').read_bytes() == before
+
+
+class Interrupted(Exception):
+    pass
+
+
+def test_tune_forest_resumes_from_trace(features, tmp_path, monkeypatch):
+    feature_cols = [col for col in features.columns if col not in ['temperature_future', 'humidity_future']]
+    options = dict(workers=1, n_candidates=4, eta=2, n_rungs=2)
+
+    reference = train_weather_model.tune_forest(features, feature_cols, str(tmp_path / 'reference.json'), **options)
+    n_evaluations = len(json.loads((tmp_path / 'reference.json').read_text())['evaluations'])
+
+    evaluate_candidate = train_weather_model.evaluate_candidate
+    calls = []
+
+    def interrupted_after_three(*args):
+        if len(calls) == 3:
+            raise Interrupted
+        calls.append(args)
+        return evaluate_candidate(*args)
+
+    # Recherche interrompue après trois évaluations (tracées au fur et à mesure)
+    monkeypatch.setattr(train_weather_model, 'evaluate_candidate', interrupted_after_three)
+    trace_file = str(tmp_path / 'trace.json')
+    with pytest.raises(Interrupted):
+        train_weather_model.tune_forest(features, feature_cols, trace_file, **options)
+
+    calls.clear()
+    monkeypatch.setattr(train_weather_model, 'evaluate_candidate',
+                        lambda *args: calls.append(args) or evaluate_candidate(*args))
+    resumed = train_weather_model.tune_forest(features, feature_cols, trace_file, **options)
+
+    assert len(calls) == n_evaluations - 3
+    assert resumed['forest_params'] == reference['forest_params']
+    trace = json.loads((tmp_path / 'trace.json').read_text())
+    assert trace['complete'] and len(trace['evaluations']) == n_evaluations
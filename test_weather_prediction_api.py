@@ -0,0 +1,340 @@
+import json
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+import weather_prediction_api
+
+
+def test_admin_disabled_without_token(api, monkeypatch):
+    monkeypatch.setattr(api, 'ADMIN_TOKEN', None)
+    client = api.app.test_client()
+
+    for path in ['/admin/reload', '/admin/rollback']:
+        response = client.post(path, headers={'X-Admin-Token': ''})
+        assert response.status_code == 403
+
+
+def test_admin_requires_matching_token(api, monkeypatch):
+    monkeypatch.setattr(api, 'ADMIN_TOKEN', 'secret')
+    client = api.app.test_client()
+
+    assert client.post('/admin/reload').status_code == 403
+    assert client.post('/admin/reload', headers={'X-Admin-Token': 'wrong'}).status_code == 403
+    assert client.post('/admin/reload', headers={'X-Admin-Token': 'secret'}).status_code == 200
+
+
+def test_admin_not_open_to_cross_origin(api, monkeypatch):
+    monkeypatch.setattr(api, 'ADMIN_TOKEN', 'secret')
+    client = api.app.test_client()
+    origin = {'Origin': 'https://example.com'}
+
+    admin = client.post('/admin/rollback', headers={**origin, 'X-Admin-Token': 'secret'})
+    assert 'Access-Control-Allow-Origin' not in admin.headers
+    assert 'Access-Control-Allow-Origin' in client.get('/health/live', headers=origin).headers
+
+
+class StopWatching(Exception):
+    pass
+
+
+def test_watcher_retries_when_reload_busy(api, models_dir, monkeypatch):
+    metadata_path = models_dir / 'model_metadata.json'
+    metadata = json.loads(metadata_path.read_text())
+    metadata['training_date'] = 'nouvelle-version'
+    metadata_path.write_text(json.dumps(metadata))
+
+    outcomes = iter([(False, api.RELOAD_BUSY), (False, 'modèle invalide')])
+    calls = []
+
+    def fake_reload():
+        calls.append(1)
+        return next(outcomes)
+
+    sleeps = []
+
+    def fake_sleep(interval):
+        # Quatre tours de surveillance: occupé, échec, puis un tour sans rechargement
+        sleeps.append(interval)
+        if len(sleeps) > 3:
+            raise StopWatching
+
+    monkeypatch.setattr(api, 'reload_models', fake_reload)
+    monkeypatch.setattr(api.time, 'sleep', fake_sleep)
+
+    with pytest.raises(StopWatching):
+        api.watch_models(0.01, str(models_dir))
+
+    # Verrou occupé: nouvel essai; échec réel: version marquée vue, pas de nouvel essai
+    assert len(calls) == 2
+
+
+WEATHER = {'temperature': 20, 'humidity': 65, 'wind_speed': 15, 'precipitation': 0}
+
+
+def test_batch_predict_without_models(api, monkeypatch):
+    monkeypatch.setattr(api, 'models', {})
+    client = api.app.test_client()
+
+    response = client.post('/batch_predict', json={'locations': [{'id': 'a', 'current_weather': WEATHER}]})
+
+    assert response.status_code == 500
+    assert response.get_json() == {'success': False, 'error': 'Modèles non chargés'}
+
+
+def test_reload_warmup_metrics_labelled_warmup(api, monkeypatch):
+    monkeypatch.setattr(api, 'metrics', api.Metrics())
+    monkeypatch.setattr(api, 'ADMIN_TOKEN', 'secret')
+    client = api.app.test_client()
+
+    assert client.post('/admin/reload', headers={'X-Admin-Token': 'secret'}).status_code == 200
+    exposition = client.get('/metrics').get_data(as_text=True)
+
+    sums = [line for line in exposition.splitlines() if line.startswith('meteocrs_stage_duration_seconds_sum')]
+    # La requête d'administration n'a que sa durée totale; les étapes du préchauffage sont à part
+    assert [line for line in sums if 'endpoint="admin_reload"' in line and 'stage="total"' not in line] == []
+    assert any('endpoint="warmup"' in line for line in sums)
+
+
+def observation(hour):
+    """Observation horaire (clés de current_weather), précipitation parfois manquante"""
+    return {'temperature': 12 + 6 * np.sin(hour / 4), 'humidity': 70 - hour % 9, 'wind_speed': 10 + hour % 5,
+            'precipitation': None if hour % 7 == 0 else 0.1 * (hour % 3)}
+
+
+def test_ring_buffer_matches_historical_data(api, monkeypatch):
+    monkeypatch.setattr(api, 'calendar_now', lambda: datetime(2025, 1, 1, 12, tzinfo=timezone.utc))
+    # Plus de deux tours du tampon: sommes glissantes recalculées et fenêtres qui glissent
+    hours = range(60)
+    for hour in hours:
+        api.ingest_observation('paris', observation(hour))
+
+    # Même historique au format JSON (colonnes du modèle), 24 enregistrements
+    historical_data = [{col: observation(hour)[key] for col, (key, _) in api.WEATHER_INPUTS.items()}
+                       for hour in hours[-24:]]
+    current = observation(60)
+
+    expected = api.prepare_features(current, historical_data)
+    served = api.prepare_features(current, location_history=api.get_location_history('paris'))
+
+    np.testing.assert_allclose(served, expected)
+
+
+def test_history_not_used_until_full(api, monkeypatch):
+    monkeypatch.setattr(api, 'calendar_now', lambda: datetime(2025, 1, 1, 12, tzinfo=timezone.utc))
+    for hour in range(23):
+        api.ingest_observation('lyon', observation(hour))
+    current = observation(23)
+
+    np.testing.assert_array_equal(api.prepare_features(current, location_history=api.get_location_history('lyon')),
+                                  api.prepare_features(current))
+
+
+def test_prediction_cache_lru_and_ttl(api, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(api.time, 'monotonic', lambda: now[0])
+    cache = api.PredictionCache(max_size=2, ttl=10)
+
+    cache.put_many([('a', 1.0, 10.0), ('b', 2.0, 20.0)])
+    assert cache.get_many(['a']) == [(1.0, 10.0)]  # 'a' devient la plus récente
+    cache.put_many([('c', 3.0, 30.0)])
+    assert cache.get_many(['a', 'b', 'c']) == [(1.0, 10.0), None, (3.0, 30.0)]
+
+    now[0] += 11
+    assert cache.get_many(['a', 'c']) == [None, None]
+    stats = cache.stats()
+    assert (stats['size'], stats['hits'], stats['misses'], stats['evictions']) == (0, 3, 3, 1)
+
+
+def test_predict_matrix_uses_cache(api, monkeypatch):
+    calls = []
+    predict_uncached = api.predict_uncached
+    monkeypatch.setattr(api, 'predict_uncached', lambda features: calls.append(len(features)) or predict_uncached(features))
+
+    with api.using_models(api.models):
+        features = np.stack([api.prepare_features(WEATHER), api.prepare_features(dict(WEATHER, temperature=25))])
+        first = api.predict_matrix(np.vstack([features, features[:1]]))
+        # Même vecteur à la précision des capteurs près: servi par le cache
+        second = api.predict_matrix(features + 0.01)
+
+    assert calls == [2]
+    np.testing.assert_array_equal(first[0][:2], second[0])
+
+    # Nouvelle version publiée: le cache est vidé
+    api.publish_models(api.read_models())
+    with api.using_models(api.models):
+        api.predict_matrix(features)
+    assert calls == [2, 2]
+
+
+def test_columnar_round_trip():
+    columns = {'temperature': np.array([20.5, -3.25, np.nan]), 'humidité': np.array([65, 80, 12])}
+
+    body = weather_prediction_api.encode_columnar(columns)
+    decoded = weather_prediction_api.decode_columnar(body)
+
+    assert list(decoded) == ['temperature', 'humidité']
+    for name, values in columns.items():
+        np.testing.assert_array_equal(decoded[name], values.astype(np.float32))
+
+    with pytest.raises(ValueError):
+        weather_prediction_api.decode_columnar(body[:-4])
+    with pytest.raises(ValueError):
+        weather_prediction_api.decode_columnar(b'XXXX' + body[4:])
+
+
+def test_columnar_batch_matches_json(api):
+    client = api.app.test_client()
+    locations = [dict(WEATHER, temperature=t) for t in (5.0, 20.0, 31.5)]
+
+    body = api.encode_columnar({key: [location[key] for location in locations] for key in WEATHER})
+    response = client.post('/batch_predict', data=body, content_type=api.COLUMNAR_MIMETYPE,
+                           headers={'Accept': api.COLUMNAR_MIMETYPE})
+    assert response.mimetype == api.COLUMNAR_MIMETYPE
+    predictions = api.decode_columnar(response.get_data())
+
+    expected = client.post('/batch_predict', json={
+        'locations': [{'id': i, 'current_weather': location} for i, location in enumerate(locations)]
+    }).get_json()['predictions']
+    np.testing.assert_allclose(predictions['temperature'], [p['temperature'] for p in expected], atol=0.05)
+    np.testing.assert_allclose(predictions['humidity'], [p['humidity'] for p in expected], atol=0.5)
+
+
+def test_ndjson_stream(api, monkeypatch):
+    monkeypatch.setattr(api, 'STREAM_CHUNK_SIZE', 2)
+    client = api.app.test_client()
+    locations = [{'id': i, 'current_weather': dict(WEATHER, temperature=10 + i)} for i in range(5)]
+    lines = [json.dumps(location) for location in locations[:3]] + ['', '{pas du json', '[1, 2]']
+    lines += [json.dumps(location) for location in locations[3:]]
+
+    response = client.post('/batch_predict/stream', data='\n'.join(lines) + '\n')
+    assert response.mimetype == 'application/x-ndjson'
+    results = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    # Prédictions dans l'ordre des localisations, lignes invalides numérotées, synthèse à la fin
+    predictions = [result for result in results if 'temperature' in result]
+    assert [result['location_id'] for result in predictions] == [0, 1, 2, 3, 4]
+    assert [result['line'] for result in results if 'line' in result] == [5, 6]
+    assert results[-1]['done'] and (results[-1]['predictions'], results[-1]['errors']) == (5, 2)
+
+    expected = client.post('/batch_predict', json={'locations': locations}).get_json()['predictions']
+    assert [result['temperature'] for result in predictions] == [p['temperature'] for p in expected]
+
+
+def test_ndjson_stream_without_models(api, monkeypatch):
+    monkeypatch.setattr(api, 'models', {})
+
+    response = api.app.test_client().post('/batch_predict/stream', data=json.dumps({'id': 1}) + '\n')
+
+    assert response.status_code == 500
+
+
+def test_micro_batcher_groups_concurrent_requests(api):
+    batcher = api.MicroBatcher(window_ms=100, max_batch_size=4, timeout_ms=5000)
+    with api.using_models(api.models):
+        features = np.stack([api.prepare_features(dict(WEATHER, temperature=t)) for t in range(8)])
+        expected = api.predict_uncached(features)
+
+    results = [None] * len(features)
+
+    def submit(i):
+        with api.using_models(api.models):
+            results[i] = batcher.submit(features[i])
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(len(features))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    np.testing.assert_allclose(np.array(results), np.column_stack(expected))
+    stats = batcher.stats()
+    assert stats['rows'] == 8 and stats['batches'] < 8 and stats['largest_batch'] <= 4
+    assert stats['timeouts'] == 0
+
+
+def test_micro_batcher_wait_is_bounded(api, monkeypatch):
+    release = threading.Event()
+    predict_matrix = api.predict_matrix
+
+    def stuck_predict_matrix(features):
+        release.wait(10)
+        return predict_matrix(features)
+
+    monkeypatch.setattr(api, 'predict_matrix', stuck_predict_matrix)
+    batcher = api.MicroBatcher(window_ms=1, max_batch_size=4, timeout_ms=200)
+
+    try:
+        with api.using_models(api.models):
+            features = api.prepare_features(WEATHER)
+            start = time.perf_counter()
+            temp_pred, humid_pred = batcher.submit(features)
+            elapsed = time.perf_counter() - start
+            expected = api.predict_uncached(features[np.newaxis, :])
+    finally:
+        release.set()
+
+    # Thread bloqué: la requête prédit elle-même sa ligne après le délai
+    assert 0.2 <= elapsed < 2
+    assert (temp_pred, humid_pred) == (expected[0][0], expected[1][0])
+    assert batcher.stats()['timeouts'] == 1
+
+
+def set_training_date(models_dir, training_date):
+    metadata_path = models_dir / 'model_metadata.json'
+    metadata = json.loads(metadata_path.read_text())
+    metadata['training_date'] = training_date
+    metadata_path.write_text(json.dumps(metadata))
+
+
+def test_reload_and_rollback(api, models_dir, monkeypatch):
+    monkeypatch.setattr(api, 'ADMIN_TOKEN', 'secret')
+    client = api.app.test_client()
+    headers = {'X-Admin-Token': 'secret'}
+    first = api.models['version']
+
+    assert client.post('/admin/rollback', headers=headers).status_code == 409
+
+    set_training_date(models_dir, '2030-01-01T00:00:00')
+    reloaded = client.post('/admin/reload', headers=headers).get_json()
+    assert reloaded['version'].startswith('2030-01-01') and reloaded['previous_version'] == first
+    assert client.get('/model_info').get_json()['version'] == reloaded['version']
+
+    # Retour arrière, puis retour à la version la plus récente
+    assert client.post('/admin/rollback', headers=headers).get_json()['version'] == first
+    assert client.post('/admin/rollback', headers=headers).get_json()['version'] == reloaded['version']
+
+
+def test_invalid_version_is_not_published(api, models_dir, monkeypatch):
+    monkeypatch.setattr(api, 'ADMIN_TOKEN', 'secret')
+    client = api.app.test_client()
+    served = api.models['version']
+
+    set_training_date(models_dir, '2030-01-01T00:00:00')
+    (models_dir / 'temperature_model_flat.pkl').write_bytes(b'pas un modele')
+    (models_dir / 'temperature_model.pkl').write_bytes(b'pas un modele')
+
+    response = client.post('/admin/reload', headers={'X-Admin-Token': 'secret'})
+
+    assert response.status_code == 500
+    assert response.get_json()['version'] == served == api.models['version']
+    assert client.post('/predict', json={'current_weather': WEATHER}).status_code == 200
+
+
+def test_calendar_features_in_training_timezone(api, monkeypatch):
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            # Dimanche 23h30 UTC: lundi 0h30 à Paris (heure d'hiver)
+            return datetime(2025, 1, 5, 23, 30, tzinfo=timezone.utc).astimezone(tz)
+
+    monkeypatch.setattr(api, 'datetime', FrozenDatetime)
+
+    with api.using_models(api.models):
+        features = api.prepare_features(WEATHER)
+
+    feature_index = api.models['feature_index']
+    assert (features[feature_index['hour']], features[feature_index['day_of_week']]) == (0, 0)
@@ -1,7 +1,7 @@
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split, cross_val_score
-from sklearn.ensemble import RandomForestRegressor
+from sklearn.model_selection import train_test_split
+from sklearn.ensemble import RandomForestRegressor, HistGradientBoostingRegressor
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import mean_absolute_error, r2_score
 import joblib
@@ -9,26 +9,270 @@ import json
 from datetime import datetime
 import os
 import sys
+import copy
+import argparse
+import io
+import time
+import shutil
+import tempfile
+import itertools
+from contextlib import contextmanager
 
+from flat_forest import FlatForest
 
-def load_and_prepare_data(csv_file):
+
+# Colonnes essentielles pour les features
+FEATURE_COLUMNS = [
+    '2 metre temperature',
+    '2 metre relative humidity',
+    '10m wind speed',
+    'Total precipitation'
+]
+
+# Colonnes identifiant chaque mesure: localisation et échéance
+TIMESTAMP_COLUMN = 'Forecast timestamp'
+LOCATION_COLUMN = 'Position'
+
+# Fuseau des features calendaires (enregistré dans les métadonnées, repris par l'API)
+CALENDAR_TIMEZONE = 'Europe/Paris'
+
+# Décalages (heures), fenêtres des moyennes mobiles (heures) et horizon de prédiction
+LAG_HOURS = [1, 3, 6]
+ROLLING_HOURS = [6, 24]
+HORIZON_HOURS = 3
+
+NS_PER_HOUR = 3_600_000_000_000
+
+# Hyperparamètres de production des forêts (surchargés par --n-estimators / --max-depth)
+FOREST_PARAMS = {
+    'n_estimators': 100,
+    'max_depth': 10
+}
+
+# Hyperparamètres de production du gradient boosting à histogrammes
+# (--n-estimators règle max_iter, le nombre d'arbres)
+BOOSTING_PARAMS = {
+    'max_iter': 300,
+    'learning_rate': 0.1,
+    'max_leaf_nodes': 31,
+    'max_depth': None,
+    'min_samples_leaf': 20
+}
+
+# Familles de modèles disponibles (--backend): classe sklearn, hyperparamètres de production,
+# paramètres fixes et nom du paramètre réglant le nombre d'arbres
+MODEL_BACKENDS = {
+    'random_forest': {
+        'estimator': RandomForestRegressor,
+        'params': FOREST_PARAMS,
+        'fixed_params': {'random_state': 42, 'n_jobs': -1},
+        'size_param': 'n_estimators'
+    },
+    'hist_gradient_boosting': {
+        'estimator': HistGradientBoostingRegressor,
+        'params': BOOSTING_PARAMS,
+        # Nombre d'itérations fixe: artefacts reproductibles, pas de découpage de validation interne
+        'fixed_params': {'random_state': 42, 'early_stopping': False},
+        'size_param': 'max_iter'
+    }
+}
+
+# Espace exploré par --tune (recherche par divisions successives, voir tune_forest)
+TUNING_SPACE = {
+    'n_estimators': [50, 100, 200],
+    'max_depth': [8, 10, 14, None],
+    'min_samples_leaf': [1, 5, 20],
+    'max_features': [1.0, 0.5, 'sqrt']
+}
+
+# Élagage par coût-complexité du format compact (voir prune_forest): valeurs de ccp_alpha
+# essayées, relatives à la variance de la cible de validation
+CCP_ALPHA_GRID = np.geomspace(1e-6, 1e-1, 11)
+
+# Part des lignes d'entraînement mise de côté pour les choix de la compaction (élagage et
+# nombre d'arbres): les métriques enregistrées portent sur des lignes qui n'y ont pas servi
+COMPACTION_SELECTION_FRACTION = 0.2
+
+# Cibles prédites par chaque fichier de modèle (colonnes de models_dict['validation'] et ['selection'])
+MODEL_TARGETS = {
+    'temperature_model': ['temperature'],
+    'humidity_model': ['humidity'],
+    'weather_model': ['temperature', 'humidity']
+}
+
+
+def read_parquet_dataset(path, columns, start=None, end=None, regions=None):
+    """
+    Lit un jeu de données Parquet écrit par clean_meteo_csv.py --format parquet
+
+    Seules les colonnes demandées sont lues. Les filtres de dates (début inclus, fin
+    exclue) et de régions sont transmis au lecteur: les partitions (month=..., region=...)
+    hors plage ne sont pas ouvertes et les groupes de lignes hors plage sont sautés
+    d'après leurs statistiques.
+    """
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(path, format='parquet', partitioning='hive')
+    partitions = dataset.partitioning.schema.names if dataset.partitioning else []
+
+    condition = None
+    def add(expression):
+        nonlocal condition
+        condition = expression if condition is None else condition & expression
+
+    timestamp = ds.field('Forecast timestamp')
+    if start is not None:
+        start = pd.Timestamp(start, tz='UTC')
+        add(timestamp >= start)
+        if 'month' in partitions:
+            add(ds.field('month') >= start.strftime('%Y-%m'))
+    if end is not None:
+        end = pd.Timestamp(end, tz='UTC')
+        add(timestamp < end)
+        if 'month' in partitions:
+            add(ds.field('month') <= end.strftime('%Y-%m'))
+    if regions:
+        if 'region' not in partitions:
+            raise ValueError("Le jeu de données n'est pas partitionné par région")
+        add(ds.field('region').isin(list(regions)))
+
+    columns = [col for col in columns if col in dataset.schema.names]
+    table = dataset.to_table(columns=columns + ['row_number'], filter=condition)
+
+    df = table.to_pandas().sort_values('row_number', kind='stable')
+    return df.drop(columns='row_number').reset_index(drop=True)
+
+
+def build_features(df, feature_columns=None):
+    """
+    Construit features et cibles par localisation, dans l'ordre chronologique réel
+
+    Chaque mesure est repérée par une clé entière (localisation << 32 | heure). Décalages et
+    cible à +3h sont cherchés à l'heure exacte dans la même localisation (NaN si la mesure
+    manque: les trous ne décalent pas les séries) et les moyennes mobiles couvrent les
+    mesures des N dernières heures, mesure courante incluse. Tout est vectorisé: aucune
+    boucle Python par ligne ni par localisation.
+
+    Args:
+        df (DataFrame): Mesures avec TIMESTAMP_COLUMN, LOCATION_COLUMN et les colonnes de features
+        feature_columns (list, optional): Colonnes de mesures (par défaut: FEATURE_COLUMNS)
+
+    Returns:
+        DataFrame: Features et cibles, indexé par l'échéance (UTC), trié par localisation puis échéance
+    """
+    feature_columns = feature_columns or FEATURE_COLUMNS
+
+    # Échéances en nanosecondes UTC (entiers, sans passer par des objets Timestamp)
+    # (le jeu de données Parquet fournit déjà des horodatages: pas de nouvelle analyse)
+    timestamps = df[TIMESTAMP_COLUMN]
+    if not pd.api.types.is_datetime64_any_dtype(timestamps):
+        timestamps = pd.to_datetime(timestamps, utc=True, format='ISO8601')
+    timestamps_ns = pd.DatetimeIndex(timestamps).as_unit('ns').asi8
+    location_codes = pd.factorize(df[LOCATION_COLUMN])[0].astype(np.int64)
+    hours = timestamps_ns // NS_PER_HOUR
+    hours -= hours.min() if len(hours) else 0
+
+    # Tri par localisation puis échéance; une seule mesure par heure et par localisation
+    keys = (location_codes << 32) | hours
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    last = np.ones(len(keys), dtype=bool)
+    last[:-1] = keys[1:] != keys[:-1]
+    order, keys = order[last], keys[last]
+
+    values = {col: df[col].to_numpy(dtype=np.float64)[order] for col in feature_columns}
+    n_rows = len(keys)
+
+    def lookup(offset_hours):
+        """Position de la mesure décalée de `offset_hours` heures (même localisation), -1 sinon"""
+        target = keys + offset_hours
+        positions = np.searchsorted(keys, target)
+        found = positions < n_rows
+        found[found] = keys[positions[found]] == target[found]
+        return np.where(found, positions, -1)
+
+    def take(column_values, positions):
+        return np.where(positions >= 0, column_values[positions], np.nan)
+
+    features = pd.DataFrame(values, index=pd.to_datetime(timestamps_ns[order], utc=True))
+    features.index.name = TIMESTAMP_COLUMN
+
+    # Features calendaires à partir des échéances réelles
+    local_time = features.index.tz_convert(CALENDAR_TIMEZONE)
+    features['hour'] = local_time.hour.to_numpy()
+    features['day_of_week'] = local_time.dayofweek.to_numpy()
+
+    lags = {hours_back: lookup(-hours_back) for hours_back in LAG_HOURS}
+
+    # Fenêtre de chaque ligne: de la première mesure plus récente que N heures à la ligne
+    # elle-même. np.add.reduceat somme les segments [début, fin) aux positions paires.
+    ends = np.arange(1, n_rows + 1)
+    windows = {}
+    for window in ROLLING_HOURS:
+        bounds = np.empty(2 * n_rows, dtype=np.int64)
+        bounds[0::2] = np.searchsorted(keys, keys - window, side='right')
+        bounds[1::2] = ends
+        windows[window] = (bounds, ends - bounds[0::2])
+
+    new_columns = {}
+    for col in feature_columns:
+        for hours_back, positions in lags.items():
+            new_columns[f'{col}_lag_{hours_back}h'] = take(values[col], positions)
+
+        # Moyennes mobiles (un zéro final pour que la borne n_rows soit un indice valide)
+        padded = np.append(values[col], 0.0)
+        for window, (bounds, counts) in windows.items():
+            sums = np.add.reduceat(padded, bounds)[0::2] if n_rows else np.empty(0)
+            new_columns[f'{col}_ma_{window}h'] = sums / counts
+
+    # Cibles: mesures de la même localisation HORIZON_HOURS heures plus tard
+    future = lookup(HORIZON_HOURS)
+    new_columns['temperature_future'] = take(values['2 metre temperature'], future)
+    new_columns['humidity_future'] = take(values['2 metre relative humidity'], future)
+
+    features = pd.concat([features, pd.DataFrame(new_columns, index=features.index)], axis=1)
+
+    # Supprimer les lignes sans historique ou sans cible
+    return features.dropna()
+
+
+def load_and_prepare_data(csv_file, start=None, end=None, regions=None):
     """
     Charge et prépare les données météorologiques pour l'entraînement
+
+    `csv_file` est un CSV nettoyé ou un jeu de données Parquet (répertoire ou fichier
+    .parquet). `start`/`end` restreignent les échéances (début inclus, fin exclue) et
+    `regions` les tuiles d'un jeu de données partitionné par région.
     """
     print(f"Chargement du fichier: {csv_file}")
 
     try:
-        # Charger le CSV avec le bon séparateur
-        df = pd.read_csv(csv_file, sep=';')
+        feature_columns = list(FEATURE_COLUMNS)
+        needed = feature_columns + [TIMESTAMP_COLUMN, LOCATION_COLUMN]
+
+        if os.path.isdir(csv_file) or csv_file.endswith('.parquet'):
+            df = read_parquet_dataset(csv_file, needed, start, end, regions)
+        else:
+            if regions:
+                raise ValueError("Le filtre par région nécessite un jeu de données Parquet")
+
+            # Charger le CSV avec le bon séparateur, seulement les colonnes utiles
+            df = pd.read_csv(csv_file, sep=';', usecols=lambda col: col in needed)
+
+            if start is not None or end is not None:
+                timestamps = pd.to_datetime(df[TIMESTAMP_COLUMN], utc=True, format='ISO8601')
+                in_range = pd.Series(True, index=df.index)
+                if start is not None:
+                    in_range &= timestamps >= pd.Timestamp(start, tz='UTC')
+                if end is not None:
+                    in_range &= timestamps < pd.Timestamp(end, tz='UTC')
+                df = df[in_range]
+
         print(f"Données chargées: {len(df)} lignes, {len(df.columns)} colonnes")
 
-        # Colonnes essentielles pour les features
-        feature_columns = [
-            '2 metre temperature',
-            '2 metre relative humidity',
-            '10m wind speed',
-            'Total precipitation'
-        ]
+        for col in [TIMESTAMP_COLUMN, LOCATION_COLUMN]:
+            if col not in df.columns:
+                raise ValueError(f"Colonne '{col}' requise pour ordonner les mesures par localisation")
 
         # Vérifier que toutes les colonnes existent
         missing_cols = [col for col in feature_columns if col not in df.columns]
@@ -38,33 +282,12 @@ def load_and_prepare_data(csv_file):
             feature_columns = [col for col in feature_columns if col in df.columns]
 
         # Nettoyer les données
-        df_clean = df[feature_columns].dropna()
-        print(f"Données après nettoyage: {len(df_clean)} lignes")
-
-        # Créer des features temporelles à partir de l'index
-        df_clean['hour'] = np.arange(len(df_clean)) % 24
-        df_clean['day_of_week'] = (np.arange(len(df_clean)) // 24) % 7
-
-        # Créer des features de décalage (valeurs passées)
-        for col in feature_columns:
-            if col in df_clean.columns:
-                df_clean[f'{col}_lag_1h'] = df_clean[col].shift(1)
-                df_clean[f'{col}_lag_3h'] = df_clean[col].shift(3)
-                df_clean[f'{col}_lag_6h'] = df_clean[col].shift(6)
-
-                # Moyennes mobiles
-                df_clean[f'{col}_ma_6h'] = df_clean[col].rolling(window=6, min_periods=1).mean()
-                df_clean[f'{col}_ma_24h'] = df_clean[col].rolling(window=24, min_periods=1).mean()
+        df_clean = df.dropna(subset=feature_columns + [TIMESTAMP_COLUMN, LOCATION_COLUMN])
+        print(f"Données après nettoyage: {len(df_clean)} lignes, "
+              f"{df_clean[LOCATION_COLUMN].nunique()} localisations")
 
-        # Supprimer les lignes avec des NaN créés par les décalages
-        df_clean = df_clean.dropna()
-
-        # Créer les targets (prédiction à 3 heures)
-        df_clean['temperature_future'] = df_clean['2 metre temperature'].shift(-3)
-        df_clean['humidity_future'] = df_clean['2 metre relative humidity'].shift(-3)
-
-        # Supprimer les dernières lignes sans target
-        df_clean = df_clean.dropna()
+        # Features de décalage, moyennes mobiles et cibles par localisation
+        df_clean = build_features(df_clean, feature_columns)
 
         print(f"Données finales: {len(df_clean)} lignes")
         print(f"Features créées: {list(df_clean.columns)}")
@@ -76,10 +299,478 @@ def load_and_prepare_data(csv_file):
         return None
 
 
-def train_models(df):
+def benchmark_features(row_counts=(100_000, 1_000_000, 4_000_000), hours_per_location=720, seed=42):
+    """
+    Mesure le temps de build_features en fonction du nombre de lignes
+    (données synthétiques: `hours_per_location` mesures horaires par localisation)
+    """
+    rng = np.random.default_rng(seed)
+    results = []
+
+    for n_rows in row_counts:
+        n_locations = max(1, n_rows // hours_per_location)
+        n_rows = n_locations * hours_per_location
+
+        positions = np.repeat(np.arange(n_locations), hours_per_location)
+        timestamps = pd.Timestamp('2025-01-01', tz='UTC') + pd.to_timedelta(
+            np.tile(np.arange(hours_per_location), n_locations), unit='h')
+        df = pd.DataFrame({col: rng.normal(size=n_rows) for col in FEATURE_COLUMNS})
+        df[TIMESTAMP_COLUMN] = timestamps
+        df[LOCATION_COLUMN] = positions.astype(str)
+
+        # Ordre de fichier quelconque
+        df = df.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+        start = time.perf_counter()
+        features = build_features(df)
+        elapsed = time.perf_counter() - start
+
+        results.append({
+            'rows': n_rows,
+            'locations': n_locations,
+            'seconds': elapsed,
+            'rows_per_second': n_rows / elapsed,
+            'output_rows': len(features)
+        })
+        print(f"{n_rows} lignes, {n_locations} localisations: {elapsed:.2f}s "
+              f"({n_rows / elapsed:.0f} lignes/s)")
+
+    return results
+
+
+def make_model(backend='random_forest', model_params=None):
+    """Modèle de la famille `backend` avec ses hyperparamètres de production, éventuellement surchargés"""
+    spec = MODEL_BACKENDS[backend]
+    params = dict(spec['params'], **spec['fixed_params'])
+    params.update(model_params or {})
+    return spec['estimator'](**params)
+
+
+def make_forest(forest_params=None):
+    """Forêt aléatoire avec les hyperparamètres de production, éventuellement surchargés"""
+    return make_model('random_forest', forest_params)
+
+
+def model_params_for(backend, model_params=None):
+    """Hyperparamètres effectifs (production + surcharges), tels qu'enregistrés dans les métadonnées"""
+    return dict(MODEL_BACKENDS[backend]['params'], **(model_params or {}))
+
+
+def feature_importance(model, X, y, max_rows=5000):
+    """
+    Importance des features: réduction d'impureté pour les forêts, importance par
+    permutation (MAE, sur au plus `max_rows` lignes de test) pour les modèles qui
+    n'en exposent pas (gradient boosting à histogrammes)
+
+    Returns:
+        tuple: (importances normalisées, méthode)
+    """
+    if hasattr(model, 'feature_importances_'):
+        return np.asarray(model.feature_importances_), 'impurity'
+
+    from sklearn.inspection import permutation_importance
+
+    result = permutation_importance(model, X[:max_rows], np.asarray(y)[:max_rows], n_repeats=3,
+                                    random_state=42, scoring='neg_mean_absolute_error')
+    importance = np.clip(result.importances_mean, 0, None)
+    total = importance.sum()
+    return (importance / total if total > 0 else importance), 'permutation'
+
+
+def describe_training_data(df):
+    """Période et nombre de lignes d'une matrice de features (index: échéances)"""
+    return {
+        'data_start': df.index.min().isoformat() if len(df) else None,
+        'data_end': df.index.max().isoformat() if len(df) else None,
+        'rows': len(df)
+    }
+
+
+def train_multi_output_model(feature_cols, scaler, X_train_scaled, X_test_scaled, y_train, y_test,
+                             forest_params=None):
+    """
+    Entraîne une seule forêt multi-sorties sur [temperature_future, humidity_future]
+    """
+    print("\n=== Entraînement du modèle multi-sorties (température + humidité) ===")
+    model = make_forest(forest_params)
+    model.fit(X_train_scaled, y_train)
+
+    # Évaluation par cible
+    y_pred = model.predict(X_test_scaled)
+    metrics = {}
+    for i, (target, unit) in enumerate([('temperature', '°C'), ('humidity', '%')]):
+        mae = mean_absolute_error(y_test[:, i], y_pred[:, i])
+        r2 = r2_score(y_test[:, i], y_pred[:, i])
+        metrics[target] = {'mae': float(mae), 'r2': float(r2)}
+        print(f"MAE {target}: {mae:.2f}{unit}")
+        print(f"R² {target}: {r2:.3f}")
+
+    # Feature importance
+    print("\n=== Importance des features (Top 10) ===")
+    importance_table = pd.DataFrame({
+        'feature': feature_cols,
+        'importance': model.feature_importances_
+    }).sort_values('importance', ascending=False).head(10)
+
+    print(importance_table.to_string())
+
+    return {
+        'multi_model': model,
+        'scaler': scaler,
+        'feature_cols': feature_cols,
+        'backend': 'random_forest',
+        'model_params': model_params_for('random_forest', forest_params),
+        'feature_importance': {
+            'method': 'impurity',
+            'temperature': model.feature_importances_.tolist(),
+            'humidity': model.feature_importances_.tolist()
+        },
+        'metrics': metrics
+    }
+
+
+def time_series_folds(hours, n_splits=5, gap_hours=HORIZON_HOURS):
+    """
+    Découpage chronologique à fenêtre croissante (forward chaining)
+
+    `hours` (trié) est l'échéance de chaque ligne en heures. Les heures distinctes sont
+    réparties en n_splits + 1 blocs consécutifs; le pli k est testé sur le bloc k + 1 et
+    entraîné sur tout ce qui précède, moins `gap_hours` heures: les cibles des lignes
+    d'entraînement (à +3h) ne tombent pas dans la période de test.
+
+    Returns:
+        list: (fin de l'entraînement, début du test, fin du test) en indices de lignes
+    """
+    distinct = np.unique(hours)
+    edges = np.linspace(0, len(distinct), n_splits + 2).astype(int)
+
+    folds = []
+    for k in range(1, n_splits + 1):
+        if edges[k + 1] <= edges[k]:
+            continue
+        first_hour, last_hour = distinct[edges[k]], distinct[edges[k + 1] - 1]
+        train_end = np.searchsorted(hours, first_hour - gap_hours)
+        if train_end == 0:
+            continue
+        folds.append((int(train_end), int(np.searchsorted(hours, first_hour)),
+                      int(np.searchsorted(hours, last_hour, side='right'))))
+    return folds
+
+
+def evaluate_fold(X, y, fold, backend, model_params, n_jobs):
+    """
+    Entraîne un modèle sur un pli et l'évalue (exécuté dans un processus de time_series_cv)
+
+    X et y sont des tableaux mappés en mémoire, triés par échéance: l'entraînement et le
+    test sont des tranches contiguës, lues directement depuis le fichier partagé.
+    """
+    from threadpoolctl import threadpool_limits
+
+    train_end, test_start, test_end = fold
+
+    # Forêts: threads joblib (n_jobs); gradient boosting: threads OpenMP
+    if 'n_jobs' in MODEL_BACKENDS[backend]['fixed_params']:
+        model_params = dict(model_params or {}, n_jobs=n_jobs)
+
+    start = time.perf_counter()
+    with threadpool_limits(limits=n_jobs, user_api='openmp'):
+        model = make_model(backend, model_params)
+        model.fit(X[:train_end], y[:train_end])
+        fit_seconds = time.perf_counter() - start
+
+        y_test = y[test_start:test_end]
+        y_pred = model.predict(X[test_start:test_end])
+    if y_test.ndim == 1:
+        y_test, y_pred = y_test[:, None], y_pred[:, None]
+
+    return {
+        'train_rows': train_end,
+        'test_rows': test_end - test_start,
+        'fit_seconds': fit_seconds,
+        'seconds': time.perf_counter() - start,
+        'mae': [float(mean_absolute_error(y_test[:, i], y_pred[:, i])) for i in range(y_test.shape[1])],
+        'r2': [float(r2_score(y_test[:, i], y_pred[:, i])) for i in range(y_test.shape[1])]
+    }
+
+
+@contextmanager
+def shared_memmaps(**arrays):
+    """
+    Écrit des tableaux dans des fichiers .npy temporaires et les rouvre mappés en mémoire,
+    en lecture seule: joblib transmet aux processus le chemin du fichier, pas les données
+    """
+    shared_dir = tempfile.mkdtemp(prefix='meteo_')
+    try:
+        mapped = {}
+        for name, array in arrays.items():
+            path = os.path.join(shared_dir, f'{name}.npy')
+            np.save(path, array)
+            mapped[name] = np.load(path, mmap_mode='r')
+        yield mapped
+    finally:
+        shutil.rmtree(shared_dir, ignore_errors=True)
+
+
+def time_series_cv(df, feature_cols, n_splits=5, multi_output=False, model_params=None, workers=None,
+                   backend='random_forest'):
+    """
+    Validation croisée chronologique des deux cibles, plis exécutés en parallèle
+
+    Les features et les cibles, triées par échéance, sont écrites une seule fois dans des
+    fichiers .npy mappés en mémoire: joblib transmet aux processus le chemin du fichier,
+    pas les données. Les cœurs sont partagés entre plis et arbres: `workers` processus
+    (par défaut, un par tâche dans la limite des cœurs) et cœurs / workers threads par modèle.
+
+    Les modèles à base d'arbres ne dépendent pas d'une normalisation monotone des
+    features: les plis sont évalués sur les features brutes, sans scaler par pli.
+
+    Returns:
+        dict: Paramètres, durée totale, détail par pli et MAE/R² moyens par cible
+    """
+    from joblib import Parallel, delayed
+
+    targets = ['temperature', 'humidity']
+    # Tri sur les entiers (ns): trier l'index lui-même compare des objets Timestamp
+    timestamps = df.index.as_unit('ns').asi8
+    order = np.argsort(timestamps, kind='stable')
+    hours = timestamps[order] // NS_PER_HOUR
+    folds = time_series_folds(hours, n_splits)
+    if not folds:
+        print("Validation croisée ignorée: période trop courte")
+        return None
+
+    # Une tâche par pli (forêt multi-sorties) ou par pli et par cible
+    tasks = [(fold, None) for fold in folds] if multi_output else \
+        [(fold, i) for fold in folds for i in range(len(targets))]
+    n_cores = joblib.cpu_count()
+    workers = min(workers or n_cores, len(tasks))
+    n_jobs = max(1, n_cores // workers)
+
+    print(f"\n=== Validation croisée chronologique: {len(folds)} plis, "
+          f"{workers} processus × {n_jobs} threads ===")
+
+    start = time.perf_counter()
+    with shared_memmaps(X=df[feature_cols].to_numpy(np.float64)[order],
+                        y=df[['temperature_future', 'humidity_future']].to_numpy(np.float64)[order]) as shared:
+        X, y = shared['X'], shared['y']
+        results = Parallel(n_jobs=workers)(
+            delayed(evaluate_fold)(X, y if target is None else y[:, target], fold, backend, model_params, n_jobs)
+            for fold, target in tasks
+        )
+    elapsed = time.perf_counter() - start
+
+    # Regrouper les résultats par pli (les deux cibles d'un même pli côte à côte)
+    fold_results = []
+    for k, fold in enumerate(folds):
+        fold_tasks = [(target, result) for (task_fold, target), result in zip(tasks, results) if task_fold == fold]
+        entry = {'fold': k + 1, 'train_rows': fold[0], 'test_rows': fold[2] - fold[1]}
+        for target, result in fold_tasks:
+            for i, name in enumerate(targets if target is None else [targets[target]]):
+                entry[name] = {'mae': result['mae'][i], 'r2': result['r2'][i],
+                               'fit_seconds': result['fit_seconds'], 'seconds': result['seconds']}
+        fold_results.append(entry)
+
+    summary = {
+        'method': 'expanding_window',
+        'n_splits': len(folds),
+        'gap_hours': HORIZON_HOURS,
+        'workers': workers,
+        'threads_per_forest': n_jobs,
+        'seconds': elapsed,
+        'folds': fold_results
+    }
+    for name, unit in zip(targets, ['°C', '%']):
+        maes = np.array([entry[name]['mae'] for entry in fold_results])
+        summary[name] = {
+            'mae_mean': float(maes.mean()),
+            'mae_std': float(maes.std()),
+            'r2_mean': float(np.mean([entry[name]['r2'] for entry in fold_results]))
+        }
+        print(f"Cross-validation MAE {name}: {maes.mean():.2f}{unit} (+/- {maes.std() * 2:.2f})")
+    print(f"Durée de la validation croisée: {elapsed:.1f}s")
+
+    return summary
+
+
+def evaluate_candidate(X, y, train_rows, validation_start, forest_params, n_jobs):
+    """
+    Ajuste une forêt par cible sur les lignes `train_rows` et mesure sa MAE sur la période
+    de validation (exécuté dans un processus de tune_forest, X et y mappés en mémoire)
+    """
+    start = time.perf_counter()
+    maes = []
+    for i in range(y.shape[1]):
+        model = make_forest(dict(forest_params, n_jobs=n_jobs))
+        model.fit(X[train_rows], y[train_rows, i])
+        maes.append(float(mean_absolute_error(y[validation_start:, i], model.predict(X[validation_start:]))))
+    return {'mae': maes, 'seconds': time.perf_counter() - start}
+
+
+def tune_forest(df, feature_cols, trace_file='ml_models/tuning_trace.json', budget_seconds=3600,
+                workers=None, n_candidates=27, eta=3, n_rungs=3, seed=42):
+    """
+    Recherche d'hyperparamètres par divisions successives (successive halving)
+
+    `n_candidates` configurations tirées de TUNING_SPACE (dont celle de production) sont
+    évaluées sur 1/eta^(n_rungs-1) des lignes d'entraînement; le meilleur tiers (1/eta)
+    passe au palier suivant avec eta fois plus de données, jusqu'aux données complètes.
+    Entraînement sur les 80% les plus anciens, validation sur les 20% les plus récents;
+    score: somme des MAE des deux cibles, chacune divisée par l'écart-type de sa cible.
+
+    La recherche s'arrête après `budget_seconds` (vérifié après chaque lot de `workers`
+    évaluations) et retient le meilleur score du palier le plus avancé. Chaque évaluation
+    est ajoutée à `trace_file`: relancée sur les mêmes données, la recherche reprend
+    sans refaire les évaluations déjà tracées.
+
+    Returns:
+        dict: Hyperparamètres retenus, score, MAE par cible et palier de la meilleure évaluation
+    """
+    from joblib import Parallel, delayed
+
+    targets = ['temperature', 'humidity']
+    fit_df, validation_df = split_holdout(df)
+    data = dict(describe_training_data(df), seed=seed, eta=eta, n_rungs=n_rungs, space=TUNING_SPACE)
+
+    # Reprise: la trace n'est réutilisée que pour les mêmes données et le même espace
+    trace = None
+    if os.path.exists(trace_file):
+        with open(trace_file, 'r') as f:
+            trace = json.load(f)
+        if trace.get('data') != json.loads(json.dumps(data)):
+            print("Trace de recherche existante pour d'autres données: nouvelle recherche")
+            trace = None
+    if trace is None:
+        rng = np.random.default_rng(seed)
+        space = [dict(zip(TUNING_SPACE, values)) for values in itertools.product(*TUNING_SPACE.values())]
+        default = dict(min_samples_leaf=1, max_features=1.0, **FOREST_PARAMS)
+        others = [params for params in space if params != default]
+        picked = rng.choice(len(others), size=min(n_candidates, len(others) + 1) - 1, replace=False)
+        trace = {'data': data, 'candidates': [default] + [others[i] for i in sorted(picked)],
+                 'evaluations': [], 'complete': False}
+    else:
+        print(f"Reprise de la recherche: {len(trace['evaluations'])} évaluations déjà tracées")
+
+    def save_trace():
+        os.makedirs(os.path.dirname(trace_file) or '.', exist_ok=True)
+        with open(f'{trace_file}.tmp', 'w') as f:
+            json.dump(trace, f, indent=2)
+        os.replace(f'{trace_file}.tmp', trace_file)
+
+    def key(params, rung):
+        return json.dumps(params, sort_keys=True), rung
+
+    done = {key(evaluation['params'], evaluation['rung']): evaluation for evaluation in trace['evaluations']}
+
+    X = np.concatenate([fit_df[feature_cols].to_numpy(np.float64), validation_df[feature_cols].to_numpy(np.float64)])
+    y = np.concatenate([fit_df[['temperature_future', 'humidity_future']].to_numpy(np.float64),
+                        validation_df[['temperature_future', 'humidity_future']].to_numpy(np.float64)])
+    target_std = validation_df[['temperature_future', 'humidity_future']].std().to_numpy()
+    validation_start = len(fit_df)
+
+    # Sous-échantillons emboîtés: chaque palier contient les lignes du précédent
+    permutation = np.random.default_rng(seed).permutation(validation_start)
+
+    n_cores = joblib.cpu_count()
+    workers = min(workers or n_cores, len(trace['candidates']))
+    n_jobs = max(1, n_cores // workers)
+    print(f"\n=== Recherche d'hyperparamètres: {len(trace['candidates'])} configurations, "
+          f"{n_rungs} paliers, budget {budget_seconds:.0f}s, {workers} processus × {n_jobs} threads ===")
+
+    start = time.perf_counter()
+    candidates = trace['candidates']
+    best = None
+    out_of_budget = False
+
+    with shared_memmaps(X=X, y=y) as shared, Parallel(n_jobs=workers) as parallel:
+        for rung in range(n_rungs):
+            fraction = eta ** (rung - n_rungs + 1)
+            train_rows = np.sort(permutation[:max(1, int(validation_start * fraction))])
+            pending = [params for params in candidates if key(params, rung) not in done]
+            print(f"Palier {rung + 1}/{n_rungs}: {len(candidates)} configurations sur "
+                  f"{len(train_rows)} lignes ({len(candidates) - len(pending)} déjà évaluées)")
+
+            for batch_start in range(0, len(pending), workers):
+                if time.perf_counter() - start > budget_seconds:
+                    out_of_budget = True
+                    break
+
+                batch = pending[batch_start:batch_start + workers]
+                results = parallel(
+                    delayed(evaluate_candidate)(shared['X'], shared['y'], train_rows, validation_start,
+                                                params, n_jobs)
+                    for params in batch
+                )
+                for params, result in zip(batch, results):
+                    evaluation = {
+                        'params': params,
+                        'rung': rung,
+                        'train_rows': len(train_rows),
+                        'mae': dict(zip(targets, result['mae'])),
+                        'score': float(np.sum(np.array(result['mae']) / target_std)),
+                        'seconds': result['seconds']
+                    }
+                    trace['evaluations'].append(evaluation)
+                    done[key(params, rung)] = evaluation
+                save_trace()
+
+            scored = sorted((done[key(params, rung)] for params in candidates if key(params, rung) in done),
+                            key=lambda evaluation: evaluation['score'])
+            if scored:
+                best = scored[0]
+                print(f"Meilleur score du palier: {best['score']:.4f} {best['params']}")
+            if out_of_budget or rung == n_rungs - 1:
+                break
+
+            # Le meilleur 1/eta des configurations passe au palier suivant
+            n_promoted = max(1, len(candidates) // eta)
+            candidates = [evaluation['params'] for evaluation in scored[:n_promoted]]
+
+    elapsed = time.perf_counter() - start
+    if out_of_budget:
+        print(f"Budget de {budget_seconds:.0f}s atteint: recherche interrompue (relancer pour la reprendre)")
+    trace['complete'] = not out_of_budget
+    trace['best'] = best
+    trace['elapsed_seconds'] = trace.get('elapsed_seconds', 0.0) + elapsed
+    save_trace()
+
+    if best is None:
+        return None
+
+    result = {
+        'forest_params': best['params'],
+        'score': best['score'],
+        'mae': best['mae'],
+        'rung': best['rung'],
+        'train_rows': best['train_rows'],
+        'complete': trace['complete'],
+        'tuning_date': datetime.now().isoformat()
+    }
+    best_file = os.path.join(os.path.dirname(trace_file), 'tuning_best.json')
+    with open(f'{best_file}.tmp', 'w') as f:
+        json.dump(result, f, indent=2)
+    os.replace(f'{best_file}.tmp', best_file)
+
+    print(f"Configuration retenue: {best['params']} (MAE température {best['mae']['temperature']:.2f}°C, "
+          f"humidité {best['mae']['humidity']:.2f}%), {elapsed:.1f}s")
+    return result
+
+
+def train_models(df, multi_output=False, model_params=None, cv_splits=5, cv_workers=None,
+                 backend='random_forest', selection_fraction=0.0):
     """
     Entraîne deux modèles: un pour la température, un pour l'humidité
+
+    `backend` choisit la famille de modèles (MODEL_BACKENDS) et `model_params` surcharge
+    ses hyperparamètres de production (FOREST_PARAMS, BOOSTING_PARAMS). Avec
+    multi_output=True, une seule forêt prédit les deux cibles. Les deux cibles sont
+    validées par time_series_cv sur `cv_splits` plis (0: pas de validation croisée).
+
+    Avec `selection_fraction`, cette part des lignes d'entraînement n'est pas ajustée et
+    sert aux choix de la compaction ('selection', voir compact_models).
     """
+    if multi_output and backend != 'random_forest':
+        raise ValueError("Le modèle multi-sorties n'existe que pour random_forest")
+
     # Séparer features et targets
     feature_cols = [col for col in df.columns if col not in ['temperature_future', 'humidity_future']]
     X = df[feature_cols]
@@ -91,19 +782,58 @@ def train_models(df):
         X, y_temp, y_humid, test_size=0.2, random_state=42
     )
 
+    # Lignes de sélection de la compaction, prises sur l'entraînement: le test reste
+    # réservé aux métriques
+    if selection_fraction:
+        X_train, X_select, y_temp_train, y_temp_select, y_humid_train, y_humid_select = train_test_split(
+            X_train, y_temp_train, y_humid_train, test_size=selection_fraction, random_state=42
+        )
+
     # Normaliser les features
     scaler = StandardScaler()
     X_train_scaled = scaler.fit_transform(X_train)
     X_test_scaled = scaler.transform(X_test)
 
+    # Lignes de test conservées pour les métriques du format compact (voir save_models)
+    validation = {
+        'X': X_test_scaled,
+        'temperature': y_temp_test.to_numpy(),
+        'humidity': y_humid_test.to_numpy(),
+        'split': {'source': 'test', 'rows': len(X_test)}
+    }
+
+    selection = None
+    if selection_fraction:
+        selection = {
+            'X': scaler.transform(X_select),
+            'temperature': y_temp_select.to_numpy(),
+            'humidity': y_humid_select.to_numpy(),
+            'split': {'source': 'train', 'method': 'random', 'fraction': selection_fraction,
+                      'rows': len(X_select)}
+        }
+
+    # Validation chronologique sur toute la période (plis parallèles)
+    cross_validation = None
+    if cv_splits:
+        cross_validation = time_series_cv(df, feature_cols, cv_splits, multi_output, model_params, cv_workers,
+                                          backend)
+
+    if multi_output:
+        models = train_multi_output_model(
+            feature_cols, scaler, X_train_scaled, X_test_scaled,
+            np.column_stack([y_temp_train, y_humid_train]),
+            np.column_stack([y_temp_test, y_humid_test]),
+            model_params
+        )
+        models['training_data'] = describe_training_data(df)
+        models['cross_validation'] = cross_validation
+        models['validation'] = validation
+        models['selection'] = selection
+        return models
+
     print("\n=== Entraînement du modèle de température ===")
     # Modèle pour la température
-    temp_model = RandomForestRegressor(
-        n_estimators=100,
-        max_depth=10,
-        random_state=42,
-        n_jobs=-1
-    )
+    temp_model = make_model(backend, model_params)
     temp_model.fit(X_train_scaled, y_temp_train)
 
     # Évaluation température
@@ -114,18 +844,9 @@ def train_models(df):
     print(f"MAE Température: {temp_mae:.2f}°C")
     print(f"R² Température: {temp_r2:.3f}")
 
-    # Cross-validation
-    cv_scores = cross_val_score(temp_model, X_train_scaled, y_temp_train, cv=5, scoring='neg_mean_absolute_error')
-    print(f"Cross-validation MAE: {-cv_scores.mean():.2f} (+/- {cv_scores.std() * 2:.2f})")
-
     print("\n=== Entraînement du modèle d'humidité ===")
     # Modèle pour l'humidité
-    humid_model = RandomForestRegressor(
-        n_estimators=100,
-        max_depth=10,
-        random_state=42,
-        n_jobs=-1
-    )
+    humid_model = make_model(backend, model_params)
     humid_model.fit(X_train_scaled, y_humid_train)
 
     # Évaluation humidité
@@ -137,20 +858,35 @@ def train_models(df):
     print(f"R² Humidité: {humid_r2:.3f}")
 
     # Feature importance
-    print("\n=== Importance des features (Top 10) ===")
-    feature_importance = pd.DataFrame({
+    temp_importance, method = feature_importance(temp_model, X_test_scaled, y_temp_test)
+    humid_importance, _ = feature_importance(humid_model, X_test_scaled, y_humid_test)
+
+    print(f"\n=== Importance des features (Top 10, {method}) ===")
+    importance_table = pd.DataFrame({
         'feature': feature_cols,
-        'importance_temp': temp_model.feature_importances_,
-        'importance_humid': humid_model.feature_importances_
+        'importance_temp': temp_importance,
+        'importance_humid': humid_importance
     }).sort_values('importance_temp', ascending=False).head(10)
 
-    print(feature_importance.to_string())
+    print(importance_table.to_string())
 
     return {
         'temp_model': temp_model,
         'humid_model': humid_model,
         'scaler': scaler,
         'feature_cols': feature_cols,
+        'backend': backend,
+        'model_params': model_params_for(backend, model_params),
+        # Enregistrée dans les métadonnées: l'analyse n'a pas à la recalculer
+        'feature_importance': {
+            'method': method,
+            'temperature': temp_importance.tolist(),
+            'humidity': humid_importance.tolist()
+        },
+        'training_data': describe_training_data(df),
+        'cross_validation': cross_validation,
+        'validation': validation,
+        'selection': selection,
         'metrics': {
             'temperature': {
                 'mae': float(temp_mae),
@@ -164,67 +900,994 @@ def train_models(df):
     }
 
 
-def save_models(models_dict, output_dir='ml_models'):
+def split_holdout(df, holdout_fraction=0.2):
+    """Sépare les échéances les plus récentes (validation) des précédentes (ajustement)"""
+    # Comparaisons sur les entiers (ns): trier l'index lui-même compare des objets Timestamp
+    timestamps = df.index.as_unit('ns').asi8
+    cutoff = np.sort(timestamps)[int(len(df) * (1 - holdout_fraction))]
+    recent = timestamps >= cutoff
+    return df[~recent], df[recent]
+
+
+def retire_lineage(lineage, n_retired):
+    """Retire les `n_retired` plus vieux arbres des générations de la lignée"""
+    kept = []
+    for generation in lineage:
+        dropped = min(n_retired, generation['n_trees'])
+        n_retired -= dropped
+        if generation['n_trees'] > dropped:
+            kept.append(dict(generation, n_trees=generation['n_trees'] - dropped))
+    return kept
+
+
+def train_incremental(df, model_dir='ml_models', new_trees=20, max_trees=None, tolerance=0.02,
+                      max_depth=None, selection_fraction=0.0):
+    """
+    Ajoute aux forêts de `model_dir` des arbres ajustés sur la nouvelle période seulement
+
+    Les forêts et le scaler existants sont conservés (les anciens arbres dépendent de sa
+    normalisation). `new_trees` arbres sont ajoutés avec warm_start sur les 80% les plus
+    anciens de `df`; avec `max_trees`, les plus vieux arbres sont retirés pour que la forêt
+    reste bornée. Le coût dépend donc de la nouvelle période, pas de tout l'historique.
+
+    Les 20% les plus récents de `df` servent de validation: le résultat est refusé si sa
+    MAE dépasse celle des modèles actuels, sur ces mêmes lignes, de plus de `tolerance`
+    (relative) pour l'une des cibles. Avec `selection_fraction`, les plus récentes des
+    lignes d'ajustement servent aux choix de la compaction au lieu d'être ajustées.
+
+    Returns:
+        dict: Comme train_models, avec la lignée des arbres ('tree_lineage'), ou None si
+              le résultat est refusé
+    """
+    with open(os.path.join(model_dir, 'model_metadata.json'), 'r') as f:
+        metadata = json.load(f)
+
+    if metadata.get('backend', 'random_forest') != 'random_forest':
+        print(f"Erreur: l'entraînement incrémental n'existe que pour random_forest "
+              f"(modèles actuels: {metadata['backend']})")
+        return None
+
+    multi_output = metadata.get('multi_output', False)
+    names = ['weather_model'] if multi_output else ['temperature_model', 'humidity_model']
+    forests = {name: joblib.load(os.path.join(model_dir, f'{name}.pkl')) for name in names}
+
+    # Modèles à normalisation intégrée: features brutes, pas de scaler
+    scaler = None
+    if metadata.get('input_scaling', 'standard') == 'standard':
+        scaler = joblib.load(os.path.join(model_dir, 'scaler.pkl'))
+
+    feature_cols = metadata['feature_columns']
+    missing_cols = [col for col in feature_cols if col not in df.columns]
+    if missing_cols:
+        print(f"Colonnes attendues par les modèles actuels absentes: {missing_cols}")
+        return None
+
+    n_trees = len(forests[names[0]].estimators_)
+    n_retired = max(0, n_trees + new_trees - max_trees) if max_trees else 0
+    if n_retired > n_trees:
+        print(f"Erreur: {new_trees} nouveaux arbres dépassent la limite de {max_trees} arbres")
+        return None
+
+    fit_df, holdout_df = split_holdout(df)
+    selection_df = None
+    if selection_fraction:
+        fit_df, selection_df = split_holdout(fit_df, selection_fraction)
+
+    def prepare(part):
+        X = scaler.transform(part[feature_cols]) if scaler is not None else part[feature_cols].to_numpy()
+        return X, part[['temperature_future', 'humidity_future']].to_numpy()
+
+    def predict(X):
+        if multi_output:
+            return forests['weather_model'].predict(X)
+        return np.column_stack([forests['temperature_model'].predict(X),
+                                forests['humidity_model'].predict(X)])
+
+    X_fit, y_fit = prepare(fit_df)
+    X_holdout, y_holdout = prepare(holdout_df)
+    previous_pred = predict(X_holdout)
+
+    print(f"\n=== Entraînement incrémental: {new_trees} arbres sur {len(fit_df)} lignes, "
+          f"validation sur {len(holdout_df)} lignes ===")
+    for i, (name, forest) in enumerate(forests.items()):
+        forest.set_params(warm_start=True, n_estimators=n_trees + new_trees)
+        if max_depth is not None:
+            forest.set_params(max_depth=max_depth)
+        forest.fit(X_fit, y_fit if multi_output else y_fit[:, i])
+        forest.set_params(warm_start=False)
+
+        # Les plus vieux arbres sont en tête de estimators_
+        if n_retired:
+            forest.estimators_ = forest.estimators_[n_retired:]
+            forest.set_params(n_estimators=len(forest.estimators_))
+
+    new_pred = predict(X_holdout)
+
+    metrics, previous_metrics, rejected = {}, {}, []
+    for i, (target, unit) in enumerate([('temperature', '°C'), ('humidity', '%')]):
+        mae = mean_absolute_error(y_holdout[:, i], new_pred[:, i])
+        previous_mae = mean_absolute_error(y_holdout[:, i], previous_pred[:, i])
+        metrics[target] = {'mae': float(mae), 'r2': float(r2_score(y_holdout[:, i], new_pred[:, i]))}
+        previous_metrics[target] = {'mae': float(previous_mae),
+                                    'r2': float(r2_score(y_holdout[:, i], previous_pred[:, i]))}
+        print(f"MAE {target}: {mae:.2f}{unit} (modèles actuels: {previous_mae:.2f}{unit})")
+
+        if mae > previous_mae * (1 + tolerance):
+            rejected.append(target)
+
+    if rejected:
+        print(f"Résultat refusé: MAE dégradée de plus de {tolerance:.0%} pour {', '.join(rejected)}")
+        return None
+
+    # Lignée: une génération par entraînement, dans l'ordre des arbres (plus anciens d'abord)
+    lineage = metadata.get('tree_lineage') or [{
+        'generation': 0,
+        'training_date': metadata['training_date'],
+        'n_trees': n_trees
+    }]
+    next_generation = lineage[-1]['generation'] + 1
+    lineage = retire_lineage(lineage, n_retired)
+    lineage.append(dict(describe_training_data(fit_df), generation=next_generation,
+                        n_trees=new_trees, max_depth=forests[names[0]].max_depth))
+
+    forest = forests[names[0]]
+    models_dict = {
+        'scaler': scaler,
+        'feature_cols': feature_cols,
+        'backend': 'random_forest',
+        'model_params': dict(metadata.get('hyperparameters', FOREST_PARAMS),
+                             n_estimators=forest.n_estimators, max_depth=forest.max_depth),
+        'metrics': metrics,
+        'feature_importance': {
+            'method': 'impurity',
+            'temperature': forests[names[0]].feature_importances_.tolist(),
+            'humidity': forests[names[-1]].feature_importances_.tolist()
+        },
+        'tree_lineage': lineage,
+        'validation': {'X': X_holdout, 'temperature': y_holdout[:, 0], 'humidity': y_holdout[:, 1],
+                       'split': {'source': 'holdout', 'rows': len(holdout_df)}},
+        'selection': None,
+        'incremental': {
+            'new_trees': new_trees,
+            'retired_trees': n_retired,
+            'holdout_rows': len(holdout_df),
+            'tolerance': tolerance,
+            # Modèles remplacés: métriques enregistrées et mesurées sur la même validation
+            'previous_training_date': metadata['training_date'],
+            'previous_metrics': metadata.get('metrics'),
+            'previous_holdout_metrics': previous_metrics
+        }
+    }
+    if selection_df is not None:
+        X_select, y_select = prepare(selection_df)
+        models_dict['selection'] = {
+            'X': X_select, 'temperature': y_select[:, 0], 'humidity': y_select[:, 1],
+            'split': {'source': 'train', 'method': 'most_recent', 'fraction': selection_fraction,
+                      'rows': len(selection_df)}
+        }
+    if multi_output:
+        models_dict['multi_model'] = forests['weather_model']
+    else:
+        models_dict['temp_model'] = forests['temperature_model']
+        models_dict['humid_model'] = forests['humidity_model']
+    return models_dict
+
+
+def flatten_forest(model):
+    """
+    Aplatit une forêt sklearn en tableaux NumPy contigus, tous arbres concaténés:
+    feature, seuil, enfants gauche/droit (indices globaux, colonnes de 'children')
+    et valeur de chaque nœud.
+
+    Les feuilles pointent sur elles-mêmes avec un seuil infini, ce qui permet au
+    moteur de l'API de parcourir tous les arbres sur max_depth itérations sans masque.
+    """
+    features, thresholds, lefts, rights, values, roots, missing_left = [], [], [], [], [], [], []
+    offset = 0
+
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        is_leaf = tree.children_left == -1
+        node_ids = np.arange(tree.node_count) + offset
+
+        features.append(np.where(is_leaf, 0, tree.feature))
+        thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+        lefts.append(np.where(is_leaf, node_ids, tree.children_left + offset))
+        rights.append(np.where(is_leaf, node_ids, tree.children_right + offset))
+        values.append(tree.value[:, :, 0])
+        roots.append(offset)
+
+        # Branche suivie par les valeurs manquantes (sklearn >= 1.3)
+        missing_left.append(getattr(tree, 'missing_go_to_left', np.zeros(tree.node_count, dtype=np.uint8)))
+
+        offset += tree.node_count
+
+    # Les tableaux sont enregistrés dans leur format de service (C-contigus, types finaux)
+    # pour que l'API puisse les mapper en mémoire sans copie
+    return {
+        'feature': np.concatenate(features).astype(np.int32),
+        'threshold': np.concatenate(thresholds).astype(np.float64),
+        # Enfants [gauche, droit] entrelacés: une ligne par nœud
+        'children': np.ascontiguousarray(np.column_stack([np.concatenate(lefts), np.concatenate(rights)]),
+                                         dtype=np.int32),
+        'value': np.ascontiguousarray(np.concatenate(values), dtype=np.float64),
+        'roots': np.array(roots, dtype=np.int32),
+        'missing_left': np.concatenate(missing_left).astype(bool),
+        'max_depth': int(max(estimator.tree_.max_depth for estimator in model.estimators_)),
+        'n_features': int(model.n_features_in_)
+    }
+
+
+def flatten_boosting(model):
+    """
+    Aplatit un HistGradientBoostingRegressor dans le format de flatten_forest
+
+    Même parcours (X <= seuil à gauche, branche des valeurs manquantes apprise), mais
+    les feuilles atteintes sont additionnées à la prédiction initiale ('baseline') au
+    lieu d'être moyennées, et les seuils sont comparés en float64 comme dans sklearn.
+    """
+    features, thresholds, lefts, rights, values, roots, missing_left = [], [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+
+    for predictors in model._predictors:
+        nodes = predictors[0].nodes
+        is_leaf = nodes['is_leaf'].astype(bool)
+        node_ids = np.arange(len(nodes)) + offset
+
+        features.append(np.where(is_leaf, 0, nodes['feature_idx']))
+        thresholds.append(np.where(is_leaf, np.inf, nodes['num_threshold']))
+        lefts.append(np.where(is_leaf, node_ids, nodes['left'].astype(np.int64) + offset))
+        rights.append(np.where(is_leaf, node_ids, nodes['right'].astype(np.int64) + offset))
+        # Valeurs des feuilles déjà multipliées par le learning rate
+        values.append(nodes['value'][:, np.newaxis])
+        missing_left.append(nodes['missing_go_to_left'])
+        roots.append(offset)
+
+        max_depth = max(max_depth, int(nodes['depth'].max()))
+        offset += len(nodes)
+
+    return {
+        'feature': np.concatenate(features).astype(np.int32),
+        'threshold': np.concatenate(thresholds).astype(np.float64),
+        'children': np.ascontiguousarray(np.column_stack([np.concatenate(lefts), np.concatenate(rights)]),
+                                         dtype=np.int32),
+        'value': np.ascontiguousarray(np.concatenate(values), dtype=np.float64),
+        'roots': np.array(roots, dtype=np.int32),
+        'missing_left': np.concatenate(missing_left).astype(bool),
+        'max_depth': max_depth,
+        'n_features': int(model.n_features_in_),
+        'aggregate': 'sum',
+        'baseline': float(np.ravel(model._baseline_prediction)[0]),
+        'input_dtype': 'float64'
+    }
+
+
+def flatten_model(model, compact=False):
+    """Forme aplatie du modèle pour le moteur d'inférence NumPy de l'API"""
+    if isinstance(model, HistGradientBoostingRegressor):
+        arrays = flatten_boosting(model)
+    else:
+        arrays = flatten_forest(model)
+    return compact_flat_arrays(arrays) if compact else arrays
+
+
+def floor_float32(values):
+    """
+    Plus grand float32 inférieur ou égal à chaque valeur
+
+    Pour une feature x en float32, `x <= seuil` et `x <= floor_float32(seuil)` sont
+    équivalents: les seuils passent en float32 sans changer aucune décision.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    rounded = values.astype(np.float32)
+    too_high = rounded > values
+    rounded[too_high] = np.nextafter(rounded[too_high], np.float32(-np.inf))
+    return rounded
+
+
+def compact_flat_arrays(arrays):
+    """
+    Format compact des tableaux aplatis: valeurs des feuilles en float32, indices de
+    features en int16 et seuils en float32 quand le modèle compare des features float32
+    (forêts; le gradient boosting garde ses seuils float64)
+    """
+    compact = dict(arrays)
+    compact['value'] = np.ascontiguousarray(arrays['value'], dtype=np.float32)
+    if np.dtype(arrays.get('input_dtype', 'float32')) == np.float32:
+        compact['threshold'] = floor_float32(arrays['threshold'])
+    if arrays['n_features'] <= np.iinfo(np.int16).max:
+        compact['feature'] = arrays['feature'].astype(np.int16)
+    return compact
+
+
+def round_leaf_values(model):
+    """
+    Copie du modèle dont les valeurs des feuilles sont arrondies en float32, comme dans
+    sa forme aplatie compacte: modèle sklearn et moteur aplati prédisent la même chose
+    """
+    rounded = copy.deepcopy(model)
+
+    if isinstance(rounded, HistGradientBoostingRegressor):
+        for predictors in rounded._predictors:
+            nodes = predictors[0].nodes
+            nodes['value'] = nodes['value'].astype(np.float32)
+        return rounded
+
+    for estimator in rounded.estimators_:
+        state = estimator.tree_.__getstate__()
+        state['values'] = state['values'].astype(np.float32).astype(np.float64)
+        estimator.tree_.__setstate__(state)
+
+    return rounded
+
+
+def count_trees(model):
+    """Nombre d'arbres d'une forêt ou d'itérations d'un gradient boosting"""
+    if isinstance(model, HistGradientBoostingRegressor):
+        return len(model._predictors)
+    return len(model.estimators_)
+
+
+def count_nodes(model):
+    """Nombre total de nœuds de tous les arbres du modèle"""
+    if isinstance(model, HistGradientBoostingRegressor):
+        return int(sum(len(predictors[0].nodes) for predictors in model._predictors))
+    return int(sum(estimator.tree_.node_count for estimator in model.estimators_))
+
+
+def validation_mae(predictions, y_val):
+    """MAE de validation par cible"""
+    return mean_absolute_error(y_val, predictions, multioutput='raw_values')
+
+
+def prune_forest(model, X_val, y_val, reference_mae, tolerance):
+    """
+    Élagage par coût-complexité d'une forêt déjà entraînée
+
+    Chaque arbre est élagué exactement comme s'il avait été entraîné avec ccp_alpha
+    (l'élagage n'utilise que les impuretés enregistrées dans ses nœuds). Les valeurs de
+    CCP_ALPHA_GRID sont essayées par ordre croissant tant que la MAE de validation de
+    chaque cible reste à moins de `tolerance` (relative) de `reference_mae`.
+
+    Returns:
+        tuple: (forêt élaguée, ccp_alpha retenu, 0.0 si aucun élagage n'est accepté)
+    """
+    variance = float(np.mean(np.var(y_val, axis=0)))
+    best, best_alpha = model, 0.0
+
+    for alpha in CCP_ALPHA_GRID * variance:
+        # Élagages emboîtés: élaguer la forêt déjà élaguée équivaut à élaguer l'originale
+        pruned = copy.deepcopy(best)
+        for estimator in pruned.estimators_:
+            estimator.set_params(ccp_alpha=alpha)
+            estimator._prune_tree()
+        pruned.set_params(ccp_alpha=alpha)
+
+        if np.any(validation_mae(pruned.predict(X_val), y_val) > reference_mae * (1 + tolerance)):
+            break
+        best, best_alpha = pruned, float(alpha)
+
+    return best, best_alpha
+
+
+def staged_predictions(model, X):
+    """
+    Prédictions du modèle réduit à k arbres, pour k = 1..n: les k plus récents d'une
+    forêt (fin de estimators_, voir tree_lineage), les k premières itérations du boosting
+    """
+    if isinstance(model, HistGradientBoostingRegressor):
+        return np.stack(list(model.staged_predict(X)))
+
+    per_tree = np.stack([estimator.predict(X) for estimator in model.estimators_[::-1]])
+    counts = np.arange(1, len(per_tree) + 1).reshape((-1,) + (1,) * (per_tree.ndim - 1))
+    return np.cumsum(per_tree, axis=0) / counts
+
+
+def min_trees_within(model, X_val, y_val, reference_mae, tolerance):
+    """
+    Plus petit nombre d'arbres k tel que le modèle réduit à k arbres ou plus reste dans
+    la tolérance (un creux isolé de la MAE n'est pas retenu)
+    """
+    within = np.array([
+        np.all(validation_mae(predictions, y_val) <= reference_mae * (1 + tolerance))
+        for predictions in staged_predictions(model, X_val)
+    ])
+    # Nombre de réductions consécutives acceptées en partant du modèle complet
+    n_within = np.argmin(within[::-1]) if not within.all() else len(within)
+    return int(len(within) - max(n_within, 1) + 1)
+
+
+def keep_trees(model, n_trees):
+    """Copie du modèle réduit à `n_trees` arbres (voir staged_predictions)"""
+    reduced = copy.deepcopy(model)
+
+    if isinstance(reduced, HistGradientBoostingRegressor):
+        # n_iter_ est dérivé de _predictors
+        reduced._predictors = reduced._predictors[:n_trees]
+        reduced.set_params(max_iter=n_trees)
+        return reduced
+
+    # Les plus vieux arbres sont en tête de estimators_
+    reduced.estimators_ = reduced.estimators_[len(reduced.estimators_) - n_trees:]
+    reduced.set_params(n_estimators=n_trees)
+    return reduced
+
+
+def compact_models(models, selection, validation, tolerance, max_rows=20000):
+    """
+    Élague les forêts puis réduit le nombre d'arbres tant que la MAE de sélection de
+    chaque cible reste à moins de `tolerance` (relative) de celle du modèle complet
+
+    Tous les modèles gardent le même nombre d'arbres (le plus grand nécessaire), la lignée
+    des arbres restant commune. Les choix portent sur au plus `max_rows` lignes de
+    `selection` (mises de côté à l'entraînement), les métriques finales sur toutes les
+    lignes de `validation`, qui n'ont servi à aucun choix.
+
+    Returns:
+        tuple: (modèles compactés, nombre d'arbres retirés, rapport par modèle,
+                métriques des modèles compactés par cible)
+    """
+    X_val = selection['X'][:max_rows]
+    targets = {}
+    for name in models:
+        y_val = np.column_stack([selection[target] for target in MODEL_TARGETS[name]])[:max_rows]
+        targets[name] = y_val[:, 0] if y_val.shape[1] == 1 else y_val
+
+    compacted, report, needed = {}, {}, []
+    for name, model in models.items():
+        reference_mae = validation_mae(model.predict(X_val), targets[name])
+
+        ccp_alpha = 0.0
+        if isinstance(model, RandomForestRegressor):
+            model, ccp_alpha = prune_forest(model, X_val, targets[name], reference_mae, tolerance)
+
+        compacted[name] = model
+        needed.append(min_trees_within(model, X_val, targets[name], reference_mae, tolerance))
+        report[name] = {
+            'ccp_alpha': ccp_alpha,
+            'n_trees_before': count_trees(models[name]),
+            'n_nodes_before': count_nodes(models[name]),
+            'reference_mae': reference_mae.tolist()
+        }
+
+    n_trees = max(needed)
+    n_retired = count_trees(next(iter(models.values()))) - n_trees
+
+    metrics = {}
+    for name, model in compacted.items():
+        compacted[name] = model = keep_trees(model, n_trees)
+
+        predictions = model.predict(validation['X']).reshape(len(validation['X']), -1)
+        for i, target in enumerate(MODEL_TARGETS[name]):
+            metrics[target] = {
+                'mae': float(mean_absolute_error(validation[target], predictions[:, i])),
+                'r2': float(r2_score(validation[target], predictions[:, i]))
+            }
+
+        report[name].update({
+            'n_trees': n_trees,
+            'n_nodes': count_nodes(model),
+            'mae': validation_mae(model.predict(X_val), targets[name]).tolist()
+        })
+        print(f"{name}: {report[name]['n_trees_before']} -> {n_trees} arbres, "
+              f"{report[name]['n_nodes_before']} -> {report[name]['n_nodes']} nœuds "
+              f"(ccp_alpha={report[name]['ccp_alpha']:.3g})")
+
+    return compacted, n_retired, report, metrics
+
+
+def fold_scaler_into_forest(model, scaler):
+    """
+    Retourne une copie de la forêt dont les seuils de split sont exprimés en unités brutes.
+
+    Un split `(x - mean) / scale <= t` est équivalent à `x <= t * scale + mean` (scale > 0),
+    la forêt obtenue s'applique donc directement aux features non normalisées.
+    """
+    folded = copy.deepcopy(model)
+
+    for estimator in folded.estimators_:
+        state = estimator.tree_.__getstate__()
+        nodes = state['nodes']
+
+        is_split = nodes['left_child'] != -1
+        split_features = nodes['feature'][is_split]
+        nodes['threshold'][is_split] = (
+            nodes['threshold'][is_split] * scaler.scale_[split_features] + scaler.mean_[split_features]
+        )
+
+        estimator.tree_.__setstate__(state)
+
+    return folded
+
+
+def fold_scaler_into_boosting(model, scaler):
+    """Équivalent de fold_scaler_into_forest pour un HistGradientBoostingRegressor"""
+    folded = copy.deepcopy(model)
+
+    for predictors in folded._predictors:
+        nodes = predictors[0].nodes
+        is_split = ~nodes['is_leaf'].astype(bool)
+        split_features = nodes['feature_idx'][is_split]
+        nodes['num_threshold'][is_split] = (
+            nodes['num_threshold'][is_split] * scaler.scale_[split_features] + scaler.mean_[split_features]
+        )
+
+    return folded
+
+
+def fold_scaler_into_model(model, scaler):
+    """Intègre la normalisation aux seuils des arbres, quelle que soit la famille de modèles"""
+    if isinstance(model, HistGradientBoostingRegressor):
+        return fold_scaler_into_boosting(model, scaler)
+    return fold_scaler_into_forest(model, scaler)
+
+
+def dump_atomic(obj, path, compress=0):
+    """
+    Écrit un artefact dans un fichier temporaire puis le renomme: une API qui charge
+    ou mappe en mémoire l'ancien fichier n'en voit jamais une version tronquée
+    """
+    tmp_path = f'{path}.tmp'
+    joblib.dump(obj, tmp_path, compress=compress)
+    os.replace(tmp_path, path)
+
+
+def describe_artifact(path):
+    """Taille (octets) et durée de chargement mesurée (secondes) d'un artefact joblib"""
+    start = time.perf_counter()
+    joblib.load(path)
+    return {'size_bytes': os.path.getsize(path), 'load_seconds': time.perf_counter() - start}
+
+
+def save_models(models_dict, output_dir='ml_models', fold_scaler=False, compact=False,
+                compact_tolerance=None, compress=0):
     """
     Sauvegarde les modèles entraînés et les métadonnées
+
+    Avec fold_scaler=True, la normalisation est intégrée aux seuils des arbres: les modèles
+    attendent des features brutes et scaler.pkl n'est pas écrit. Sans scaler (modèles
+    repris d'une version déjà intégrée, voir train_incremental), rien n'est à intégrer.
+
+    Format compact: avec compact=True, les formes aplaties passent en précision réduite
+    (compact_flat_arrays) et les feuilles des modèles sklearn sont arrondies de même; avec
+    `compact_tolerance`, les modèles sont élagués et réduits (compact_models): choix sur les
+    lignes 'selection' de models_dict, métriques sur ses lignes 'validation'. `compress` (méthode joblib, par exemple 'zlib' ou
+    ('lzma', 6)) ne s'applique qu'aux modèles sklearn: les formes aplaties restent non
+    compressées pour que l'API puisse les mapper en mémoire. La taille et la durée de
+    chargement de chaque fichier sont enregistrées dans les métadonnées ('artifacts').
+
+    model_metadata.json est écrit en dernier: sa nouvelle version signale à l'API
+    (rechargement à chaud) que tous les fichiers sont complets.
     """
     # Créer le répertoire s'il n'existe pas
     os.makedirs(output_dir, exist_ok=True)
 
-    # Sauvegarder les modèles
-    joblib.dump(models_dict['temp_model'], os.path.join(output_dir, 'temperature_model.pkl'))
-    joblib.dump(models_dict['humid_model'], os.path.join(output_dir, 'humidity_model.pkl'))
-    joblib.dump(models_dict['scaler'], os.path.join(output_dir, 'scaler.pkl'))
+    # Une forêt multi-sorties ou une forêt par cible
+    multi_output = 'multi_model' in models_dict
+    if multi_output:
+        forests = {'weather_model': models_dict['multi_model']}
+    else:
+        forests = {
+            'temperature_model': models_dict['temp_model'],
+            'humidity_model': models_dict['humid_model']
+        }
+
+    raw_inputs = fold_scaler or models_dict['scaler'] is None
+    backend = models_dict.get('backend', 'random_forest')
+    hyperparameters = models_dict.get('model_params', model_params_for(backend))
+    metrics = models_dict['metrics']
+
+    # Élagage et réduction du nombre d'arbres, avant l'intégration du scaler (la
+    # validation est normalisée comme à l'entraînement)
+    compaction = None
+    n_retired = 0
+    if compact_tolerance is not None:
+        if not models_dict.get('selection') or not models_dict.get('validation'):
+            raise ValueError("Le format compact avec tolérance nécessite les lignes de sélection et de "
+                             "validation de l'entraînement (selection_fraction)")
+        print(f"\n=== Compaction des modèles (tolérance MAE: {compact_tolerance:.0%}) ===")
+        forests, n_retired, compaction, metrics = compact_models(forests, models_dict['selection'],
+                                                                 models_dict['validation'], compact_tolerance)
+        hyperparameters = dict(hyperparameters, **{
+            MODEL_BACKENDS[backend]['size_param']: count_trees(next(iter(forests.values())))})
+
+    created_files = []
+    for name, forest in forests.items():
+        if compact:
+            forest = round_leaf_values(forest)
+        if fold_scaler and models_dict['scaler'] is not None:
+            forest = fold_scaler_into_model(forest, models_dict['scaler'])
+
+        # Sauvegarder le modèle et sa forme aplatie pour le moteur d'inférence NumPy de l'API
+        dump_atomic(forest, os.path.join(output_dir, f'{name}.pkl'), compress=compress)
+        dump_atomic(flatten_model(forest, compact), os.path.join(output_dir, f'{name}_flat.pkl'))
+        created_files += [f'{name}.pkl', f'{name}_flat.pkl']
+
+    if not raw_inputs:
+        dump_atomic(models_dict['scaler'], os.path.join(output_dir, 'scaler.pkl'))
+        created_files.append('scaler.pkl')
+
+    # Mesurées juste après l'écriture (fichiers dans le cache de pages, comme lors
+    # d'un rechargement à chaud)
+    artifacts = {filename: describe_artifact(os.path.join(output_dir, filename)) for filename in created_files}
+
+    first_model = next(iter(forests.values()))
+
+    # Lignée des arbres d'une forêt: un entraînement complet forme une seule génération
+    training_date = datetime.now().isoformat()
+    lineage = None
+    if backend == 'random_forest':
+        lineage = models_dict.get('tree_lineage')
+        if lineage:
+            # La compaction retire les plus vieux arbres (voir keep_trees)
+            lineage = retire_lineage(lineage, n_retired)
+        else:
+            lineage = [dict(models_dict.get('training_data', {}), generation=0,
+                            n_trees=len(first_model.estimators_))]
+        lineage = [dict(generation, training_date=generation.get('training_date', training_date))
+                   for generation in lineage]
 
     # Sauvegarder les métadonnées
     metadata = {
         'feature_columns': models_dict['feature_cols'],
-        'metrics': models_dict['metrics'],
-        'training_date': datetime.now().isoformat(),
-        'model_type': 'RandomForestRegressor',
-        'prediction_horizon': '3 hours'
+        # Métriques des modèles enregistrés (après compaction, sur les mêmes lignes de test)
+        'metrics': metrics,
+        'training_date': training_date,
+        'model_type': type(first_model).__name__,
+        # Famille de modèles (MODEL_BACKENDS) et hyperparamètres effectifs
+        'backend': backend,
+        'hyperparameters': hyperparameters,
+        'prediction_horizon': '3 hours',
+        # Fuseau de 'hour' et 'day_of_week': l'API calcule ces features dans le même fuseau
+        'calendar_timezone': CALENDAR_TIMEZONE,
+        # 'standard': features normalisées avec scaler.pkl, 'none': features brutes
+        'input_scaling': 'none' if raw_inputs else 'standard',
+        # True: weather_model.pkl prédit [température, humidité] en un seul parcours
+        'multi_output': multi_output,
+        # Générations d'arbres, des plus anciennes aux plus récentes (ordre de estimators_)
+        'tree_lineage': lineage,
+        # Taille (octets) et durée de chargement mesurée (secondes) de chaque fichier
+        'artifacts': artifacts,
+        # Format des fichiers: précision des formes aplaties et compression des modèles sklearn
+        'artifact_format': {
+            'flat_precision': 'float32' if compact else 'float64',
+            'compress': compress or None,
+            'compact_tolerance': compact_tolerance
+        }
     }
+    if compaction:
+        # Élagage et arbres retenus par modèle, MAE de sélection avant et après
+        metadata['compaction'] = compaction
+        # Lignes des choix de la compaction et lignes des métriques enregistrées (disjointes)
+        metadata['compaction_split'] = {
+            'selection': models_dict['selection']['split'],
+            'metrics': models_dict['validation']['split']
+        }
+    if models_dict.get('feature_importance'):
+        # Importances par cible ('impurity' ou 'permutation'), reprises par l'analyse
+        metadata['feature_importance'] = models_dict['feature_importance']
+    if models_dict.get('cross_validation'):
+        # Plis, durées et scores de la validation croisée chronologique
+        metadata['cross_validation'] = models_dict['cross_validation']
+    if 'incremental' in models_dict:
+        metadata['incremental'] = models_dict['incremental']
 
-    with open(os.path.join(output_dir, 'model_metadata.json'), 'w') as f:
+    metadata_path = os.path.join(output_dir, 'model_metadata.json')
+    with open(f'{metadata_path}.tmp', 'w') as f:
         json.dump(metadata, f, indent=2)
+    os.replace(f'{metadata_path}.tmp', metadata_path)
+    created_files.append('model_metadata.json')
 
     print(f"\nModèles sauvegardés dans le répertoire '{output_dir}'")
     print("Fichiers créés:")
-    print("- temperature_model.pkl")
-    print("- humidity_model.pkl")
-    print("- scaler.pkl")
-    print("- model_metadata.json")
+    for filename in created_files:
+        if filename in artifacts:
+            print(f"- {filename} ({artifacts[filename]['size_bytes'] / 1e6:.2f} Mo, "
+                  f"chargé en {artifacts[filename]['load_seconds'] * 1000:.0f} ms)")
+        else:
+            print(f"- {filename}")
+
+
+def serialized_size(obj):
+    """Taille en octets de l'artefact joblib d'un objet"""
+    buffer = io.BytesIO()
+    joblib.dump(obj, buffer)
+    return buffer.getbuffer().nbytes
+
+
+def median_latency(predict, X, n_runs=50):
+    """Durée médiane (secondes) de predict(X) sur `n_runs` appels"""
+    timings = []
+    for _ in range(n_runs):
+        start = time.perf_counter()
+        predict(X)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def benchmark_multi_output(df, n_latency_runs=50, batch_size=1000):
+    """
+    Compare deux forêts séparées et une forêt multi-sorties sur le même découpage:
+    temps d'entraînement, taille des artefacts, latence de prédiction et MAE par cible
+    """
+    feature_cols = [col for col in df.columns if col not in ['temperature_future', 'humidity_future']]
+    y = df[['temperature_future', 'humidity_future']].to_numpy()
+    X_train, X_test, y_train, y_test = train_test_split(
+        df[feature_cols], y, test_size=0.2, random_state=42
+    )
+
+    scaler = StandardScaler()
+    X_train_scaled = scaler.fit_transform(X_train)
+    X_test_scaled = scaler.transform(X_test)
+    single_row = X_test_scaled[:1]
+    batch = X_test_scaled[:batch_size]
+
+    def fit_forest(y_fit):
+        model = make_forest()
+        start = time.perf_counter()
+        model.fit(X_train_scaled, y_fit)
+        return model, time.perf_counter() - start
+
+    artifact_size = serialized_size
+
+    def latency(predict, X):
+        return median_latency(predict, X, n_latency_runs)
+
+    # Deux forêts séparées (configuration actuelle)
+    temp_model, temp_fit = fit_forest(y_train[:, 0])
+    humid_model, humid_fit = fit_forest(y_train[:, 1])
+
+    def predict_separate(X):
+        return temp_model.predict(X), humid_model.predict(X)
+
+    separate_pred = np.column_stack(predict_separate(X_test_scaled))
+
+    # Une forêt multi-sorties
+    multi_model, multi_fit = fit_forest(y_train)
+    multi_pred = multi_model.predict(X_test_scaled)
+
+    results = {}
+    for label, fit_time, size, predict, y_pred in [
+        ('separate', temp_fit + humid_fit, artifact_size(temp_model) + artifact_size(humid_model),
+         predict_separate, separate_pred),
+        ('multi_output', multi_fit, artifact_size(multi_model), multi_model.predict, multi_pred)
+    ]:
+        results[label] = {
+            'fit_time_s': fit_time,
+            'artifact_size_mb': size / 1e6,
+            'latency_single_row_ms': latency(predict, single_row) * 1000,
+            f'latency_batch_{batch_size}_ms': latency(predict, batch) * 1000,
+            'mae_temperature': float(mean_absolute_error(y_test[:, 0], y_pred[:, 0])),
+            'mae_humidity': float(mean_absolute_error(y_test[:, 1], y_pred[:, 1]))
+        }
+
+    print("\n=== Benchmark: forêts séparées vs forêt multi-sorties ===")
+    print(pd.DataFrame(results).to_string(float_format=lambda value: f"{value:.3f}"))
+
+    return results
+
+
+def benchmark_backends(df, backends=None, n_latency_runs=50, batch_size=1000):
+    """
+    Compare les familles de modèles (MODEL_BACKENDS) avec leurs hyperparamètres de
+    production, sur le même découpage: temps d'entraînement des deux modèles, taille des
+    artefacts (.pkl et forme aplatie), latence de prédiction (sklearn et moteur aplati
+    de l'API) et MAE par cible
+    """
+    backends = backends or list(MODEL_BACKENDS)
+    feature_cols = [col for col in df.columns if col not in ['temperature_future', 'humidity_future']]
+    y = df[['temperature_future', 'humidity_future']].to_numpy()
+    X_train, X_test, y_train, y_test = train_test_split(
+        df[feature_cols], y, test_size=0.2, random_state=42
+    )
+
+    scaler = StandardScaler()
+    X_train_scaled = scaler.fit_transform(X_train)
+    X_test_scaled = scaler.transform(X_test)
+    single_row = X_test_scaled[:1]
+    batch = X_test_scaled[:batch_size]
+
+    results = {}
+    for backend in backends:
+        print(f"Entraînement: {backend}")
+        fitted, fit_time = [], 0.0
+        for i in range(y_train.shape[1]):
+            model = make_model(backend)
+            start = time.perf_counter()
+            model.fit(X_train_scaled, y_train[:, i])
+            fit_time += time.perf_counter() - start
+            fitted.append(model)
+
+        flat = [flatten_model(model) for model in fitted]
+        engines = [FlatForest(arrays) for arrays in flat]
+
+        def predict_sklearn(X):
+            return [model.predict(X) for model in fitted]
+
+        def predict_flat(X):
+            return [engine.predict(X) for engine in engines]
+
+        y_pred = np.column_stack(predict_sklearn(X_test_scaled))
+        results[backend] = {
+            'fit_time_s': fit_time,
+            'artifact_size_mb': sum(serialized_size(model) for model in fitted) / 1e6,
+            'flat_artifact_size_mb': sum(serialized_size(arrays) for arrays in flat) / 1e6,
+            'latency_single_row_ms': median_latency(predict_sklearn, single_row, n_latency_runs) * 1000,
+            f'latency_batch_{batch_size}_ms': median_latency(predict_sklearn, batch, n_latency_runs) * 1000,
+            'flat_latency_single_row_ms': median_latency(predict_flat, single_row, n_latency_runs) * 1000,
+            f'flat_latency_batch_{batch_size}_ms': median_latency(predict_flat, batch, n_latency_runs) * 1000,
+            'mae_temperature': float(mean_absolute_error(y_test[:, 0], y_pred[:, 0])),
+            'mae_humidity': float(mean_absolute_error(y_test[:, 1], y_pred[:, 1]))
+        }
+
+    print("\n=== Benchmark des familles de modèles ===")
+    print(pd.DataFrame(results).to_string(float_format=lambda value: f"{value:.3f}"))
+
+    return results
 
 
 def main():
     """Fonction principale"""
-    # Fichier CSV à utiliser
-    csv_file = 'meteo-0025_clean.csv'
+    parser = argparse.ArgumentParser(description="Entraînement des modèles de prédiction météo")
+    parser.add_argument('csv_file', nargs='?', default='meteo-0025_clean.csv',
+                        help="Fichier CSV nettoyé ou jeu de données Parquet (par défaut: meteo-0025_clean.csv)")
+    parser.add_argument('--start', default=None,
+                        help="Première échéance utilisée (date ISO, incluse)")
+    parser.add_argument('--end', default=None,
+                        help="Fin des échéances utilisées (date ISO, exclue)")
+    parser.add_argument('--regions', nargs='+', default=None,
+                        help="Tuiles à utiliser (jeu de données Parquet partitionné par région)")
+    parser.add_argument('--backend', choices=list(MODEL_BACKENDS), default='random_forest',
+                        help="Famille de modèles (par défaut: random_forest)")
+    parser.add_argument('--n-estimators', type=int, default=None,
+                        help=f"Nombre d'arbres par modèle (par défaut: {FOREST_PARAMS['n_estimators']} pour "
+                             f"random_forest, {BOOSTING_PARAMS['max_iter']} pour hist_gradient_boosting)")
+    parser.add_argument('--max-depth', type=int, default=None,
+                        help=f"Profondeur maximale des arbres (par défaut: {FOREST_PARAMS['max_depth']} pour "
+                             f"random_forest, illimitée pour hist_gradient_boosting)")
+    parser.add_argument('--cv-splits', type=int, default=5,
+                        help="Plis de la validation croisée chronologique (0 pour la désactiver, par défaut: 5)")
+    parser.add_argument('--cv-workers', type=int, default=None,
+                        help="Processus de la validation croisée (par défaut: un par pli et cible, dans la limite des cœurs)")
+    parser.add_argument('--tune', action='store_true',
+                        help="Chercher les hyperparamètres par divisions successives puis entraîner avec les meilleurs")
+    parser.add_argument('--tune-budget', type=float, default=3600,
+                        help="Recherche: budget en secondes (par défaut: 3600)")
+    parser.add_argument('--tune-workers', type=int, default=None,
+                        help="Recherche: nombre de processus (par défaut: nombre de cœurs)")
+    parser.add_argument('--fold-scaler', action='store_true',
+                        help="Intégrer la normalisation dans les seuils des arbres (pas de scaler.pkl)")
+    parser.add_argument('--compact', action='store_true',
+                        help="Formes aplaties en float32 (feuilles des modèles sklearn arrondies de même)")
+    parser.add_argument('--compact-tolerance', type=float, default=None,
+                        help="Élaguer les forêts et réduire le nombre d'arbres tant que la MAE de validation "
+                             "ne se dégrade pas de plus de cette fraction (par exemple 0.01)")
+    parser.add_argument('--compress', choices=['zlib', 'gzip', 'bz2', 'lzma', 'xz'], default=None,
+                        help="Compression des modèles sklearn (les formes aplaties restent non compressées "
+                             "pour le mappage mémoire)")
+    parser.add_argument('--compress-level', type=int, default=3,
+                        help="Niveau de compression (par défaut: 3)")
+    parser.add_argument('--multi-output', action='store_true',
+                        help="Une seule forêt multi-sorties pour la température et l'humidité")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Ajouter des arbres ajustés sur la période --start/--end aux modèles de ml_models/")
+    parser.add_argument('--new-trees', type=int, default=20,
+                        help="Incrémental: nombre d'arbres ajoutés par forêt (par défaut: 20)")
+    parser.add_argument('--max-trees', type=int, default=None,
+                        help="Incrémental: taille maximale des forêts, les plus vieux arbres sont retirés")
+    parser.add_argument('--tolerance', type=float, default=0.02,
+                        help="Incrémental: dégradation relative de MAE tolérée en validation (par défaut: 0.02)")
+    parser.add_argument('--benchmark-multi-output', action='store_true',
+                        help="Comparer forêts séparées et forêt multi-sorties puis quitter")
+    parser.add_argument('--benchmark-backends', action='store_true',
+                        help="Comparer les familles de modèles (temps, taille, latence, MAE) puis quitter")
+    parser.add_argument('--benchmark-features', action='store_true',
+                        help="Mesurer le temps de construction des features selon le nombre de lignes puis quitter")
+    args = parser.parse_args()
+
+    if args.tune and (args.incremental or args.n_estimators or args.max_depth):
+        parser.error("--tune choisit lui-même les hyperparamètres (incompatible avec --incremental, "
+                     "--n-estimators et --max-depth)")
 
-    if len(sys.argv) > 1:
-        csv_file = sys.argv[1]
+    if args.backend != 'random_forest' and (args.multi_output or args.tune or args.incremental):
+        parser.error("--multi-output, --tune et --incremental n'existent que pour random_forest")
+
+    if args.incremental and (args.multi_output or args.fold_scaler or args.n_estimators):
+        parser.error("--incremental reprend la configuration des modèles existants "
+                     "(--multi-output, --fold-scaler et --n-estimators ne s'appliquent pas)")
+
+    # Lignes d'entraînement mises de côté pour la compaction, seulement si elle est demandée
+    selection_fraction = COMPACTION_SELECTION_FRACTION if args.compact_tolerance is not None else 0.0
+
+    # Options d'écriture des modèles (format compact, compression)
+    artifact_options = {
+        'compact': args.compact,
+        'compact_tolerance': args.compact_tolerance,
+        'compress': (args.compress, args.compress_level) if args.compress else 0
+    }
+
+    if args.benchmark_features:
+        results = benchmark_features()
+        os.makedirs('ml_models', exist_ok=True)
+        with open(os.path.join('ml_models', 'feature_benchmark.json'), 'w') as f:
+            json.dump(results, f, indent=2)
+        print("\nRésultats enregistrés dans ml_models/feature_benchmark.json")
+        return
+
+    csv_file = args.csv_file
 
     if not os.path.exists(csv_file):
         print(f"Erreur: Le fichier '{csv_file}' n'existe pas")
-        print("Usage: python train_weather_model.py [fichier_csv]")
+        print("Usage: python train_weather_model.py [fichier_csv] [options] (voir --help)")
         sys.exit(1)
 
+    # En incrémental, les heures précédant --start servent seulement d'historique
+    # (décalages et moyennes mobiles des premières lignes de la période)
+    load_start = args.start
+    if args.incremental and args.start is not None:
+        history = pd.Timedelta(hours=max(LAG_HOURS + ROLLING_HOURS))
+        load_start = (pd.Timestamp(args.start, tz='UTC') - history).isoformat()
+
     # Charger et préparer les données
-    df = load_and_prepare_data(csv_file)
+    df = load_and_prepare_data(csv_file, start=load_start, end=args.end, regions=args.regions)
+    if df is not None and load_start != args.start:
+        df = df[df.index >= pd.Timestamp(args.start, tz='UTC')]
 
     if df is None or df.empty:
         print("Erreur: Impossible de charger ou préparer les données")
         sys.exit(1)
 
-    # Entraîner les modèles
-    models = train_models(df)
+    if args.benchmark_multi_output:
+        results = benchmark_multi_output(df)
+        os.makedirs('ml_models', exist_ok=True)
+        with open(os.path.join('ml_models', 'multi_output_benchmark.json'), 'w') as f:
+            json.dump(results, f, indent=2)
+        print("\nRésultats enregistrés dans ml_models/multi_output_benchmark.json")
+        return
+
+    if args.benchmark_backends:
+        results = benchmark_backends(df)
+        os.makedirs('ml_models', exist_ok=True)
+        with open(os.path.join('ml_models', 'backend_benchmark.json'), 'w') as f:
+            json.dump(results, f, indent=2)
+        print("\nRésultats enregistrés dans ml_models/backend_benchmark.json")
+        return
+
+    if args.incremental:
+        models = train_incremental(df, new_trees=args.new_trees, max_trees=args.max_trees,
+                                   tolerance=args.tolerance, max_depth=args.max_depth,
+                                   selection_fraction=selection_fraction)
+        if models is None:
+            print("Erreur: modèles actuels conservés, rien n'a été écrit")
+            sys.exit(1)
+
+        save_models(models, **artifact_options)
+        print("\n✅ Entraînement incrémental terminé avec succès!")
+        return
+
+    # Entraîner les modèles (--n-estimators règle le paramètre du nombre d'arbres de la famille)
+    size_param = MODEL_BACKENDS[args.backend]['size_param']
+    model_params = {key: value for key, value in [(size_param, args.n_estimators),
+                                                  ('max_depth', args.max_depth)] if value is not None}
+    if args.tune:
+        feature_cols = [col for col in df.columns if col not in ['temperature_future', 'humidity_future']]
+        tuning = tune_forest(df, feature_cols, budget_seconds=args.tune_budget, workers=args.tune_workers)
+        if tuning is None:
+            print("Erreur: budget épuisé avant la première évaluation")
+            sys.exit(1)
+        model_params = tuning['forest_params']
+
+    models = train_models(df, multi_output=args.multi_output, model_params=model_params,
+                          cv_splits=args.cv_splits, cv_workers=args.cv_workers, backend=args.backend,
+                          selection_fraction=selection_fraction)
 
     # Sauvegarder les modèles
-    save_models(models)
+    save_models(models, fold_scaler=args.fold_scaler, **artifact_options)
 
     print("\n✅ Entraînement terminé avec succès!")
     print(f"Les modèles peuvent maintenant être utilisés pour faire des prédictions.")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,123 +1,1097 @@
-from flask import Flask, request, jsonify
+import time
+
+# Début de l'import du module (durée rapportée dans `startup`)
+IMPORT_START = time.perf_counter()
+
+from flask import Flask, request, jsonify, Response, stream_with_context, g, has_app_context, has_request_context
 from flask_cors import CORS
-import joblib
-import pandas as pd
 import numpy as np
 import json
 import os
+import sys
+import argparse
+import struct
+import hmac
+import threading
+import bisect
+from contextlib import contextmanager
+import queue
+from collections import OrderedDict
 from datetime import datetime
+from zoneinfo import ZoneInfo
 import logging
 
+from flat_forest import FlatForest
+
 # Configuration du logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Initialiser Flask
 app = Flask(__name__)
-CORS(app)  # Permettre les requêtes cross-origin
+# Permettre les requêtes cross-origin, sauf sur les endpoints d'administration
+CORS(app, resources={r'^(?!/admin/).*': {'origins': '*'}})
 
-# Variables globales pour les modèles
+# Variables globales pour les modèles: dictionnaire remplacé en bloc à chaque
+# (re)chargement, jamais modifié une fois publié (voir current_models)
 models = {}
 
+# Version servie avant le dernier chargement (retour arrière avec rollback_models)
+previous_models = None
+reload_lock = threading.Lock()
+RELOAD_BUSY = 'Rechargement déjà en cours'
+
+# Vérification périodique d'une nouvelle version dans ml_models/ (secondes, 0 pour désactiver)
+RELOAD_INTERVAL = float(os.environ.get('ML_RELOAD_INTERVAL', 0))
+
+# Jeton exigé (en-tête X-Admin-Token) par les endpoints /admin/*: sans jeton configuré,
+# ils sont désactivés
+ADMIN_TOKEN = os.environ.get('ML_ADMIN_TOKEN')
+
+# État du démarrage: starting -> loading -> warming -> ready (ou failed), avec les
+# durées d'import du module, de chargement et de préchauffage des modèles
+startup = {
+    'state': 'starting',
+    'import_seconds': None,
+    'load_seconds': None,
+    'warmup_seconds': None,
+    'error': None
+}
+
+# Historiques serveur par localisation (LocationHistory)
+location_histories = {}
+location_histories_lock = threading.Lock()
+
+# Moteur d'inférence: 'sklearn' (RandomForestRegressor.predict) ou 'flat' (forêts aplaties)
+ENGINE = os.environ.get('ML_ENGINE', 'sklearn')
+
+# Mappage mémoire des forêts aplaties ('r' pour les partager entre workers, vide sinon)
+MMAP_MODE = os.environ.get('ML_MMAP_MODE') or None
+
+# Colonnes météo du modèle -> (clé JSON de la requête, valeur par défaut)
+WEATHER_INPUTS = {
+    '2 metre temperature': ('temperature', 20),
+    '2 metre relative humidity': ('humidity', 60),
+    '10m wind speed': ('wind_speed', 10),
+    'Total precipitation': ('precipitation', 0)
+}
+
+# Features dérivées de l'historique, pour chaque colonne météo
+HISTORY_FEATURES = ('lag_1h', 'lag_3h', 'lag_6h', 'ma_6h', 'ma_24h')
+
+# Précision des capteurs, utilisée pour quantifier les clés du cache de prédictions
+# (les features dérivées reprennent la précision de leur colonne météo)
+SENSOR_PRECISION = {
+    '2 metre temperature': 0.1,
+    '2 metre relative humidity': 1.0,
+    '10m wind speed': 0.1,
+    'Total precipitation': 0.1
+}
+
+# Micro-batching des requêtes /predict concurrentes: activation, fenêtre d'attente
+# maximale (ms) et taille maximale d'un lot
+MICROBATCH = os.environ.get('ML_MICROBATCH', '0') == '1'
+MICROBATCH_WINDOW_MS = float(os.environ.get('ML_MICROBATCH_WINDOW_MS', 2))
+MICROBATCH_MAX_SIZE = int(os.environ.get('ML_MICROBATCH_MAX_SIZE', 64))
+# Attente maximale (ms) du résultat d'un lot: au-delà, la requête prédit elle-même sa ligne
+MICROBATCH_TIMEOUT_MS = float(os.environ.get('ML_MICROBATCH_TIMEOUT_MS', 1000))
 
-def load_models():
+# Format binaire en colonnes de /batch_predict (voir encode_columnar)
+COLUMNAR_MIMETYPE = 'application/vnd.meteocrs.columnar'
+COLUMNAR_MAGIC = b'MCRS'
+COLUMNAR_VERSION = 1
+COLUMNAR_HEADER = struct.Struct('<4sHHI')  # magic, version, n_colonnes, n_lignes
+COLUMNAR_NAME_LENGTH = struct.Struct('<H')
+
+# Nombre de localisations prédites ensemble par /batch_predict/stream
+STREAM_CHUNK_SIZE = int(os.environ.get('ML_STREAM_CHUNK_SIZE', 1000))
+
+# Cache de prédictions: nombre d'entrées (0 = désactivé) et durée de vie en secondes
+CACHE_SIZE = int(os.environ.get('ML_CACHE_SIZE', 10000))
+CACHE_TTL = float(os.environ.get('ML_CACHE_TTL', 300))
+
+
+class Metrics:
     """
-    Charge les modèles entraînés et les métadonnées
+    Compteurs, jauges et histogrammes de latence exposés au format texte Prometheus
+
+    Chaque mesure ne coûte qu'une recherche de bucket et quelques additions sous verrou;
+    le texte n'est produit qu'à la lecture de /metrics.
+    """
+
+    BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    PREFIX = 'meteocrs_'
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}  # (endpoint, étape) -> [compte par bucket..., +Inf], somme
+        self.counters = {}  # (nom, labels) -> valeur
+        self.gauges = {}  # nom -> valeur
+
+    def observe(self, endpoint, stage, seconds):
+        bucket = bisect.bisect_left(self.BUCKETS, seconds)
+        with self.lock:
+            histogram = self.histograms.get((endpoint, stage))
+            if histogram is None:
+                histogram = self.histograms[(endpoint, stage)] = [[0] * (len(self.BUCKETS) + 1), 0.0]
+            histogram[0][bucket] += 1
+            histogram[1] += seconds
+
+    @contextmanager
+    def stage(self, stage, endpoint=None):
+        """
+        Mesure la durée d'une étape (endpoint de la requête en cours par défaut)
+
+        Hors requête et sans libellé explicite (voir using_models), rien n'est enregistré:
+        les histogrammes ne contiennent que des endpoints.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            endpoint = endpoint or current_endpoint()
+            if endpoint is not None:
+                self.observe(endpoint, stage, time.perf_counter() - start)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    @staticmethod
+    def _labels(labels):
+        return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}' if labels else ''
+
+    def render(self):
+        """Texte au format d'exposition Prometheus"""
+        prefix = self.PREFIX
+        lines = []
+
+        with self.lock:
+            histograms = {key: (list(counts), total) for key, (counts, total) in self.histograms.items()}
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+
+        lines.append(f'# HELP {prefix}stage_duration_seconds Durée des étapes de prédiction')
+        lines.append(f'# TYPE {prefix}stage_duration_seconds histogram')
+        for (endpoint, stage), (counts, total) in sorted(histograms.items()):
+            labels = [('endpoint', endpoint), ('stage', stage)]
+            cumulative = 0
+            for bound, count in zip(self.BUCKETS + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{prefix}stage_duration_seconds_bucket{self._labels(labels + [("le", bound)])} {cumulative}')
+            lines.append(f'{prefix}stage_duration_seconds_sum{self._labels(labels)} {total}')
+            lines.append(f'{prefix}stage_duration_seconds_count{self._labels(labels)} {cumulative}')
+
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f'# TYPE {prefix}{name} counter')
+            for (counter_name, labels), value in sorted(counters.items()):
+                if counter_name == name:
+                    lines.append(f'{prefix}{name}{self._labels(labels)} {value}')
+
+        for name, value in sorted(gauges.items()):
+            lines.append(f'# TYPE {prefix}{name} gauge')
+            lines.append(f'{prefix}{name} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def current_endpoint():
+    """
+    Libellé donné au bloc using_models en cours (micro-batching, préchauffage, y compris
+    celui lancé par /admin/reload), sinon nom de l'endpoint Flask en cours, None hors requête
+    """
+    # Le contexte d'application de using_models passe avant la requête qui l'a ouvert
+    if has_app_context() and 'metrics_endpoint' in g:
+        return g.metrics_endpoint
+    if has_request_context():
+        return request.endpoint or 'unknown'
+    return None
+
+
+# Métriques de l'API (exposées sur /metrics)
+metrics = Metrics()
+
+
+class PredictionCache:
+    """
+    Cache LRU borné (taille et durée de vie) des prédictions, indexé par le vecteur de
+    features quantifié à la précision des capteurs et par la version des modèles
+    """
+
+    def __init__(self, max_size=CACHE_SIZE, ttl=CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()  # clé -> (expiration, température, humidité)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_many(self, keys):
+        """Retourne les entrées valides (ou None) pour une liste de clés"""
+        now = time.monotonic()
+        results = []
+
+        with self.lock:
+            for key in keys:
+                entry = self.entries.get(key)
+                if entry is not None and entry[0] >= now:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    results.append((entry[1], entry[2]))
+                    continue
+
+                if entry is not None:
+                    del self.entries[key]  # Entrée expirée
+                self.misses += 1
+                results.append(None)
+
+        return results
+
+    def put_many(self, items):
+        """Ajoute des entrées (clé, température, humidité) en évinçant les moins récentes"""
+        expires = time.monotonic() + self.ttl
+
+        with self.lock:
+            for key, temp_pred, humid_pred in items:
+                self.entries[key] = (expires, temp_pred, humid_pred)
+                self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.max_size > 0,
+                'size': len(self.entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+
+# Cache des prédictions, vidé à chaque chargement de modèles
+prediction_cache = PredictionCache()
+
+
+class MicroBatcher:
+    """
+    Regroupe les lignes de features des requêtes /predict concurrentes: un thread
+    dédié attend au plus `window_ms` après la première ligne (ou `max_batch_size`
+    lignes), prédit tout le lot en un seul appel vectorisé et rend à chaque
+    requête son résultat.
+
+    Une requête n'attend jamais plus de `timeout_ms`: si le thread est bloqué ou
+    arrêté, elle prédit sa ligne elle-même au lieu d'occuper un worker indéfiniment.
+    """
+
+    def __init__(self, window_ms=MICROBATCH_WINDOW_MS, max_batch_size=MICROBATCH_MAX_SIZE,
+                 timeout_ms=MICROBATCH_TIMEOUT_MS):
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.timeout = timeout_ms / 1000
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.rows = 0
+        self.largest_batch = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.timeouts = 0
+
+    def _ensure_started(self):
+        # Démarrage paresseux: le thread doit être créé dans le processus qui sert
+        # les requêtes (après le fork des workers gunicorn)
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+                    self.thread.start()
+
+    def submit(self, features):
+        """Soumet un vecteur de features et attend (température, humidité)"""
+        self._ensure_started()
+
+        pending = {'features': features, 'models': current_models(),
+                   'done': threading.Event(), 'enqueued': time.perf_counter()}
+        self.queue.put(pending)
+
+        if not pending['done'].wait(self.timeout):
+            # Lot en retard: le résultat éventuel du thread sera simplement ignoré
+            with self.lock:
+                self.timeouts += 1
+            metrics.inc('microbatch_timeouts_total')
+            logger.warning(f"Micro-batching: pas de résultat après {self.timeout * 1000:.0f} ms, "
+                           f"prédiction directe")
+            temp_preds, humid_preds = predict_uncached(features[np.newaxis, :])
+            return temp_preds[0], humid_preds[0]
+
+        if 'error' in pending:
+            raise pending['error']
+        return pending['result']
+
+    def _collect(self):
+        """Attend une première ligne puis complète le lot jusqu'à la fin de la fenêtre"""
+        batch = [self.queue.get()]
+        deadline = batch[0]['enqueued'] + self.window
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+
+            # Un rechargement peut survenir pendant la fenêtre: chaque ligne est prédite
+            # avec la version des modèles qui a servi à préparer ses features
+            groups = {}
+            for pending in batch:
+                groups.setdefault(id(pending['models']), []).append(pending)
+
+            try:
+                for group in groups.values():
+                    with using_models(group[0]['models'], endpoint='micro-batcher'):
+                        temp_preds, humid_preds = predict_matrix(np.vstack([pending['features'] for pending in group]))
+                    for pending, temp_pred, humid_pred in zip(group, temp_preds, humid_preds):
+                        pending['result'] = (temp_pred, humid_pred)
+            except Exception as e:
+                for pending in batch:
+                    pending['error'] = e
+            finally:
+                for pending in batch:
+                    pending['done'].set()
+
+            waits = [started - pending['enqueued'] for pending in batch]
+            with self.lock:
+                self.batches += 1
+                self.rows += len(batch)
+                self.largest_batch = max(self.largest_batch, len(batch))
+                self.total_wait += sum(waits)
+                self.max_wait = max(self.max_wait, max(waits))
+
+    def stats(self):
+        with self.lock:
+            return {
+                'enabled': True,
+                'window_ms': self.window * 1000,
+                'max_batch_size': self.max_batch_size,
+                'timeout_ms': self.timeout * 1000,
+                'timeouts': self.timeouts,
+                'queue_depth': self.queue.qsize(),
+                'batches': self.batches,
+                'rows': self.rows,
+                'mean_batch_size': self.rows / self.batches if self.batches else 0.0,
+                'largest_batch': self.largest_batch,
+                'mean_wait_ms': self.total_wait / self.rows * 1000 if self.rows else 0.0,
+                'max_wait_ms': self.max_wait * 1000
+            }
+
+
+# Dispatcher optionnel des requêtes /predict (None si désactivé)
+micro_batcher = MicroBatcher() if MICROBATCH else None
+
+
+def build_feature_precision(feature_columns):
+    """Précision de quantification de chaque feature (1 pour les features temporelles)"""
+    precision = np.ones(len(feature_columns))
+    for i, col in enumerate(feature_columns):
+        for base_col, value in SENSOR_PRECISION.items():
+            if col == base_col or col.startswith(f'{base_col}_'):
+                precision[i] = value
+    return precision
+
+
+def model_names(metadata):
+    """Noms des fichiers de modèles (sans extension) décrits par les métadonnées"""
+    if metadata.get('multi_output', False):
+        return ['weather_model']
+    return ['temperature_model', 'humidity_model']
+
+
+def current_models():
+    """
+    Modèles à utiliser pour le traitement en cours
+
+    Une requête fige au début la version publiée (g.models): un rechargement
+    pendant son traitement ne lui fait jamais mélanger deux versions.
+    """
+    if has_app_context() and 'models' in g:
+        return g.models
+    return models
+
+
+@contextmanager
+def using_models(active_models, endpoint=None):
+    """
+    Fige les modèles utilisés hors requête (préchauffage, micro-batching)
+
+    `endpoint` est le libellé des mesures de latence prises dans le bloc (aucune sinon).
+    """
+    with app.app_context():
+        g.models = active_models
+        g.metrics_endpoint = endpoint
+        yield
+
+
+def read_models(engine=None, mmap_mode=None, model_dir='ml_models'):
+    """
+    Lit une version complète des modèles sans modifier les modèles servis
+
+    Avec mmap_mode='r', les tableaux des forêts aplaties sont mappés en mémoire en
+    lecture seule: tous les processus d'une machine partagent une seule copie physique.
+    """
+    # joblib (et sklearn via le dépickling) n'est importé qu'au chargement des modèles
+    import joblib
+
+    engine = engine or ENGINE
+    mmap_mode = mmap_mode or MMAP_MODE
+
+    loaded_models = {}
+
+    # Charger les métadonnées
+    with open(os.path.join(model_dir, 'model_metadata.json'), 'r') as f:
+        loaded_models['metadata'] = json.load(f)
+
+    # Charger les modèles avec le moteur d'inférence choisi
+    if engine not in ('sklearn', 'flat'):
+        raise ValueError(f"Moteur d'inférence inconnu: {engine}")
+
+    n_features = len(loaded_models['metadata']['feature_columns'])
+    loaded = {}
+    for name in model_names(loaded_models['metadata']):
+        if engine == 'flat':
+            loaded[name] = FlatForest(joblib.load(os.path.join(model_dir, f'{name}_flat.pkl'),
+                                                  mmap_mode=mmap_mode))
+            model_features = loaded[name].n_features
+        else:
+            loaded[name] = joblib.load(os.path.join(model_dir, f'{name}.pkl'))
+            model_features = loaded[name].n_features_in_
+
+        # Des fichiers d'entraînements différents ne doivent pas être mélangés
+        if model_features != n_features:
+            raise ValueError(f"{name}: {model_features} features attendues, "
+                             f"{n_features} dans les métadonnées")
+
+    # Une forêt multi-sorties sert les deux cibles en un seul parcours
+    loaded_models['multi_model'] = loaded.get('weather_model')
+    loaded_models['temp_model'] = loaded.get('temperature_model')
+    loaded_models['humid_model'] = loaded.get('humidity_model')
+    loaded_models['engine'] = engine
+    loaded_models['mmap_mode'] = mmap_mode
+
+    # Le scaler n'est pas utilisé si la normalisation est intégrée aux seuils des arbres
+    if loaded_models['metadata'].get('input_scaling', 'standard') == 'standard':
+        loaded_models['scaler'] = joblib.load(os.path.join(model_dir, 'scaler.pkl'))
+    else:
+        loaded_models['scaler'] = None
+
+    # Fuseau des features calendaires de l'entraînement (heure locale du serveur pour les
+    # modèles plus anciens, qui ne l'enregistraient pas)
+    timezone = loaded_models['metadata'].get('calendar_timezone')
+    loaded_models['calendar_timezone'] = ZoneInfo(timezone) if timezone else None
+
+    # Précalculer la position de chaque feature dans le vecteur d'entrée
+    loaded_models['feature_index'] = build_feature_index(loaded_models['metadata']['feature_columns'])
+    loaded_models['feature_precision'] = build_feature_precision(loaded_models['metadata']['feature_columns'])
+
+    # Chaque version a sa propre clé dans le cache de prédictions
+    loaded_models['version'] = f"{loaded_models['metadata']['training_date']}/{engine}"
+    return loaded_models
+
+
+def publish_models(loaded_models):
+    """
+    Remplace atomiquement les modèles servis (simple réaffectation de la variable globale)
+    et conserve la version précédente pour un retour arrière
+    """
+    global models, previous_models
+
+    previous_models = models or None
+    models = loaded_models
+
+    # Nouvelle version des modèles: les prédictions en cache ne sont plus valides
+    prediction_cache.clear()
+
+
+def load_models(engine=None, mmap_mode=None):
     """
-    global models
+    Charge les modèles entraînés et les métadonnées
 
-    model_dir = 'ml_models'
+    Les modèles sont préparés à part puis publiés d'un coup: une requête concurrente
+    (chargement en arrière-plan) ne voit jamais un dictionnaire à moitié rempli.
+    """
+    start = time.perf_counter()
 
     try:
-        # Charger les modèles
-        models['temp_model'] = joblib.load(os.path.join(model_dir, 'temperature_model.pkl'))
-        models['humid_model'] = joblib.load(os.path.join(model_dir, 'humidity_model.pkl'))
-        models['scaler'] = joblib.load(os.path.join(model_dir, 'scaler.pkl'))
+        loaded_models = read_models(engine, mmap_mode)
+        publish_models(loaded_models)
 
-        # Charger les métadonnées
-        with open(os.path.join(model_dir, 'model_metadata.json'), 'r') as f:
-            models['metadata'] = json.load(f)
+        metrics.set_gauge('model_load_seconds', time.perf_counter() - start)
+        metrics.inc('model_loads_total', status='success')
 
-        logger.info("Modèles chargés avec succès")
+        logger.info(f"Modèles chargés avec succès (moteur: {loaded_models['engine']}, "
+                    f"mmap: {loaded_models['mmap_mode'] or 'non'})")
         return True
     except Exception as e:
+        metrics.inc('model_loads_total', status='error')
         logger.error(f"Erreur lors du chargement des modèles: {str(e)}")
         return False
 
 
-def prepare_features(weather_data, historical_data=None):
+def reload_models(engine=None, mmap_mode=None):
     """
-    Prépare les features pour la prédiction à partir des données météo actuelles
+    Recharge les modèles de ml_models/ sans interrompre le service: lecture et validation
+    de la nouvelle version, préchauffage, puis bascule atomique. En cas d'échec, la
+    version servie ne change pas.
+
+    Retourne (succès, message).
     """
+    if not reload_lock.acquire(blocking=False):
+        return False, RELOAD_BUSY
+
+    start = time.perf_counter()
     try:
-        # Créer un DataFrame avec les données actuelles
-        current_data = {
-            '2 metre temperature': float(weather_data.get('temperature', 20)),
-            '2 metre relative humidity': float(weather_data.get('humidity', 60)),
-            '10m wind speed': float(weather_data.get('wind_speed', 10)),
-            'Total precipitation': float(weather_data.get('precipitation', 0))
-        }
+        # Même moteur et même mappage mémoire que la version servie, sauf indication contraire
+        engine = engine or models.get('engine')
+        mmap_mode = mmap_mode or models.get('mmap_mode')
 
-        # Si on a des données historiques, les utiliser pour les features de décalage
-        if historical_data and len(historical_data) >= 24:
-            # Convertir en DataFrame
-            hist_df = pd.DataFrame(historical_data)
-
-            # Ajouter les données actuelles
-            current_df = pd.DataFrame([current_data])
-            df = pd.concat([hist_df, current_df], ignore_index=True)
-
-            # Créer les features de décalage pour la dernière ligne
-            for col in current_data.keys():
-                if col in df.columns:
-                    current_data[f'{col}_lag_1h'] = df[col].iloc[-2] if len(df) > 1 else current_data[col]
-                    current_data[f'{col}_lag_3h'] = df[col].iloc[-4] if len(df) > 3 else current_data[col]
-                    current_data[f'{col}_lag_6h'] = df[col].iloc[-7] if len(df) > 6 else current_data[col]
-                    current_data[f'{col}_ma_6h'] = df[col].tail(6).mean()
-                    current_data[f'{col}_ma_24h'] = df[col].tail(24).mean()
+        candidate = read_models(engine, mmap_mode)
+        with using_models(candidate):
+            warm_up_models()
+        publish_models(candidate)
+
+        metrics.set_gauge('model_load_seconds', time.perf_counter() - start)
+        metrics.inc('model_reloads_total', status='success')
+        logger.info(f"Modèles rechargés: version {candidate['version']}")
+        return True, f"Version {candidate['version']} activée"
+    except Exception as e:
+        metrics.inc('model_reloads_total', status='error')
+        logger.error(f"Erreur lors du rechargement des modèles: {str(e)}")
+        return False, str(e)
+    finally:
+        reload_lock.release()
+
+
+def rollback_models():
+    """
+    Revient à la version servie avant le dernier chargement (un second appel
+    revient à la version la plus récente). Retourne (succès, message).
+    """
+    if not reload_lock.acquire(blocking=False):
+        return False, RELOAD_BUSY
+
+    try:
+        if previous_models is None:
+            return False, 'Aucune version précédente'
+
+        publish_models(previous_models)
+        metrics.inc('model_reloads_total', status='rollback')
+        logger.info(f"Retour à la version {models['version']}")
+        return True, f"Version {models['version']} réactivée"
+    finally:
+        reload_lock.release()
+
+
+def watch_models(interval, model_dir='ml_models'):
+    """
+    Recharge les modèles quand model_metadata.json, écrit en dernier par l'entraînement,
+    annonce une nouvelle version. Une version en échec ou abandonnée par un retour
+    arrière n'est pas rechargée tant qu'un nouvel entraînement ne l'a pas remplacée.
+    """
+    metadata_path = os.path.join(model_dir, 'model_metadata.json')
+    seen = models['metadata']['training_date'] if models else None
+
+    while True:
+        time.sleep(interval)
+        try:
+            with open(metadata_path, 'r') as f:
+                training_date = json.load(f)['training_date']
+        except (OSError, ValueError, KeyError):
+            continue  # Fichier absent ou en cours d'écriture
+
+        # Version vue seulement si le rechargement a eu lieu (réussi ou non): si un
+        # rechargement manuel occupe le verrou, nouvel essai au tour suivant
+        if training_date != seen:
+            success, message = reload_models()
+            if success or message != RELOAD_BUSY:
+                seen = training_date
+
+
+def start_model_watcher(interval=None):
+    """Lance watch_models dans un thread (désactivé si l'intervalle est nul)"""
+    interval = RELOAD_INTERVAL if interval is None else interval
+    if interval <= 0:
+        return None
+
+    thread = threading.Thread(target=watch_models, args=(interval,), name='model-watcher', daemon=True)
+    thread.start()
+    return thread
+
+
+def warm_up_models():
+    """
+    Exécute une prédiction factice, hors cache, pour que la première vraie requête
+    ne paie pas le coût à froid (pages des fichiers mappés, imports différés, allocations)
+
+    Ses latences sont enregistrées sous l'endpoint 'warmup', à part de celles des requêtes.
+    """
+    with using_models(current_models(), endpoint='warmup'):
+        features = prepare_features({})
+        if features is None:
+            raise ValueError("Impossible de préparer les features de préchauffage")
+
+        # Une ligne (chemin de /predict) puis un bloc complet (chemin de /batch_predict)
+        predict_uncached(features.reshape(1, -1))
+        temp_preds, humid_preds = predict_uncached(np.tile(features, (FlatForest.CHUNK_SIZE, 1)))
+
+    if not (np.all(np.isfinite(temp_preds)) and np.all(np.isfinite(humid_preds))):
+        raise ValueError("Prédictions de préchauffage non finies")
+
+
+def run_startup(engine=None, mmap_mode=None, history_csv=None):
+    """
+    Initialise les historiques, charge puis préchauffe les modèles en mettant à jour `startup`
+
+    Retourne True si l'API est prête à servir des prédictions.
+    """
+    startup['state'] = 'loading'
+    start = time.perf_counter()
+
+    if history_csv:
+        load_histories_from_csv(history_csv)
+
+    if not load_models(engine, mmap_mode):
+        startup['state'] = 'failed'
+        startup['error'] = 'Impossible de charger les modèles'
+        return False
+    startup['load_seconds'] = time.perf_counter() - start
+
+    startup['state'] = 'warming'
+    start = time.perf_counter()
+    try:
+        warm_up_models()
+    except Exception as e:
+        logger.error(f"Erreur lors du préchauffage des modèles: {str(e)}")
+        startup['state'] = 'failed'
+        startup['error'] = str(e)
+        return False
+    startup['warmup_seconds'] = time.perf_counter() - start
+
+    startup['state'] = 'ready'
+    start_model_watcher()
+    logger.info(f"API prête (import: {startup['import_seconds'] or 0:.2f}s, "
+                f"chargement: {startup['load_seconds']:.2f}s, "
+                f"préchauffage: {startup['warmup_seconds']:.2f}s)")
+    return True
+
+
+def start_background_startup(engine=None, mmap_mode=None, history_csv=None):
+    """Lance run_startup dans un thread: le serveur écoute pendant le chargement"""
+    thread = threading.Thread(target=run_startup, name='startup', daemon=True,
+                              kwargs={'engine': engine, 'mmap_mode': mmap_mode,
+                                      'history_csv': history_csv})
+    thread.start()
+    return thread
+
+
+class LocationHistory:
+    """
+    Historique circulaire des 24 dernières observations d'une localisation
+    (une colonne par variable de WEATHER_INPUTS)
+
+    Les sommes et effectifs (NaN ignorés) des 5 et 23 dernières observations sont tenus
+    à jour à chaque ajout: avec l'observation courante, ils donnent directement les
+    moyennes 6h et 24h, en O(1) quelle que soit la longueur de l'historique.
+    """
+
+    SIZE = 24
+
+    def __init__(self):
+        n_columns = len(WEATHER_INPUTS)
+        self.values = np.full((self.SIZE, n_columns), np.nan)
+        self.position = 0  # Prochain emplacement à écrire
+        self.count = 0
+        self.lock = threading.Lock()
+        self.sums = {5: np.zeros(n_columns), 23: np.zeros(n_columns)}
+        self.counts = {5: np.zeros(n_columns), 23: np.zeros(n_columns)}
+
+    def _at(self, lag):
+        """Observation d'il y a `lag` heures (1 = la plus récente)"""
+        return self.values[(self.position - lag) % self.SIZE]
+
+    def _recompute_sums(self):
+        """Recalcule les sommes glissantes (évite la dérive des arrondis)"""
+        for window in self.sums:
+            recent = np.array([self._at(lag) for lag in range(1, window + 1)])
+            self.sums[window] = np.nansum(recent, axis=0)
+            self.counts[window] = (~np.isnan(recent)).sum(axis=0).astype(float)
+
+    def is_ready(self):
+        return self.count >= self.SIZE
+
+    def append(self, observation):
+        observation = np.asarray(observation, dtype=float)
+
+        with self.lock:
+            # L'observation entre dans les deux fenêtres, celles d'il y a 5h et 23h en sortent
+            for window in self.sums:
+                leaving = self._at(window)
+                self.sums[window] += np.nan_to_num(observation) - np.nan_to_num(leaving)
+                self.counts[window] += ~np.isnan(observation)
+                self.counts[window] -= ~np.isnan(leaving)
+
+            self.values[self.position] = observation
+            self.position = (self.position + 1) % self.SIZE
+            self.count += 1
+
+            if self.position == 0:
+                self._recompute_sums()
+
+    def rolling_features(self, currents):
+        """
+        Retourne (lag_1h, lag_3h, lag_6h, ma_6h, ma_24h), un tableau par feature,
+        pour les valeurs actuelles `currents` ajoutées à la fin de l'historique
+        """
+        currents = np.asarray(currents, dtype=float)
+        valid = ~np.isnan(currents)
+
+        with self.lock, np.errstate(invalid='ignore', divide='ignore'):
+            ma_6h = (self.sums[5] + np.nan_to_num(currents)) / (self.counts[5] + valid)
+            ma_24h = (self.sums[23] + np.nan_to_num(currents)) / (self.counts[23] + valid)
+            return self._at(1).copy(), self._at(3).copy(), self._at(6).copy(), ma_6h, ma_24h
+
+
+def get_location_history(location_id, create=False):
+    """Retourne l'historique serveur d'une localisation (créé à la demande si `create`)"""
+    if location_id is None:
+        return None
+
+    location_id = str(location_id)
+    history = location_histories.get(location_id)
+    if history is None and create:
+        with location_histories_lock:
+            history = location_histories.setdefault(location_id, LocationHistory())
+    return history
+
+
+def ingest_observation(location_id, observation):
+    """Ajoute une observation (mêmes clés que current_weather) à l'historique d'une localisation"""
+    values = [_to_float(observation.get(key)) for key, _ in WEATHER_INPUTS.values()]
+    get_location_history(location_id, create=True).append(values)
+
+
+def load_histories_from_csv(csv_file):
+    """
+    Initialise les historiques serveur à partir d'un CSV nettoyé (clean_meteo_csv.py)
+
+    Les localisations sont identifiées par 'latitude_longitude', comme dans csv-import.php.
+    Retourne le nombre de localisations chargées.
+    """
+    import pandas as pd
+
+    columns = ['Forecast timestamp', 'Position'] + list(WEATHER_INPUTS)
+    df = pd.read_csv(csv_file, sep=';', usecols=lambda col: col in columns)
+    df['Forecast timestamp'] = pd.to_datetime(df['Forecast timestamp'], utc=True)
+
+    # Seules les 24 dernières observations de chaque localisation sont utiles
+    df = df.sort_values('Forecast timestamp').groupby('Position').tail(LocationHistory.SIZE)
+
+    for position, group in df.groupby('Position', sort=False):
+        latitude, longitude = (part.strip() for part in position.split(',', 1))
+        history = get_location_history(f'{latitude}_{longitude}', create=True)
+        for row in group.reindex(columns=list(WEATHER_INPUTS)).to_numpy(dtype=float):
+            history.append(row)
+
+    logger.info(f"Historiques initialisés pour {len(location_histories)} localisations")
+    return len(location_histories)
+
+
+def build_feature_index(feature_columns):
+    """
+    Construit la table de correspondance colonne -> position dans le vecteur de features
+    """
+    return {col: i for i, col in enumerate(feature_columns)}
+
+
+def _to_float(value):
+    """Convertit une valeur JSON en float (None devient NaN, comme dans pandas)"""
+    return np.nan if value is None else float(value)
+
+
+def _mean_skipna(values):
+    """Moyenne en ignorant les NaN (même sommation que Series.mean())"""
+    missing = np.isnan(values)
+    count = values.size - missing.sum()
+    return np.where(missing, 0.0, values).sum() / count if count else np.nan
+
+
+def calendar_now():
+    """Heure courante dans le fuseau des features calendaires des modèles servis"""
+    return datetime.now(current_models().get('calendar_timezone'))
+
+
+def prepare_features(weather_data, historical_data=None, out=None, location_history=None):
+    """
+    Prépare le vecteur de features pour la prédiction à partir des données météo actuelles
+
+    Le vecteur (float64) suit l'ordre de metadata['feature_columns']. Si `out` est fourni
+    (par exemple une ligne d'une matrice de batch), il est rempli sur place.
+    Sans `historical_data`, l'historique serveur `location_history` est utilisé s'il est complet.
+    """
+    try:
+        feature_index = current_models()['feature_index']
+
+        if out is None:
+            out = np.zeros(len(feature_index))
         else:
-            # Pas de données historiques, utiliser les valeurs actuelles
-            for col in list(current_data.keys()):
-                current_data[f'{col}_lag_1h'] = current_data[col]
-                current_data[f'{col}_lag_3h'] = current_data[col]
-                current_data[f'{col}_lag_6h'] = current_data[col]
-                current_data[f'{col}_ma_6h'] = current_data[col]
-                current_data[f'{col}_ma_24h'] = current_data[col]
+            out[:] = 0  # Valeur par défaut des features absentes
 
-        # Ajouter les features temporelles
-        now = datetime.now()
-        current_data['hour'] = now.hour
-        current_data['day_of_week'] = now.weekday()
+        def set_feature(col, value):
+            if col in feature_index:
+                out[feature_index[col]] = value
 
-        # Créer un DataFrame avec toutes les features dans le bon ordre
-        feature_cols = models['metadata']['feature_columns']
-        features_df = pd.DataFrame([current_data])
+        currents = [float(weather_data.get(key, default)) for key, default in WEATHER_INPUTS.values()]
 
-        # S'assurer que toutes les colonnes sont présentes
-        for col in feature_cols:
-            if col not in features_df.columns:
-                features_df[col] = 0  # Valeur par défaut
+        # Si on a des données historiques, les utiliser pour les features de décalage
+        use_history = bool(historical_data) and len(historical_data) >= 24
+        rolling = None
+        if use_history:
+            # Fenêtre utile: 23 heures d'historique + l'heure actuelle
+            window = historical_data[-23:]
+            series = np.empty(len(window) + 1)
+        elif location_history is not None and location_history.is_ready():
+            # Historique serveur: décalages et moyennes mobiles sans parcourir l'historique
+            rolling = location_history.rolling_features(currents)
 
-        # Réordonner les colonnes
-        features_df = features_df[feature_cols]
+        for j, (col, current) in enumerate(zip(WEATHER_INPUTS, currents)):
+            set_feature(col, current)
 
-        return features_df
+            if use_history:
+                # Série chronologique de la colonne, l'heure actuelle en dernier
+                for i, record in enumerate(window):
+                    series[i] = _to_float(record.get(col))
+                series[-1] = current
+
+                set_feature(f'{col}_lag_1h', series[-2])
+                set_feature(f'{col}_lag_3h', series[-4])
+                set_feature(f'{col}_lag_6h', series[-7])
+                set_feature(f'{col}_ma_6h', _mean_skipna(series[-6:]))
+                set_feature(f'{col}_ma_24h', _mean_skipna(series[-24:]))
+            elif rolling is not None:
+                for suffix, values in zip(HISTORY_FEATURES, rolling):
+                    set_feature(f'{col}_{suffix}', values[j])
+            else:
+                # Pas de données historiques, utiliser les valeurs actuelles
+                for suffix in HISTORY_FEATURES:
+                    set_feature(f'{col}_{suffix}', current)
+
+        # Ajouter les features temporelles (même fuseau qu'à l'entraînement)
+        now = calendar_now()
+        set_feature('hour', now.hour)
+        set_feature('day_of_week', now.weekday())
+
+        return out
 
     except Exception as e:
         logger.error(f"Erreur lors de la préparation des features: {str(e)}")
         return None
 
 
+def predict_matrix(features):
+    """
+    Prédit température et humidité pour une matrice de features (n_lignes × n_features)
+
+    Les lignes déjà en cache sont servies directement; les autres sont normalisées
+    et prédites ensemble en un seul appel par modèle.
+    """
+    if prediction_cache.max_size <= 0:
+        return predict_uncached(features)
+
+    # Clé: vecteur quantifié à la précision des capteurs + version des modèles
+    active_models = current_models()
+    version = active_models['version']
+    quantized = np.round(features / active_models['feature_precision'])
+    keys = [(version, row.tobytes()) for row in quantized]
+
+    temp_preds = np.empty(len(features))
+    humid_preds = np.empty(len(features))
+
+    # Lignes absentes du cache, regroupées par clé (une seule prédiction par doublon)
+    missing = {}
+    for i, (key, cached) in enumerate(zip(keys, prediction_cache.get_many(keys))):
+        if cached is None:
+            missing.setdefault(key, []).append(i)
+        else:
+            temp_preds[i], humid_preds[i] = cached
+
+    if missing:
+        first_rows = [rows[0] for rows in missing.values()]
+        temp_missing, humid_missing = predict_uncached(features[first_rows])
+
+        for rows, temp_pred, humid_pred in zip(missing.values(), temp_missing, humid_missing):
+            temp_preds[rows] = temp_pred
+            humid_preds[rows] = humid_pred
+
+        prediction_cache.put_many(zip(missing.keys(), temp_missing.tolist(), humid_missing.tolist()))
+
+    return temp_preds, humid_preds
+
+
+def predict_uncached(features):
+    """
+    Normalise une matrice de features (n_lignes × n_features) et prédit
+    température et humidité en un seul appel par modèle
+    """
+    active_models = current_models()
+
+    # Équivalent de scaler.transform() sur un tableau NumPy, sans la validation
+    # ni l'avertissement sur les noms de colonnes
+    with metrics.stage('scale'):
+        scaler = active_models['scaler']
+        if scaler is not None:
+            features_scaled = (features - scaler.mean_) / scaler.scale_
+        else:
+            # Modèles à seuils en unités brutes: aucune normalisation
+            features_scaled = features
+
+    with metrics.stage('inference'):
+        if active_models['multi_model'] is not None:
+            predictions = active_models['multi_model'].predict(features_scaled)
+            return predictions[:, 0], predictions[:, 1]
+
+        temp_preds = active_models['temp_model'].predict(features_scaled)
+        humid_preds = active_models['humid_model'].predict(features_scaled)
+
+    return temp_preds, humid_preds
+
+
+def check_engine_parity(n_rows=1000, tolerance=1e-6, model_dir='ml_models'):
+    """
+    Test de parité: compare les prédictions du moteur aplati à celles de sklearn
+    sur des lignes aléatoires couvrant la plage des seuils de chaque feature
+    (valable que les seuils soient normalisés ou en unités brutes).
+    Retourne l'écart maximal.
+    """
+    import joblib
+
+    rng = np.random.default_rng(42)
+    max_diff = 0.0
+
+    with open(os.path.join(model_dir, 'model_metadata.json'), 'r') as f:
+        metadata = json.load(f)
+
+    for name in model_names(metadata):
+        forest = joblib.load(os.path.join(model_dir, f'{name}.pkl'))
+        flat = FlatForest(joblib.load(os.path.join(model_dir, f'{name}_flat.pkl')))
+
+        X = np.zeros((n_rows, flat.n_features))
+        for feature in range(flat.n_features):
+            thresholds = flat.threshold[(flat.feature == feature) & np.isfinite(flat.threshold)]
+            if thresholds.size:
+                low, high = thresholds.min(), thresholds.max()
+                margin = 0.1 * (high - low) + 1e-6
+                X[:, feature] = rng.uniform(low - margin, high + margin, n_rows)
+        diff = np.abs(forest.predict(X) - flat.predict(X)).max()
+        print(f"{name}: écart maximal {diff:.2e}")
+        max_diff = max(max_diff, diff)
+
+    if max_diff > tolerance:
+        raise AssertionError(f"Écart moteur aplati / sklearn supérieur à la tolérance: {max_diff:.2e}")
+
+    return max_diff
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    # Version des modèles utilisée pendant toute la requête (voir current_models)
+    g.models = models
+
+
+@app.after_request
+def record_request_metrics(response):
+    """Compte chaque requête et mesure sa durée totale (hors flux de réponse)"""
+    endpoint = request.endpoint or 'unknown'
+    if endpoint != 'prometheus_metrics':
+        metrics.observe(endpoint, 'total', time.perf_counter() - g.request_start)
+        metrics.inc('requests_total', endpoint=endpoint, status=response.status_code)
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Métriques au format texte Prometheus"""
+    cache = prediction_cache.stats()
+    metrics.set_gauge('models_loaded', int(bool(models)))
+    metrics.set_gauge('ready', int(startup['state'] == 'ready'))
+    for phase in ('import', 'load', 'warmup'):
+        if startup[f'{phase}_seconds'] is not None:
+            metrics.set_gauge(f'startup_{phase}_seconds', startup[f'{phase}_seconds'])
+    metrics.set_gauge('prediction_cache_entries', cache['size'])
+    metrics.set_gauge('prediction_cache_hits', cache['hits'])
+    metrics.set_gauge('prediction_cache_misses', cache['misses'])
+    metrics.set_gauge('location_histories', len(location_histories))
+    if micro_batcher is not None:
+        metrics.set_gauge('micro_batch_queue_depth', micro_batcher.queue.qsize())
+
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Endpoint de vérification de santé"""
+    """
+    Endpoint de vérification de santé (équivalent à /health/ready)
+
+    Répond 503 tant que les modèles ne sont pas chargés et préchauffés.
+    """
+    return health_ready()
+
+
+@app.route('/health/live', methods=['GET'])
+def health_live():
+    """Sonde de vivacité: le processus répond, même pendant le chargement des modèles"""
     return jsonify({
-        'status': 'healthy',
-        'models_loaded': bool(models),
+        'status': 'alive',
         'timestamp': datetime.now().isoformat()
     })
 
 
+@app.route('/health/ready', methods=['GET'])
+def health_ready():
+    """Sonde de disponibilité: modèles chargés et préchauffés, avec les durées de démarrage"""
+    ready = startup['state'] == 'ready'
+    return jsonify({
+        'status': 'healthy' if ready else startup['state'],
+        'models_loaded': bool(models),
+        'ready': ready,
+        'startup': startup,
+        'timestamp': datetime.now().isoformat()
+    }), 200 if ready else 503
+
+
 @app.route('/predict', methods=['POST'])
 def predict():
     """
@@ -131,44 +1105,52 @@ def predict():
             "wind_speed": 15,
             "precipitation": 0
         },
-        "historical_data": [...]  // Optionnel
+        "historical_data": [...],  // Optionnel
+        "location_id": "..."       // Optionnel: historique serveur (voir /observations)
     }
     """
     try:
         # Vérifier que les modèles sont chargés
-        if not models:
+        if not g.models:
             return jsonify({
                 'success': False,
                 'error': 'Modèles non chargés'
             }), 500
 
         # Récupérer les données de la requête
-        data = request.get_json()
+        with metrics.stage('parse'):
+            data = request.get_json()
 
         if not data or 'current_weather' not in data:
+            metrics.inc('errors_total', endpoint='predict', type='BadRequest')
             return jsonify({
                 'success': False,
                 'error': 'Données météo actuelles requises'
             }), 400
 
         # Préparer les features
-        features_df = prepare_features(
-            data['current_weather'],
-            data.get('historical_data', None)
-        )
+        with metrics.stage('features'):
+            features = prepare_features(
+                data['current_weather'],
+                data.get('historical_data', None),
+                location_history=get_location_history(data.get('location_id'))
+            )
 
-        if features_df is None:
+        if features is None:
+            metrics.inc('errors_total', endpoint='predict', type='FeaturePreparation')
             return jsonify({
                 'success': False,
                 'error': 'Erreur lors de la préparation des données'
             }), 500
 
-        # Normaliser les features
-        features_scaled = models['scaler'].transform(features_df)
-
-        # Faire les prédictions
-        temp_pred = models['temp_model'].predict(features_scaled)[0]
-        humid_pred = models['humid_model'].predict(features_scaled)[0]
+        # Normaliser les features et faire les prédictions (regroupées avec les
+        # requêtes concurrentes si le micro-batching est activé)
+        if micro_batcher is not None:
+            temp_pred, humid_pred = micro_batcher.submit(features)
+        else:
+            temp_preds, humid_preds = predict_matrix(features[np.newaxis, :])
+            temp_pred = temp_preds[0]
+            humid_pred = humid_preds[0]
 
         # S'assurer que les prédictions sont dans des plages valides
         temp_pred = max(-50, min(60, temp_pred))
@@ -201,15 +1183,18 @@ def predict():
                 'timestamp': datetime.now().isoformat()
             },
             'model_info': {
-                'type': models['metadata']['model_type'],
-                'training_date': models['metadata']['training_date'],
-                'metrics': models['metadata']['metrics']
+                'type': g.models['metadata']['model_type'],
+                'training_date': g.models['metadata']['training_date'],
+                'metrics': g.models['metadata']['metrics']
             }
         }
 
-        return jsonify(response)
+        metrics.inc('rows_total', endpoint='predict')
+        with metrics.stage('serialize'):
+            return jsonify(response)
 
     except Exception as e:
+        metrics.inc('errors_total', endpoint='predict', type=type(e).__name__)
         logger.error(f"Erreur lors de la prédiction: {str(e)}")
         return jsonify({
             'success': False,
@@ -217,62 +1202,426 @@ def predict():
         }), 500
 
 
+def encode_columnar(columns):
+    """
+    Encode des colonnes de même longueur au format binaire de /batch_predict:
+
+    - en-tête '<4sHHI': b'MCRS', version (1), nombre de colonnes, nombre de lignes
+    - pour chaque colonne: longueur du nom ('<H') puis nom en UTF-8
+    - bourrage nul jusqu'à un multiple de 4 octets
+    - données float32 little-endian, colonne par colonne
+    """
+    names = list(columns)
+    n_rows = len(columns[names[0]]) if names else 0
+
+    header = bytearray(COLUMNAR_HEADER.pack(COLUMNAR_MAGIC, COLUMNAR_VERSION, len(names), n_rows))
+    for name in names:
+        encoded = name.encode('utf-8')
+        header += COLUMNAR_NAME_LENGTH.pack(len(encoded)) + encoded
+    header += b'\0' * (-len(header) % 4)
+
+    data = np.empty((len(names), n_rows), dtype='<f4')
+    for i, name in enumerate(names):
+        data[i] = columns[name]
+
+    return bytes(header) + data.tobytes()
+
+
+def decode_columnar(body):
+    """
+    Décode le format binaire de /batch_predict en {nom: tableau float32}
+
+    Les colonnes sont des vues sur le corps de la requête (aucune copie).
+    """
+    magic, version, n_columns, n_rows = COLUMNAR_HEADER.unpack_from(body, 0)
+    if magic != COLUMNAR_MAGIC or version != COLUMNAR_VERSION:
+        raise ValueError('En-tête binaire invalide')
+
+    offset = COLUMNAR_HEADER.size
+    names = []
+    for _ in range(n_columns):
+        (length,) = COLUMNAR_NAME_LENGTH.unpack_from(body, offset)
+        offset += COLUMNAR_NAME_LENGTH.size
+        names.append(bytes(body[offset:offset + length]).decode('utf-8'))
+        offset += length
+    offset += -offset % 4
+
+    if len(body) - offset != n_columns * n_rows * 4:
+        raise ValueError('Taille des données binaires incohérente avec l\'en-tête')
+
+    data = np.frombuffer(body, dtype='<f4', count=n_columns * n_rows, offset=offset)
+    data = data.reshape(n_columns, n_rows)
+    return {name: data[i] for i, name in enumerate(names)}
+
+
+def build_feature_matrix(columns):
+    """
+    Construit la matrice de features d'un lot décrit en colonnes (format binaire)
+
+    Colonnes reconnues: les clés de current_weather ('temperature', 'humidity',
+    'wind_speed', 'precipitation', valeurs par défaut si absentes) et, pour l'historique,
+    '<clé>_lag_<k>h' pour k = 1..23 heures. L'historique n'est utilisé que si ces
+    23 colonnes sont présentes pour toutes les clés, comme les 24 enregistrements
+    exigés en JSON.
+    """
+    n_rows = len(next(iter(columns.values()))) if columns else 0
+    feature_index = current_models()['feature_index']
+    features = np.zeros((n_rows, len(feature_index)))
+
+    def set_feature(col, values):
+        if col in feature_index:
+            features[:, feature_index[col]] = values
+
+    history_columns = [f'{key}_lag_{k}h' for key, _ in WEATHER_INPUTS.values() for k in range(1, 24)]
+    present = [name in columns for name in history_columns]
+    if any(present) and not all(present):
+        raise ValueError('Historique incomplet: colonnes <clé>_lag_1h à <clé>_lag_23h requises')
+    use_history = all(present) and bool(present)
+
+    for col, (key, default) in WEATHER_INPUTS.items():
+        current = columns[key].astype(np.float64) if key in columns else np.full(n_rows, float(default))
+        set_feature(col, current)
+
+        if use_history:
+            # Série (n_lignes × 24): de l'heure la plus ancienne (23h) à l'heure actuelle
+            series = np.column_stack([columns[f'{key}_lag_{k}h'] for k in range(23, 0, -1)] + [current])
+            series = series.astype(np.float64)
+            valid = ~np.isnan(series)
+            filled = np.where(valid, series, 0.0)
+
+            set_feature(f'{col}_lag_1h', series[:, -2])
+            set_feature(f'{col}_lag_3h', series[:, -4])
+            set_feature(f'{col}_lag_6h', series[:, -7])
+            with np.errstate(invalid='ignore', divide='ignore'):
+                set_feature(f'{col}_ma_6h', filled[:, -6:].sum(axis=1) / valid[:, -6:].sum(axis=1))
+                set_feature(f'{col}_ma_24h', filled.sum(axis=1) / valid.sum(axis=1))
+        else:
+            for suffix in HISTORY_FEATURES:
+                set_feature(f'{col}_{suffix}', current)
+
+    # Ajouter les features temporelles (même fuseau qu'à l'entraînement)
+    now = calendar_now()
+    set_feature('hour', now.hour)
+    set_feature('day_of_week', now.weekday())
+
+    return features
+
+
+def batch_predict_columnar():
+    """
+    /batch_predict au format binaire en colonnes: une ligne par localisation, réponse
+    dans le même format (colonnes 'temperature' et 'humidity', même ordre de lignes)
+    sauf si le client préfère JSON via l'en-tête Accept
+    """
+    try:
+        with metrics.stage('parse'):
+            columns = decode_columnar(request.get_data(cache=False))
+        with metrics.stage('features'):
+            features = build_feature_matrix(columns)
+    except (ValueError, struct.error) as e:
+        metrics.inc('errors_total', endpoint='batch_predict', type='BadRequest')
+        return jsonify({
+            'success': False,
+            'error': f'Requête binaire invalide: {str(e)}'
+        }), 400
+
+    temp_preds, humid_preds = predict_matrix(features)
+    metrics.inc('rows_total', len(features), endpoint='batch_predict')
+
+    with metrics.stage('serialize'):
+        if request.accept_mimetypes.best_match(['application/json', COLUMNAR_MIMETYPE]) == COLUMNAR_MIMETYPE:
+            body = encode_columnar({'temperature': temp_preds, 'humidity': humid_preds})
+            return Response(body, mimetype=COLUMNAR_MIMETYPE)
+
+        return jsonify({
+            'success': True,
+            'predictions': {
+                'temperature': [round(float(value), 1) for value in temp_preds],
+                'humidity': [round(float(value)) for value in humid_preds]
+            },
+            'timestamp': datetime.now().isoformat()
+        })
+
+
+def predict_locations(locations):
+    """
+    Prédit un lot de localisations (format de /batch_predict) en un seul appel vectorisé
+
+    Retourne un résultat par localisation, dans l'ordre: la prédiction, ou l'erreur
+    ('error') si ses features n'ont pas pu être préparées.
+    """
+    results = [None] * len(locations)
+
+    # Matrice préallouée (n_localisations × n_features), remplie ligne par ligne
+    features_matrix = np.zeros((len(locations), len(current_models()['feature_index'])))
+    valid = np.zeros(len(locations), dtype=bool)
+
+    # Préparer les features de chaque localisation sans interrompre le batch
+    with metrics.stage('features'):
+        for i, location in enumerate(locations):
+            try:
+                features = prepare_features(
+                    location.get('current_weather', {}),
+                    location.get('historical_data', None),
+                    out=features_matrix[i],
+                    location_history=get_location_history(location.get('id'))
+                )
+            except Exception as e:
+                features = None
+                logger.error(f"Localisation invalide dans le batch: {str(e)}")
+
+            if features is None:
+                results[i] = {
+                    'location_id': location.get('id', 'unknown') if isinstance(location, dict) else 'unknown',
+                    'error': 'Erreur lors de la préparation des données'
+                }
+                continue
+
+            valid[i] = True
+
+    endpoint = current_endpoint()
+    metrics.inc('rows_total', int(valid.sum()), endpoint=endpoint)
+    if not valid.all():
+        metrics.inc('errors_total', int((~valid).sum()), endpoint=endpoint, type='FeaturePreparation')
+
+    if valid.any():
+        # Une seule normalisation et une seule prédiction par cible pour tout le batch
+        temp_preds, humid_preds = predict_matrix(features_matrix[valid])
+
+        for i, temp_pred, humid_pred in zip(np.flatnonzero(valid), temp_preds, humid_preds):
+            results[i] = {
+                'location_id': locations[i].get('id', 'unknown'),
+                'location_name': locations[i].get('name', 'Unknown'),
+                'temperature': round(float(temp_pred), 1),
+                'humidity': round(float(humid_pred))
+            }
+
+    return results
+
+
 @app.route('/batch_predict', methods=['POST'])
 def batch_predict():
     """
     Endpoint pour prédire plusieurs emplacements à la fois
+
+    Accepte aussi le format binaire en colonnes (Content-Type COLUMNAR_MIMETYPE),
+    voir batch_predict_columnar().
     """
+    if not g.models:
+        return jsonify({
+            'success': False,
+            'error': 'Modèles non chargés'
+        }), 500
+
+    if request.mimetype == COLUMNAR_MIMETYPE:
+        return batch_predict_columnar()
+
     try:
-        data = request.get_json()
+        with metrics.stage('parse'):
+            data = request.get_json()
 
         if not data or 'locations' not in data:
+            metrics.inc('errors_total', endpoint='batch_predict', type='BadRequest')
             return jsonify({
                 'success': False,
                 'error': 'Liste de localisations requise'
             }), 400
 
-        predictions = []
+        results = predict_locations(data['locations'])
 
-        for location in data['locations']:
-            # Préparer les features pour chaque localisation
-            features_df = prepare_features(
-                location.get('current_weather', {}),
-                location.get('historical_data', None)
-            )
+        with metrics.stage('serialize'):
+            return jsonify({
+                'success': True,
+                'predictions': [result for result in results if 'error' not in result],
+                'errors': [result for result in results if 'error' in result],
+                'timestamp': datetime.now().isoformat()
+            })
+
+    except Exception as e:
+        metrics.inc('errors_total', endpoint='batch_predict', type=type(e).__name__)
+        logger.error(f"Erreur lors de la prédiction batch: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/batch_predict/stream', methods=['POST'])
+def batch_predict_stream():
+    """
+    Variante en flux de /batch_predict pour les très gros lots (NDJSON)
+
+    Le corps contient une localisation JSON par ligne (même format que les éléments de
+    'locations'). Les lignes sont lues au fil de l'eau et prédites par blocs de
+    STREAM_CHUNK_SIZE; chaque résultat est renvoyé sur sa propre ligne dès que son bloc
+    est prêt, suivi d'une ligne de synthèse {"done": true, ...}. La mémoire utilisée
+    ne dépend que de la taille d'un bloc.
+    """
+    if not g.models:
+        return jsonify({
+            'success': False,
+            'error': 'Modèles non chargés'
+        }), 500
+
+    def generate():
+        counts = {'predictions': 0, 'errors': 0}
+
+        def flush(chunk):
+            for result in predict_locations(chunk):
+                counts['errors' if 'error' in result else 'predictions'] += 1
+                yield json.dumps(result, ensure_ascii=False) + '\n'
+
+        chunk = []
+        for line_number, line in enumerate(iter(request.stream.readline, b''), start=1):
+            if not line.strip():
+                continue
+
+            try:
+                location = json.loads(line)
+                if not isinstance(location, dict):
+                    raise ValueError('objet JSON attendu')
+            except ValueError as e:
+                counts['errors'] += 1
+                yield json.dumps({'line': line_number, 'error': f'Ligne invalide: {str(e)}'}, ensure_ascii=False) + '\n'
+                continue
+
+            chunk.append(location)
+            if len(chunk) >= STREAM_CHUNK_SIZE:
+                yield from flush(chunk)
+                chunk = []
+
+        if chunk:
+            yield from flush(chunk)
 
-            if features_df is not None:
-                # Normaliser et prédire
-                features_scaled = models['scaler'].transform(features_df)
-                temp_pred = models['temp_model'].predict(features_scaled)[0]
-                humid_pred = models['humid_model'].predict(features_scaled)[0]
-
-                predictions.append({
-                    'location_id': location.get('id', 'unknown'),
-                    'location_name': location.get('name', 'Unknown'),
-                    'temperature': round(float(temp_pred), 1),
-                    'humidity': round(float(humid_pred))
+        yield json.dumps(dict(counts, done=True, timestamp=datetime.now().isoformat())) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+@app.route('/observations', methods=['POST'])
+def observations():
+    """
+    Ajoute des observations aux historiques serveur, dans l'ordre chronologique
+
+    Format de requête attendu:
+    {
+        "observations": [
+            {"location_id": "...", "temperature": 20, "humidity": 65,
+             "wind_speed": 15, "precipitation": 0},
+            ...
+        ]
+    }
+    """
+    try:
+        data = request.get_json()
+
+        if not data or 'observations' not in data:
+            return jsonify({
+                'success': False,
+                'error': 'Liste d\'observations requise'
+            }), 400
+
+        ingested = 0
+        errors = []
+
+        for observation in data['observations']:
+            try:
+                if observation.get('location_id') is None:
+                    raise ValueError('location_id manquant')
+                ingest_observation(observation['location_id'], observation)
+                ingested += 1
+            except Exception as e:
+                errors.append({
+                    'location_id': observation.get('location_id', 'unknown') if isinstance(observation, dict) else 'unknown',
+                    'error': str(e)
                 })
 
         return jsonify({
             'success': True,
-            'predictions': predictions,
+            'ingested': ingested,
+            'errors': errors,
+            'locations': len(location_histories),
             'timestamp': datetime.now().isoformat()
         })
 
     except Exception as e:
-        logger.error(f"Erreur lors de la prédiction batch: {str(e)}")
+        logger.error(f"Erreur lors de l'ajout d'observations: {str(e)}")
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
 
+def admin_denied():
+    """Réponse 403 si aucun jeton d'administration n'est configuré ou si la requête n'a pas le bon"""
+    if not ADMIN_TOKEN:
+        return jsonify({
+            'success': False,
+            'error': "Endpoints d'administration désactivés (ML_ADMIN_TOKEN non défini)"
+        }), 403
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN):
+        return jsonify({
+            'success': False,
+            'error': "Jeton d'administration invalide"
+        }), 403
+    return None
+
+
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    """
+    Recharge les modèles de ml_models/ et bascule dessus si la nouvelle version est
+    valide; les requêtes en cours terminent avec la version précédente
+    """
+    denied = admin_denied()
+    if denied:
+        return denied
+
+    success, message = reload_models()
+    if not success:
+        return jsonify({
+            'success': False,
+            'error': message,
+            'version': models.get('version')
+        }), 500
+
+    return jsonify({
+        'success': True,
+        'message': message,
+        'version': models['version'],
+        'previous_version': previous_models['version'] if previous_models else None
+    })
+
+
+@app.route('/admin/rollback', methods=['POST'])
+def admin_rollback():
+    """Revient à la version des modèles servie avant le dernier chargement"""
+    denied = admin_denied()
+    if denied:
+        return denied
+
+    success, message = rollback_models()
+    if not success:
+        return jsonify({
+            'success': False,
+            'error': message,
+            'version': models.get('version')
+        }), 409
+
+    return jsonify({
+        'success': True,
+        'message': message,
+        'version': models['version'],
+        'previous_version': previous_models['version'] if previous_models else None
+    })
+
+
 @app.route('/model_info', methods=['GET'])
 def model_info():
     """
     Retourne des informations sur les modèles chargés
     """
-    if not models:
+    if not g.models:
         return jsonify({
             'success': False,
             'error': 'Modèles non chargés'
@@ -280,21 +1629,58 @@ def model_info():
 
     return jsonify({
         'success': True,
-        'metadata': models['metadata'],
+        'metadata': g.models['metadata'],
+        'engine': g.models['engine'],
+        'version': g.models['version'],
+        'previous_version': previous_models['version'] if previous_models else None,
+        'cache': prediction_cache.stats(),
+        'micro_batching': micro_batcher.stats() if micro_batcher is not None else {'enabled': False},
         'status': 'operational',
         'timestamp': datetime.now().isoformat()
     })
 
 
+# Fin de l'import du module
+startup['import_seconds'] = time.perf_counter() - IMPORT_START
+
+
 if __name__ == '__main__':
-    # Charger les modèles au démarrage
-    if load_models():
+    parser = argparse.ArgumentParser(description="API de prédiction météo")
+    parser.add_argument('--engine', choices=['sklearn', 'flat'], default=ENGINE,
+                        help="Moteur d'inférence (par défaut: variable ML_ENGINE ou 'sklearn')")
+    parser.add_argument('--history-csv', default=os.environ.get('ML_HISTORY_CSV'),
+                        help="CSV nettoyé pour initialiser les historiques par localisation")
+    parser.add_argument('--check-parity', action='store_true',
+                        help="Vérifier la parité du moteur aplati avec sklearn puis quitter")
+    parser.add_argument('--lazy', action='store_true',
+                        help="Écouter immédiatement et charger les modèles en arrière-plan")
+    args = parser.parse_args()
+
+    if args.check_parity:
+        check_engine_parity()
+        print("✅ Moteur aplati identique à sklearn")
+        sys.exit(0)
+
+    if args.lazy:
+        # Le serveur écoute tout de suite; /health/ready passe à 200 une fois préchauffé
+        start_background_startup(args.engine, history_csv=args.history_csv)
+        started = True
+    else:
+        # Charger et préchauffer les modèles avant d'écouter
+        started = run_startup(args.engine, history_csv=args.history_csv)
+
+    if started:
         print("✅ API de prédiction météo démarrée!")
         print("📍 Endpoints disponibles:")
         print("   - POST /predict : Prédiction pour une localisation")
         print("   - POST /batch_predict : Prédictions pour plusieurs localisations")
+        print("   - POST /batch_predict/stream : Prédictions en flux (NDJSON)")
+        print("   - POST /observations : Ajout d'observations aux historiques serveur")
         print("   - GET /model_info : Informations sur les modèles")
         print("   - GET /health : Vérification de santé")
+        print("   - GET /health/live, /health/ready : Sondes de vivacité et de disponibilité")
+        print("   - GET /metrics : Métriques Prometheus")
+        print("   - POST /admin/reload, /admin/rollback : Rechargement des modèles à chaud")
 
         # Démarrer le serveur
         app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,30 @@
+"""
+Point d'entrée de production de l'API de prédiction météo
+
+Lancement: gunicorn -c gunicorn.conf.py wsgi:app
+
+Chaque worker charge les forêts aplaties en mémoire mappée (mmap_mode='r'): les
+tableaux des arbres ne sont présents qu'une fois en RAM, quel que soit le nombre de workers.
+
+Avec ML_LAZY_START=1, le worker accepte les connexions tout de suite et charge puis
+préchauffe les modèles en arrière-plan: /health/live répond immédiatement,
+/health/ready répond 503 jusqu'à la fin du préchauffage.
+"""
+import os
+import sys
+
+from weather_prediction_api import app, run_startup, start_background_startup
+
+# Moteur aplati par défaut: ses tableaux sont utilisés sans copie depuis le fichier mappé
+engine = os.environ.get('ML_ENGINE', 'flat')
+mmap_mode = os.environ.get('ML_MMAP_MODE', 'r')
+
+# Les historiques serveur sont propres à chaque worker
+history_csv = os.environ.get('ML_HISTORY_CSV')
+
+if os.environ.get('ML_LAZY_START', '0') == '1':
+    start_background_startup(engine=engine, mmap_mode=mmap_mode, history_csv=history_csv)
+elif not run_startup(engine=engine, mmap_mode=mmap_mode, history_csv=history_csv):
+    print("❌ Erreur: Impossible de charger les modèles")
+    print("Assurez-vous d'avoir exécuté train_weather_model.py d'abord")
+    sys.exit(1)